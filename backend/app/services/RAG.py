@@ -8,6 +8,9 @@ from pydantic import BaseModel, Field
 from datetime import datetime
 import chromadb
 
+# Ollama server used for embeddings
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+
 # Initialize FastAPI
 app = FastAPI(title="RAG Service with Multiple Collections")
 
@@ -50,7 +53,7 @@ async def get_embeddings(text: str) -> List[float]:
     try:
         async with httpx.AsyncClient(timeout=30.0) as client:
             response = await client.post(
-                "http://localhost:11434/api/embeddings",
+                f"{OLLAMA_URL}/api/embeddings",
                 json={
                     "model": "nomic-embed-text",
                     "prompt": text
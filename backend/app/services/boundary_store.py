@@ -0,0 +1,243 @@
+"""
+Multi-resolution boundary storage for DisasterLens AI.
+When a boundary is collected, the full-resolution GeoJSON is kept as before and
+a pyramid of simplified geometries (simplified in metres, in the boundary's UTM
+zone) is written next to it, together with precomputed metrics (area, bbox,
+centroid). Map requests are answered from the level that matches the zoom,
+without reading or reprojecting the original file.
+"""
+
+import json
+import logging
+import math
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import geopandas as gpd
+import shapely
+from shapely.geometry import mapping, shape
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BOUNDARY_DIR = "data/boundaries"
+LEVEL_DIR = os.path.join(BOUNDARY_DIR, "levels")
+
+# Simplification tolerances of the pyramid, in metres
+TOLERANCES_M = (1, 50, 500, 5000)
+
+# Web Mercator ground resolution at zoom 0 on the equator (metres per 256 px tile pixel)
+_ZOOM0_RESOLUTION_M = 156543.03392
+
+_METERS_PER_DEGREE = 111320.0
+
+
+def boundary_name(location: str) -> str:
+    """File name stem of a location's boundary files"""
+    return location.replace(", ", "_").replace(" ", "_").lower()
+
+
+def boundary_path(location: str) -> str:
+    """Path of the full-resolution boundary GeoJSON"""
+    return os.path.join(BOUNDARY_DIR, f"{boundary_name(location)}_boundary.geojson")
+
+
+def _metrics_path(location: str) -> str:
+    return os.path.join(LEVEL_DIR, f"{boundary_name(location)}.json")
+
+
+def _level_path(location: str, tolerance_m: int) -> str:
+    return os.path.join(LEVEL_DIR, f"{boundary_name(location)}_{tolerance_m}m.geojson")
+
+
+def utm_crs(lat: float, lon: float) -> str:
+    """UTM CRS code for a latitude and longitude"""
+    # UTM zones are 6 degrees wide
+    zone_number = int((lon + 180) / 6) + 1
+
+    # Northern or southern hemisphere
+    epsg = 32600 + zone_number if lat >= 0 else 32700 + zone_number
+
+    return f"EPSG:{epsg}"
+
+
+def tolerance_for_zoom(zoom: float, lat: float = 0.0) -> int:
+    """Coarsest pyramid tolerance that is still below one screen pixel at a web map zoom level"""
+    resolution = _ZOOM0_RESOLUTION_M * math.cos(math.radians(lat)) / 2 ** zoom
+    fitting = [tolerance for tolerance in TOLERANCES_M if tolerance <= resolution]
+    return max(fitting) if fitting else min(TOLERANCES_M)
+
+
+def _round_coordinates(value, decimals: int):
+    if isinstance(value, (list, tuple)):
+        if value and isinstance(value[0], float):
+            return [round(coordinate, decimals) for coordinate in value]
+        return [_round_coordinates(item, decimals) for item in value]
+    return value
+
+
+def _count_vertices(value) -> int:
+    if isinstance(value, (list, tuple)):
+        if value and isinstance(value[0], float):
+            return 1
+        return sum(_count_vertices(item) for item in value)
+    return 0
+
+
+def build_boundary_levels(gdf: gpd.GeoDataFrame, location: str) -> Dict[str, Any]:
+    """
+    Compute metrics of a boundary and write its simplified levels.
+
+    Args:
+        gdf: Boundary geometries (any CRS; Nominatim results are EPSG:4326)
+        location: Location name the boundary belongs to
+
+    Returns:
+        The stored metrics: name, area_sqkm, bbox, centroid and levels
+    """
+    os.makedirs(LEVEL_DIR, exist_ok=True)
+    geographic = gdf.to_crs("EPSG:4326")
+    bbox = geographic.total_bounds.tolist()
+    center = shapely.union_all(geographic.geometry.values).representative_point()
+
+    # Measure and simplify in metres, in the UTM zone of the boundary
+    projected = geographic.to_crs(utm_crs(center.y, center.x))
+    merged = shapely.union_all(projected.geometry.values)
+    area_sqkm = round(merged.area / 1e6, 2)
+    centroid = gpd.GeoSeries([merged.centroid], crs=projected.crs).to_crs("EPSG:4326").iloc[0]
+
+    metrics = {
+        "name": location,
+        "area_sqkm": area_sqkm,
+        "bbox": bbox,
+        "centroid": [round(centroid.x, 6), round(centroid.y, 6)],
+        "levels": [],
+    }
+    for tolerance in TOLERANCES_M:
+        simplified = gpd.GeoSeries([merged.simplify(tolerance, preserve_topology=True)], crs=projected.crs)
+        geometry = mapping(simplified.to_crs("EPSG:4326").iloc[0])
+        # Coordinates finer than the tolerance only add bytes
+        decimals = max(1, math.ceil(-math.log10(tolerance / _METERS_PER_DEGREE)))
+        geometry["coordinates"] = _round_coordinates(geometry["coordinates"], decimals)
+        feature_collection = {
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "properties": {
+                    "name": location,
+                    "tolerance_m": tolerance,
+                    "area_sqkm": area_sqkm,
+                    "bbox": bbox,
+                    "centroid": metrics["centroid"],
+                },
+                "geometry": geometry,
+            }],
+        }
+        path = _level_path(location, tolerance)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(feature_collection, f, separators=(",", ":"))
+        os.replace(f"{path}.tmp", path)
+        metrics["levels"].append({
+            "tolerance_m": tolerance,
+            "vertices": _count_vertices(geometry["coordinates"]),
+            "bytes": os.path.getsize(path),
+        })
+
+    # Written last: its presence marks a complete pyramid
+    with open(_metrics_path(location), "w") as f:
+        json.dump(metrics, f)
+    logger.info(
+        f"Stored boundary levels for {location}: "
+        + ", ".join(f"{level['tolerance_m']}m={level['vertices']} vertices" for level in metrics["levels"])
+    )
+    return metrics
+
+
+def load_boundary_metrics(location: str) -> Optional[Dict[str, Any]]:
+    """
+    Stored metrics of a boundary, or None if the pyramid has not been built
+    (or the full-resolution file changed since it was built).
+    """
+    metrics_path = _metrics_path(location)
+    try:
+        metrics_mtime = os.path.getmtime(metrics_path)
+    except OSError:
+        return None
+    source = boundary_path(location)
+    if os.path.exists(source) and os.path.getmtime(source) > metrics_mtime:
+        return None
+    with open(metrics_path, "r") as f:
+        return json.load(f)
+
+
+def load_boundary_geometry(location: str, tolerance_m: int = None):
+    """
+    Stored boundary geometry (EPSG:4326) at a pyramid level (default: the finest),
+    or None if no pyramid exists for the location.
+    """
+    if load_boundary_metrics(location) is None:
+        return None
+    with open(_level_path(location, tolerance_m or min(TOLERANCES_M)), "r") as f:
+        geometry = shape(json.load(f)["features"][0]["geometry"])
+    shapely.prepare(geometry)
+    return geometry
+
+
+def boundary_level(location: str, zoom: Optional[float] = None) -> Optional[Tuple[str, int]]:
+    """
+    Simplified boundary file to draw a location at a zoom level.
+
+    Args:
+        location: Location name
+        zoom: Web map zoom level (default: the finest level)
+
+    Returns:
+        (path, tolerance in metres), or None if no pyramid exists for the location
+    """
+    metrics = load_boundary_metrics(location)
+    if metrics is None:
+        return None
+    if zoom is None:
+        tolerance = min(TOLERANCES_M)
+    else:
+        tolerance = tolerance_for_zoom(zoom, metrics["centroid"][1])
+    return _level_path(location, tolerance), tolerance
+
+
+def geometries_from_geojson(value: Dict[str, Any]) -> List[Any]:
+    """
+    Shapely polygons (EPSG:4326) of a GeoJSON geometry, Feature or
+    FeatureCollection (one per feature, in order).
+
+    Raises:
+        ValueError: The value is not valid GeoJSON, or a geometry has no area
+    """
+    try:
+        if value.get("type") == "FeatureCollection":
+            geometries = [shape(feature["geometry"]) for feature in value["features"]]
+        elif value.get("type") == "Feature":
+            geometries = [shape(value["geometry"])]
+        else:
+            geometries = [shape(value)]
+    except (KeyError, TypeError, AttributeError, ValueError, shapely.errors.GEOSException) as e:
+        raise ValueError(f"Invalid GeoJSON: {e}") from e
+    if not geometries:
+        raise ValueError("GeoJSON contains no geometry")
+    geometries = [shapely.make_valid(geometry) for geometry in geometries]
+    for index, geometry in enumerate(geometries):
+        if geometry.is_empty or geometry.area == 0:
+            raise ValueError(f"GeoJSON geometry {index} has no area")
+    return geometries
+
+
+def geometry_from_geojson(value: Dict[str, Any]):
+    """
+    Shapely geometry (EPSG:4326) of a GeoJSON geometry, Feature or
+    FeatureCollection (the union of its features).
+
+    Raises:
+        ValueError: The value is not valid GeoJSON or has no area
+    """
+    geometries = geometries_from_geojson(value)
+    return geometries[0] if len(geometries) == 1 else shapely.union_all(geometries)
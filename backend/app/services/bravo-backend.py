@@ -32,7 +32,7 @@ load_dotenv()
 app = FastAPI(title="Disaster Reporter API with RAG Integration")
 
 # RAG server configuration
-RAG_SERVER_URL = "http://localhost:8000"  # Default URL for RAG.py
+RAG_SERVER_URL = os.environ.get("RAG_SERVER_URL", "http://localhost:8000")  # Default URL for RAG.py
 
 #-------------------------------------------
 # Data Models
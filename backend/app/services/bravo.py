@@ -4,7 +4,7 @@ import requests
 from newspaper import Article
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
 from dotenv import load_dotenv
 import os
 
@@ -537,13 +537,19 @@ def call_agent(query: str) -> str:
         traceback.print_exc()
         return f"Error processing query: {str(e)}"
 
+def report_filename(event_name: str) -> str:
+    """File name under which manual_pipeline saves the report for an event"""
+    return f"disaster_report_{event_name.replace(' ', '_')}.md"
+
 # Update the main execution block to save the report to a file
-def manual_pipeline(json_file_path: str) -> str:
+def manual_pipeline(json_file_path: str, progress_callback: Optional[Callable[[int, int, str], None]] = None) -> str:
     """
     Manual pipeline to process disaster information and generate a report
     
     Args:
         json_file_path: Path to the JSON file with discovered URLs
+        progress_callback: Optional callable invoked as (completed, total, message)
+                           after each source is processed and before the final report
         
     Returns:
         Generated report text
@@ -571,12 +577,15 @@ def manual_pipeline(json_file_path: str) -> str:
     
     # 2. Process each URL to get summaries
     summaries = []
+    total_sources = min(5, len(data['sources']))
     for i, source in enumerate(data['sources'][:5]):  # Limit to 5 sources
-        print(f"\n📊 Processing source {i+1}/{min(5, len(data['sources']))}")
+        print(f"\n📊 Processing source {i+1}/{total_sources}")
         url = source['url']
         
         if "google.com/search" in url:
             print(f"⏩ Skipping Google search URL: {url}")
+            if progress_callback:
+                progress_callback(i + 1, total_sources, f"Skipped {url}")
             continue
             
         result = process_url(url)
@@ -585,6 +594,8 @@ def manual_pipeline(json_file_path: str) -> str:
             summaries.append(result["summary"])
         else:
             source["summary"] = f"Failed to process: {result['error']}"
+        if progress_callback:
+            progress_callback(i + 1, total_sources, f"Processed {url}")
     
     # 3. Save the enhanced JSON with summaries
     enhanced_json_path = "enhanced_disaster_data.json"
@@ -594,6 +605,8 @@ def manual_pipeline(json_file_path: str) -> str:
     
     # 4. Generate the final report
     print("\n📝 Generating final disaster report...")
+    if progress_callback:
+        progress_callback(total_sources, total_sources, "Generating final report")
     
     client = genai_client(api_key=os.environ.get("GEMINI_API_KEY"))  # or your preferred model
     
@@ -645,11 +658,11 @@ def manual_pipeline(json_file_path: str) -> str:
         report = response.text
         
         # Save the report
-        report_filename = f"disaster_report_{data['event_name'].replace(' ', '_')}.md"
-        with open(report_filename, 'w') as f:
+        report_path = report_filename(data['event_name'])
+        with open(report_path, 'w') as f:
             f.write(report)
             
-        print(f"\n✅ Final report saved to {report_filename}")
+        print(f"\n✅ Final report saved to {report_path}")
         return report
         
     except Exception as e:
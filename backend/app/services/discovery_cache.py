@@ -0,0 +1,191 @@
+"""
+Discovery result cache for DisasterLens AI.
+Maps normalized disaster queries (event name plus date range) to discovery
+files in disaster_data/, so repeated searches for the same event reuse one
+Gemini discovery instead of creating a new file every time.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9, "oct": 10, "october": 10,
+    "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+
+# Words that do not identify an event
+_STOPWORDS = {
+    "a", "an", "the", "in", "on", "of", "at", "from", "to", "till", "until", "between",
+    "and", "during", "for", "about", "news", "disaster", "event", "report", "reports",
+}
+
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_MONTH_NAMES = "|".join(sorted(_MONTHS, key=len, reverse=True))
+_MONTH_DATE = re.compile(
+    rf"\b(?:(\d{{1,2}})(?:st|nd|rd|th)?\s+)?({_MONTH_NAMES})\.?(?:\s+(\d{{1,2}})(?:st|nd|rd|th)?)?,?\s+(\d{{4}})\b"
+)
+_YEAR = re.compile(r"\b(19\d{2}|20\d{2})\b")
+
+
+def discovery_cache_key(query: str) -> str:
+    """
+    Normalize a disaster query into "<event terms>|<dates>".
+
+    Dates written as ISO dates, "August 8 2018", "8 Aug 2018", "August 2018"
+    or bare years are normalized to YYYY-MM-DD, YYYY-MM or YYYY; the remaining
+    words, minus stopwords, identify the event independent of order and case.
+    """
+    text = query.lower()
+    dates = []
+
+    def take_iso(match):
+        year, month, day = match.groups()
+        dates.append(f"{year}-{int(month):02d}-{int(day):02d}")
+        return " "
+
+    def take_month_date(match):
+        day_before, month, day_after, year = match.groups()
+        day = day_before or day_after
+        month_number = _MONTHS[month]
+        dates.append(f"{year}-{month_number:02d}-{int(day):02d}" if day else f"{year}-{month_number:02d}")
+        return " "
+
+    def take_year(match):
+        dates.append(match.group(1))
+        return " "
+
+    text = _ISO_DATE.sub(take_iso, text)
+    text = _MONTH_DATE.sub(take_month_date, text)
+    text = _YEAR.sub(take_year, text)
+
+    terms = {
+        word for word in re.findall(r"[a-z0-9]+", text)
+        if word not in _STOPWORDS and not word.isdigit()
+    }
+    return f"{' '.join(sorted(terms))}|{','.join(sorted(set(dates)))}"
+
+
+class DiscoveryCache:
+    def __init__(
+        self,
+        data_dir: str = "disaster_data",
+        db_path: str = None,
+        ttl_seconds: int = None,
+        stale_seconds: int = None,
+    ):
+        """
+        Open (or create) the discovery cache.
+
+        Args:
+            data_dir: Directory holding discovery files
+            db_path: Path of the SQLite index (env DISCOVERY_CACHE_PATH, default data/discovery_cache.db)
+            ttl_seconds: Age up to which an entry is fresh (env DISCOVERY_CACHE_TTL, default 1 hour)
+            stale_seconds: Age up to which a stale entry is still served while it is
+                           refreshed in the background (env DISCOVERY_CACHE_STALE, default 24 hours)
+        """
+        self.data_dir = data_dir
+        self.db_path = db_path or os.environ.get("DISCOVERY_CACHE_PATH", "data/discovery_cache.db")
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.environ.get("DISCOVERY_CACHE_TTL", 3600))
+        self.stale_seconds = (
+            stale_seconds if stale_seconds is not None
+            else int(os.environ.get("DISCOVERY_CACHE_STALE", 24 * 3600))
+        )
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._revalidating = set()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS discoveries (
+                cache_key TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+
+    def lookup(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a cached discovery for a query.
+
+        Returns:
+            Dictionary with filename, age_seconds and stale (True when the entry
+            should be refreshed in the background), or None on a miss
+        """
+        cache_key = discovery_cache_key(query)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT filename, created_at FROM discoveries WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        age = time.time() - row["created_at"]
+        if age > self.stale_seconds or not os.path.exists(os.path.join(self.data_dir, row["filename"])):
+            return None
+
+        return {
+            "filename": row["filename"],
+            "cache_key": cache_key,
+            "age_seconds": round(age),
+            "stale": age > self.ttl_seconds,
+        }
+
+    def store(self, query: str, filename: str, discovery_json: str = None) -> None:
+        """
+        Cache a discovery file for a query. When the discovery JSON is given,
+        the file is also cached under the event name and dates Gemini extracted,
+        so differently worded queries for the same event hit the same entry.
+        """
+        cache_keys = {discovery_cache_key(query)}
+        if discovery_json:
+            try:
+                data = json.loads(discovery_json)
+                event_query = " ".join(
+                    str(data.get(field) or "") for field in ("event_name", "start_date", "end_date")
+                )
+                if data.get("event_name"):
+                    cache_keys.add(discovery_cache_key(event_query))
+            except (ValueError, AttributeError):
+                pass
+
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO discoveries (cache_key, filename, created_at) VALUES (?, ?, ?)",
+                [(cache_key, filename, now) for cache_key in cache_keys],
+            )
+            # Entries past the stale window are never served again
+            self._conn.execute("DELETE FROM discoveries WHERE created_at < ?", (now - self.stale_seconds,))
+            self._revalidating.difference_update(cache_keys)
+
+    def begin_revalidation(self, cache_key: str) -> bool:
+        """Claim the background refresh of a stale entry; False if one is already running"""
+        with self._lock:
+            if cache_key in self._revalidating:
+                return False
+            self._revalidating.add(cache_key)
+            return True
+
+    def end_revalidation(self, cache_key: str) -> None:
+        """Release a refresh claim (e.g. when the refresh failed)"""
+        with self._lock:
+            self._revalidating.discard(cache_key)
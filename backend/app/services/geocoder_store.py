@@ -0,0 +1,296 @@
+"""
+Local geocoder store for DisasterLens AI.
+Places resolved through Nominatim are kept in a SQLite index (OSM type and id,
+name, display name, bbox and centroid) with every spelling they were looked up
+by as an alias; their boundary polygons are stored separately as WKB files and
+only read when a boundary has to be built. Repeat and near-repeat locations
+("Alappuzha", "alappuzha, Kerala") resolve without network requests or
+parsing large Nominatim responses.
+"""
+
+import glob
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Optional, Tuple
+
+import geopandas as gpd
+import shapely
+from shapely.geometry import shape
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_place_name(location: str) -> Tuple[str, ...]:
+    """
+    Comma-separated components of a place name, lowercased, without accents
+    and punctuation ("Thiruvananthapuram,  Kerala" -> ("thiruvananthapuram", "kerala")).
+    """
+    text = unicodedata.normalize("NFKD", location)
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    components = (_NON_ALPHANUMERIC.sub(" ", part).strip() for part in text.split(","))
+    return tuple(component for component in components if component)
+
+
+def _alias_key(location: str) -> str:
+    return ",".join(normalize_place_name(location))
+
+
+def _text(value) -> Optional[str]:
+    """A non-empty string attribute, or None (GeoDataFrame rows carry NaN for missing values)"""
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+def _is_subsequence(needle: Tuple[str, ...], haystack: Tuple[str, ...]) -> bool:
+    remaining = iter(haystack)
+    return all(component in remaining for component in needle)
+
+
+class GeocoderStore:
+    def __init__(self, db_path: str = None, polygon_dir: str = None):
+        """
+        Open (or create) the store.
+
+        Args:
+            db_path: SQLite index of places and aliases (env GEOCODER_DB_PATH, default data/geocoder.db)
+            polygon_dir: Directory of the boundary polygons, one WKB file per place
+                         (env GEOCODER_POLYGON_DIR, default data/geocoder_polygons)
+        """
+        self.db_path = db_path or os.environ.get("GEOCODER_DB_PATH", "data/geocoder.db")
+        self.polygon_dir = polygon_dir or os.environ.get("GEOCODER_POLYGON_DIR", "data/geocoder_polygons")
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        os.makedirs(self.polygon_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS places (
+                osm_type TEXT NOT NULL,
+                osm_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                display_name TEXT NOT NULL,
+                name_key TEXT NOT NULL,
+                display_key TEXT NOT NULL,
+                first_key TEXT NOT NULL,
+                importance REAL NOT NULL,
+                min_lon REAL NOT NULL,
+                min_lat REAL NOT NULL,
+                max_lon REAL NOT NULL,
+                max_lat REAL NOT NULL,
+                centroid_lon REAL NOT NULL,
+                centroid_lat REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (osm_type, osm_id)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_places_name ON places (name_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_places_first ON places (first_key)")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS aliases (
+                alias TEXT PRIMARY KEY,
+                osm_type TEXT NOT NULL,
+                osm_id INTEGER NOT NULL
+            )
+            """
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+
+    @staticmethod
+    def _place(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "osm_type": row["osm_type"],
+            "osm_id": row["osm_id"],
+            "name": row["name"],
+            "display_name": row["display_name"],
+            "bbox": [row["min_lon"], row["min_lat"], row["max_lon"], row["max_lat"]],
+            "centroid": [row["centroid_lon"], row["centroid_lat"]],
+        }
+
+    def lookup(self, location: str) -> Optional[Dict[str, Any]]:
+        """
+        Resolve a location name to a stored place.
+
+        An exact alias (any spelling that resolved before, compared after
+        normalize_place_name) wins. Otherwise a location with several
+        components resolves to the place whose name or first display-name
+        component equals its first component and whose display name contains
+        the remaining components in order ("alappuzha, India" matches
+        "Alappuzha, Kerala, India"), and the spelling is recorded as an alias.
+        This only applies when exactly one stored place matches: a bare name
+        ("Paris") or an ambiguous one is a miss, so Nominatim decides rather
+        than whichever namesake happens to be stored ("Paris, Texas").
+
+        Returns:
+            osm_type, osm_id, name, display_name, bbox (min_lon, min_lat,
+            max_lon, max_lat) and centroid (lon, lat), or None if unknown
+        """
+        components = normalize_place_name(location)
+        if not components:
+            return None
+        alias = ",".join(components)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT places.* FROM aliases JOIN places USING (osm_type, osm_id) WHERE alias = ?", (alias,)
+            ).fetchone()
+            if row is None and len(components) > 1:
+                candidates = [
+                    candidate
+                    for candidate in self._conn.execute(
+                        "SELECT * FROM places WHERE name_key = ? OR first_key = ?", (components[0], components[0])
+                    )
+                    if _is_subsequence(components[1:], tuple(candidate["display_key"].split(","))[1:])
+                ]
+                row = candidates[0] if len(candidates) == 1 else None
+                if row is not None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO aliases (alias, osm_type, osm_id) VALUES (?, ?, ?)",
+                        (alias, row["osm_type"], row["osm_id"]),
+                    )
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return self._place(row)
+
+    def _polygon_path(self, osm_type: str, osm_id: int) -> str:
+        return os.path.join(self.polygon_dir, f"{osm_type}_{osm_id}.wkb")
+
+    def add(self, location: Optional[str], result: Dict[str, Any], geometry) -> Dict[str, Any]:
+        """
+        Store a geocoded place and its polygon, replacing an older version.
+
+        Args:
+            location: Spelling the place was looked up by (recorded as an alias), or None
+            result: Nominatim attributes: osm_type, osm_id, display_name and
+                    optionally name and importance
+            geometry: Boundary polygon (EPSG:4326)
+
+        Returns:
+            The stored place (see lookup)
+        """
+        osm_type, osm_id = str(result["osm_type"]), int(result["osm_id"])
+        display_name = _text(result.get("display_name")) or _text(result.get("name")) or location
+        name = _text(result.get("name")) or display_name.split(",")[0].strip()
+        importance = result.get("importance")
+        importance = float(importance) if isinstance(importance, (int, float)) and not math.isnan(importance) else 0.0
+        display_components = normalize_place_name(display_name)
+        min_lon, min_lat, max_lon, max_lat = geometry.bounds
+        centroid = geometry.centroid
+
+        # Polygon first: a place in the index always has its polygon
+        path = self._polygon_path(osm_type, osm_id)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(shapely.to_wkb(geometry))
+        os.replace(f"{path}.tmp", path)
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO places (osm_type, osm_id, name, display_name, name_key, display_key, "
+                "first_key, importance, min_lon, min_lat, max_lon, max_lat, centroid_lon, centroid_lat, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    osm_type, osm_id, name, display_name, _alias_key(name), ",".join(display_components),
+                    display_components[0] if display_components else "", importance,
+                    min_lon, min_lat, max_lon, max_lat, round(centroid.x, 6), round(centroid.y, 6), time.time(),
+                ),
+            )
+            # Display names are not aliases: several places can share one ("New York, United States"),
+            # lookup only resolves them by display name while it is unambiguous
+            if location is not None and normalize_place_name(location):
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO aliases (alias, osm_type, osm_id) VALUES (?, ?, ?)",
+                    (_alias_key(location), osm_type, osm_id),
+                )
+            row = self._conn.execute(
+                "SELECT * FROM places WHERE osm_type = ? AND osm_id = ?", (osm_type, osm_id)
+            ).fetchone()
+        return self._place(row)
+
+    def add_gdf(self, location: str, gdf: gpd.GeoDataFrame) -> Optional[Dict[str, Any]]:
+        """Store the first result of ox.geocode_to_gdf (see add); None if it carries no OSM id"""
+        if gdf.empty or "osm_id" not in gdf.columns:
+            return None
+        geographic = gdf.to_crs("EPSG:4326")
+        row = geographic.iloc[0]
+        return self.add(location, row.to_dict(), row.geometry)
+
+    def polygon(self, place: Dict[str, Any]):
+        """Boundary polygon of a stored place (EPSG:4326), read from disk on demand"""
+        with open(self._polygon_path(place["osm_type"], place["osm_id"]), "rb") as f:
+            return shapely.from_wkb(f.read())
+
+    def polygon_gdf(self, place: Dict[str, Any]) -> gpd.GeoDataFrame:
+        """The polygon of a stored place as a GeoDataFrame shaped like ox.geocode_to_gdf output"""
+        return gpd.GeoDataFrame(
+            {
+                "osm_type": [place["osm_type"]],
+                "osm_id": [place["osm_id"]],
+                "name": [place["name"]],
+                "display_name": [place["display_name"]],
+            },
+            geometry=[self.polygon(place)],
+            crs="EPSG:4326",
+        )
+
+    def import_nominatim_cache(self, cache_dir: str) -> int:
+        """
+        Import the polygon results of osmnx's per-request Nominatim cache files
+        (<cache_dir>/*.json) so places geocoded before the store existed resolve
+        locally. Other osmnx cache files are skipped.
+
+        Returns:
+            Number of places imported
+        """
+        imported = 0
+        for path in sorted(glob.glob(os.path.join(cache_dir, "*.json"))):
+            try:
+                with open(path, "r") as f:
+                    results = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable cache file {path}: {str(e)}")
+                continue
+            if not isinstance(results, list):
+                continue
+            for result in results:
+                if not isinstance(result, dict) or "osm_id" not in result:
+                    continue
+                geojson = result.get("geojson") or {}
+                if geojson.get("type") not in ("Polygon", "MultiPolygon"):
+                    continue
+                try:
+                    geometry = shapely.make_valid(shape(geojson))
+                except (ValueError, TypeError, shapely.errors.GEOSException) as e:
+                    logger.warning(f"Skipping {result.get('display_name')} in {path}: {str(e)}")
+                    continue
+                self.add(None, result, geometry)
+                imported += 1
+        if imported:
+            logger.info(f"Imported {imported} place(s) from the Nominatim cache in {cache_dir}")
+        return imported
+
+    def stats(self) -> Dict[str, Any]:
+        """Place and alias counts and hit/miss counters"""
+        with self._lock:
+            places = self._conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+            aliases = self._conn.execute("SELECT COUNT(*) FROM aliases").fetchone()[0]
+            return {"places": places, "aliases": aliases, "hits": self.hits, "misses": self.misses}
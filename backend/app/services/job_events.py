@@ -0,0 +1,152 @@
+"""
+Push-based job progress for DisasterLens AI.
+Job updates published from worker threads are fanned out on the API event
+loop to any number of Server-Sent Events or WebSocket subscribers. Each
+update is serialized once and shared by all subscribers of the job.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from app.services.job_store import TERMINAL_STATUSES
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _JobChannel:
+    """Event log and shared wake-up future for one job (used on the event loop only)"""
+
+    def __init__(self, job_id: str, history_size: int):
+        self.job_id = job_id
+        self.state: Dict[str, Any] = {"job_id": job_id}
+        self.history = deque(maxlen=history_size)
+        self.seq = 0
+        self.closed = False
+        self.waiter: Optional[asyncio.Future] = None
+
+    def append(self, fields: Dict[str, Any]):
+        self.state.update(fields)
+        self.seq += 1
+        self.history.append((self.seq, json.dumps(self.state)))
+        if self.state.get("status") in TERMINAL_STATUSES:
+            self.closed = True
+        # Wake every subscriber with a single future
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+        self.waiter = None
+
+    def wait(self) -> asyncio.Future:
+        if self.waiter is None:
+            self.waiter = asyncio.get_running_loop().create_future()
+        return self.waiter
+
+
+class JobEventBroker:
+    def __init__(self, history_size: int = 50, keepalive_seconds: float = 15.0, finished_ttl: float = 60.0):
+        """
+        Args:
+            history_size: Number of recent events kept per job for subscribers that fall behind
+            keepalive_seconds: Interval after which an idle subscriber receives a keepalive
+            finished_ttl: Seconds the final state of a finished job is kept for subscribers
+                          whose snapshot was read before the job finished
+        """
+        self.history_size = history_size
+        self.keepalive_seconds = keepalive_seconds
+        self.finished_ttl = finished_ttl
+        self._channels: Dict[str, _JobChannel] = {}
+        # job_id -> (expiry, final state), oldest first
+        self._finished: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Attach the broker to the API event loop; events published before this are dropped"""
+        self._loop = loop
+
+    def publish(self, job_id: str, fields: Dict[str, Any]) -> None:
+        """
+        Publish changed job fields. Safe to call from any thread; matches the
+        JobStore listener signature so it can be registered with add_listener().
+        """
+        if self._loop is None or self._loop.is_closed():
+            return
+        fields = {key: value for key, value in fields.items() if key != "result"}
+        try:
+            self._loop.call_soon_threadsafe(self._apply, job_id, fields)
+        except RuntimeError:
+            # Event loop shut down while a worker was still reporting progress
+            pass
+
+    def _apply(self, job_id: str, fields: Dict[str, Any]) -> None:
+        channel = self._channels.get(job_id)
+        if channel is None:
+            if "status" not in fields:
+                # Updates without a status (e.g. the queue's state="finished" after the terminal
+                # status) would open a channel that is never closed; subscribers start from the store
+                return
+            channel = self._channels[job_id] = _JobChannel(job_id, self.history_size)
+        channel.append(fields)
+        if channel.closed:
+            # Existing subscribers keep their reference and drain the final event
+            del self._channels[job_id]
+            now = time.monotonic()
+            self._finished.pop(job_id, None)
+            self._finished[job_id] = (now + self.finished_ttl, dict(channel.state))
+            while next(iter(self._finished.values()))[0] < now:
+                self._finished.popitem(last=False)
+
+    async def subscribe(self, job_id: str, snapshot: Dict[str, Any]) -> AsyncIterator[Optional[str]]:
+        """
+        Yield serialized job states, starting with `snapshot`, until the job
+        finishes. Yields None when no event arrived within the keepalive interval.
+
+        Args:
+            job_id: Job to follow
+            snapshot: Current job state from the job store (without the result)
+        """
+        channel = self._channels.get(job_id)
+        if channel is None:
+            # Job not running (finished, or no update since the server started)
+            if snapshot.get("status") in TERMINAL_STATUSES:
+                yield json.dumps({"job_id": job_id, **snapshot})
+                return
+            finished = self._finished.get(job_id)
+            if finished is not None and finished[0] >= time.monotonic():
+                # The job finished after the snapshot was read; a new channel would never close
+                yield json.dumps({"job_id": job_id, **snapshot, **finished[1]})
+                return
+            # Registered before yielding so no update is missed while the first event is sent
+            channel = self._channels[job_id] = _JobChannel(job_id, self.history_size)
+            channel.state.update(snapshot)
+            seq = 0
+            yield json.dumps(channel.state)
+        else:
+            seq = channel.seq
+            yield json.dumps(channel.state)
+
+        while True:
+            if channel.seq > seq:
+                oldest_seq = channel.history[0][0]
+                if seq + 1 < oldest_seq:
+                    # Fell behind the history window; the latest state is sufficient
+                    seq = channel.seq
+                    yield channel.history[-1][1]
+                else:
+                    for event_seq, data in list(channel.history):
+                        if event_seq > seq:
+                            seq = event_seq
+                            yield data
+                continue
+            if channel.closed:
+                return
+            try:
+                await asyncio.wait_for(asyncio.shield(channel.wait()), timeout=self.keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield None
@@ -0,0 +1,115 @@
+"""
+Background job execution for DisasterLens AI.
+Blocking work (Gemini calls, report pipelines, Overpass collection) runs on
+bounded per-job-type thread pools so the FastAPI event loop stays responsive.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from app.services.job_store import JobStore
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Default number of concurrent workers per job type
+DEFAULT_WORKER_LIMITS = {
+    "discovery": 4,
+    "report": 2,
+    "predisaster": 2,
+    "routing": 1,
+}
+
+
+class QueueFullError(Exception):
+    """Raised when a job type already has the maximum number of queued jobs"""
+
+
+class JobQueue:
+    def __init__(self, job_store: JobStore, worker_limits: Dict[str, int] = None, max_queued: int = None):
+        """
+        Create the worker pools.
+
+        Args:
+            job_store: Store used to record the queued/running/finished state of each job
+            worker_limits: Concurrent workers per job type; overridable per type with
+                           env JOB_WORKERS_<TYPE> (e.g. JOB_WORKERS_REPORT=4)
+            max_queued: Maximum number of waiting jobs per type (env JOB_MAX_QUEUED, default 50)
+        """
+        self.job_store = job_store
+        self.worker_limits = dict(DEFAULT_WORKER_LIMITS)
+        self.worker_limits.update(worker_limits or {})
+        for kind in self.worker_limits:
+            env_value = os.environ.get(f"JOB_WORKERS_{kind.upper()}")
+            if env_value:
+                self.worker_limits[kind] = int(env_value)
+        self.max_queued = max_queued if max_queued is not None else int(os.environ.get("JOB_MAX_QUEUED", 50))
+
+        self._lock = threading.Lock()
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _get_executor(self, kind: str) -> ThreadPoolExecutor:
+        # Called with self._lock held
+        if kind not in self._executors:
+            workers = self.worker_limits.setdefault(kind, 1)
+            self._executors[kind] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"job-{kind}")
+            self._counters[kind] = {"queued": 0, "running": 0, "finished": 0, "failed": 0}
+        return self._executors[kind]
+
+    def submit(self, kind: str, job_id: str, func: Callable[..., Any], *args) -> None:
+        """
+        Queue a job for execution on the pool of its type.
+
+        Raises:
+            QueueFullError: If the pool already has max_queued jobs waiting
+        """
+        with self._lock:
+            executor = self._get_executor(kind)
+            counters = self._counters[kind]
+            if counters["queued"] >= self.max_queued:
+                raise QueueFullError(f"Too many queued {kind} jobs ({counters['queued']}), try again later")
+            counters["queued"] += 1
+
+        self.job_store.update(job_id, state="queued")
+        executor.submit(self._run, kind, job_id, func, args)
+
+    def _run(self, kind: str, job_id: str, func: Callable[..., Any], args: tuple) -> None:
+        with self._lock:
+            self._counters[kind]["queued"] -= 1
+            self._counters[kind]["running"] += 1
+
+        self.job_store.update(job_id, state="running")
+        outcome = "finished"
+        try:
+            func(*args)
+        except Exception as e:
+            # Task functions record their own errors; this only catches bugs in them
+            logger.exception(f"Unhandled error in {kind} job {job_id}")
+            self.job_store.update(job_id, status="error", error=str(e))
+            outcome = "failed"
+        finally:
+            with self._lock:
+                self._counters[kind]["running"] -= 1
+                self._counters[kind][outcome] += 1
+            self.job_store.update(job_id, state="finished")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return worker limits and queued/running/finished counts per job type"""
+        with self._lock:
+            stats = {}
+            for kind, workers in self.worker_limits.items():
+                counters = self._counters.get(kind, {"queued": 0, "running": 0, "finished": 0, "failed": 0})
+                stats[kind] = {"workers": workers, "max_queued": self.max_queued, **counters}
+            return stats
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop all worker pools, cancelling jobs that have not started"""
+        with self._lock:
+            executors = list(self._executors.values())
+        for executor in executors:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,431 @@
+"""
+Persistent job store for DisasterLens AI background jobs.
+Job metadata is kept in a SQLite database (WAL mode) indexed on status and
+creation time, while large results (POI collections, markdown reports) are
+written out of line so that status polls stay cheap.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Statuses after which a job will not change any more
+TERMINAL_STATUSES = ("completed", "error")
+
+# Columns stored directly on the jobs table; every other field goes into `extra`
+_COLUMN_FIELDS = ("status", "progress", "error")
+
+
+def new_job_id(prefix: str) -> str:
+    """Create a readable job ID (prefix and timestamp) that is unique even within one second"""
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:12]}"
+
+
+def request_fingerprint(kind: str, **params) -> str:
+    """
+    Fingerprint a job request so identical requests can share one job.
+    Strings are lower-cased with whitespace collapsed and lists are sorted.
+    """
+    def normalize(value):
+        if isinstance(value, str):
+            return " ".join(value.lower().split())
+        if isinstance(value, (list, tuple, set)):
+            return sorted(normalize(item) for item in value)
+        return value
+
+    normalized = {key: normalize(value) for key, value in params.items()}
+    payload = json.dumps([kind, normalized], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class JobStore:
+    def __init__(
+        self,
+        db_path: str = None,
+        results_dir: str = None,
+        ttl_seconds: int = None,
+        max_jobs: int = None,
+        max_result_bytes: int = None,
+        reuse_seconds: int = None,
+    ):
+        """
+        Open (or create) the job store.
+
+        Args:
+            db_path: Path of the SQLite database (env JOB_STORE_PATH, default data/jobs.db)
+            results_dir: Directory for out-of-line results (env JOB_RESULTS_DIR, default data/jobs)
+            ttl_seconds: Age after which finished jobs are evicted (env JOB_TTL_SECONDS, default 7 days)
+            max_jobs: Maximum number of finished jobs kept (env JOB_MAX_ENTRIES, default 1000)
+            max_result_bytes: Maximum total size of stored results (env JOB_MAX_RESULT_BYTES, default 512 MB)
+            reuse_seconds: How long a completed job is reused for identical requests
+                           (env JOB_REUSE_SECONDS, default 10 minutes)
+        """
+        self.db_path = db_path or os.environ.get("JOB_STORE_PATH", "data/jobs.db")
+        self.results_dir = results_dir or os.environ.get("JOB_RESULTS_DIR", "data/jobs")
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.environ.get("JOB_TTL_SECONDS", 7 * 24 * 3600))
+        self.max_jobs = max_jobs if max_jobs is not None else int(os.environ.get("JOB_MAX_ENTRIES", 1000))
+        self.max_result_bytes = (
+            max_result_bytes if max_result_bytes is not None
+            else int(os.environ.get("JOB_MAX_RESULT_BYTES", 512 * 1024 * 1024))
+        )
+        self.reuse_seconds = reuse_seconds if reuse_seconds is not None else int(os.environ.get("JOB_REUSE_SECONDS", 600))
+        # Run eviction at most this often (seconds) when jobs are created
+        self.eviction_interval = 60
+        self._last_eviction = 0.0
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        os.makedirs(self.results_dir, exist_ok=True)
+
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        self._recover_interrupted()
+
+    def _create_schema(self):
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    extra TEXT NOT NULL DEFAULT '{}',
+                    title TEXT,
+                    result_path TEXT,
+                    result_format TEXT,
+                    result_size INTEGER NOT NULL DEFAULT 0,
+                    fingerprint TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+                CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at);
+                """
+            )
+            # Databases created before request coalescing lack the fingerprint column
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "fingerprint" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN fingerprint TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_fingerprint ON jobs(fingerprint, created_at)")
+
+    def _recover_interrupted(self):
+        """Mark jobs that were still running when the process stopped as failed"""
+        with self._lock:
+            placeholders = ",".join("?" for _ in TERMINAL_STATUSES)
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET status = 'error', error = ?, updated_at = ? "
+                f"WHERE status NOT IN ({placeholders})",
+                ("Job interrupted by server restart", time.time(), *TERMINAL_STATUSES),
+            )
+            if cursor.rowcount:
+                logger.warning(f"Marked {cursor.rowcount} interrupted job(s) as failed")
+
+    def add_listener(self, listener: Callable[[str, Dict[str, Any]], None]) -> None:
+        """Register a callback invoked with (job_id, changed_fields) after every create or update"""
+        self._listeners.append(listener)
+
+    def _notify(self, job_id: str, fields: Dict[str, Any]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(job_id, fields)
+            except Exception as e:
+                logger.error(f"Job listener failed for {job_id}: {str(e)}")
+
+    def create(self, job_id: str, kind: str, status: str, fingerprint: str = None, **fields) -> None:
+        """
+        Register a new job.
+
+        Args:
+            job_id: Unique job identifier (see new_job_id)
+            kind: Job type (e.g., "discovery", "report", "predisaster")
+            status: Initial status
+            fingerprint: Optional request fingerprint used to coalesce identical requests
+            **fields: Additional small fields returned with the job status (location, query, ...)
+        """
+        with self._lock:
+            self._insert(job_id, kind, status, fingerprint, fields)
+        self.maybe_evict()
+
+    def create_or_attach(
+        self, job_id: str, kind: str, status: str, fingerprint: str, **fields
+    ) -> Tuple[str, bool]:
+        """
+        Create a job unless an identical request is already running or completed
+        within reuse_seconds, in which case the existing job is returned instead.
+
+        Returns:
+            (job_id, created) where created is False if an existing job was attached to
+        """
+        placeholders = ",".join("?" for _ in TERMINAL_STATUSES)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT job_id FROM jobs WHERE fingerprint = ? AND ("
+                f"status NOT IN ({placeholders}) OR (status = 'completed' AND updated_at >= ?)"
+                f") ORDER BY created_at DESC LIMIT 1",
+                (fingerprint, *TERMINAL_STATUSES, time.time() - self.reuse_seconds),
+            ).fetchone()
+            if row is not None:
+                logger.info(f"Attaching {kind} request to existing job {row['job_id']}")
+                return row["job_id"], False
+            self._insert(job_id, kind, status, fingerprint, fields)
+        self.maybe_evict()
+        return job_id, True
+
+    def _insert(self, job_id: str, kind: str, status: str, fingerprint: Optional[str], fields: Dict[str, Any]):
+        # Called with self._lock held
+        now = time.time()
+        progress = int(fields.pop("progress", 0))
+        error = fields.pop("error", None)
+        self._conn.execute(
+            "INSERT INTO jobs (job_id, kind, status, progress, error, extra, fingerprint, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, status, progress, error, json.dumps(fields), fingerprint, now, now),
+        )
+        self._notify(job_id, {**fields, "status": status, "progress": progress, "error": error})
+
+    def update(self, job_id: str, **fields) -> None:
+        """Update status, progress, error or any extra field of a job"""
+        changed = dict(fields)
+        with self._lock:
+            row = self._conn.execute("SELECT extra FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                logger.warning(f"Ignoring update for unknown job {job_id}")
+                return
+
+            assignments = ["updated_at = ?"]
+            values: List[Any] = [time.time()]
+            for name in _COLUMN_FIELDS:
+                if name in fields:
+                    assignments.append(f"{name} = ?")
+                    values.append(fields.pop(name))
+
+            if fields:
+                extra = json.loads(row["extra"])
+                extra.update(fields)
+                assignments.append("extra = ?")
+                values.append(json.dumps(extra))
+
+            values.append(job_id)
+            self._conn.execute(f"UPDATE jobs SET {', '.join(assignments)} WHERE job_id = ?", values)
+        self._notify(job_id, changed)
+
+    def set_result(self, job_id: str, result: Any, **fields) -> None:
+        """
+        Store the result of a job out of line and update the job row.
+
+        Text results (markdown reports, file names) are stored as-is and
+        everything else as JSON. The first heading of a markdown report is kept
+        as the job title so that report listings never have to open the result file.
+        """
+        if isinstance(result, str):
+            result_format = "text"
+            data = result.encode("utf-8")
+            title = result.split("\n", 1)[0][2:].strip() if result.startswith("# ") else None
+        else:
+            result_format = "json"
+            data = json.dumps(result).encode("utf-8")
+            title = None
+
+        extension = "txt" if result_format == "text" else "json"
+        result_path = os.path.join(self.results_dir, f"{job_id}.{extension}")
+        tmp_path = f"{result_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, result_path)
+
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET result_path = ?, result_format = ?, result_size = ?, title = ? WHERE job_id = ?",
+                (result_path, result_format, len(data), title, job_id),
+            )
+        if fields:
+            self.update(job_id, **fields)
+
+    def exists(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row is not None
+
+    def get(self, job_id: str, include_result: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Return a job in the same shape the API has always exposed, or None.
+
+        The result is only loaded from disk when requested and the job has one.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = json.loads(row["extra"])
+        job.update({
+            "status": row["status"],
+            "progress": row["progress"],
+            "result": None,
+            "error": row["error"],
+        })
+        if include_result and row["result_path"]:
+            job["result"] = self._read_result(row["result_path"], row["result_format"])
+        return job
+
+    def get_result(self, job_id: str) -> Any:
+        """Return the stored result of a job, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result_path, result_format FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None or not row["result_path"]:
+            return None
+        return self._read_result(row["result_path"], row["result_format"])
+
+    def get_report_info(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return metadata of a completed markdown report job without reading its body.
+
+        Unlike list_reports this does not require a title: reports whose markdown
+        does not start with a heading are still served by their result path.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, title, result_path, result_size, created_at, updated_at FROM jobs "
+                "WHERE job_id = ? AND status = 'completed' AND result_format = 'text' AND result_path IS NOT NULL",
+                (job_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list_reports(
+        self,
+        limit: int = 10,
+        offset: int = 0,
+        event: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        List completed jobs whose result is a markdown report, newest first.
+
+        Filters match the event_name, start_date and end_date fields recorded
+        with the result (see ReportCatalog.list_reports for their semantics).
+        """
+        clauses = ["status = 'completed'", "title IS NOT NULL"]
+        params: List[Any] = []
+        if event:
+            clauses.append("(json_extract(extra, '$.event_name') LIKE ? OR title LIKE ?)")
+            params.extend([f"%{event}%", f"%{event}%"])
+        if date_from:
+            clauses.append("json_extract(extra, '$.end_date') >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("json_extract(extra, '$.start_date') <= ?")
+            params.append(date_to)
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, title, created_at, result_size, extra FROM jobs "
+                f"WHERE {' AND '.join(clauses)} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+
+        reports = []
+        for row in rows:
+            extra = json.loads(row["extra"])
+            reports.append({
+                "job_id": row["job_id"],
+                "title": row["title"],
+                "created_at": row["created_at"],
+                "result_size": row["result_size"],
+                "event_name": extra.get("event_name"),
+                "start_date": extra.get("start_date"),
+                "end_date": extra.get("end_date"),
+                "source_count": extra.get("source_count"),
+            })
+        return reports
+
+    def _read_result(self, result_path: str, result_format: str) -> Any:
+        try:
+            with open(result_path, "r", encoding="utf-8") as f:
+                if result_format == "json":
+                    return json.load(f)
+                return f.read()
+        except FileNotFoundError:
+            logger.warning(f"Result file missing: {result_path}")
+            return None
+
+    def maybe_evict(self) -> None:
+        """Run eviction if it has not run within the eviction interval"""
+        if time.time() - self._last_eviction >= self.eviction_interval:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Evict finished jobs that are past their TTL, then the oldest finished
+        jobs until both the job count and the total result size are within limits.
+
+        Returns:
+            Number of evicted jobs
+        """
+        self._last_eviction = time.time()
+        placeholders = ",".join("?" for _ in TERMINAL_STATUSES)
+        evicted = []
+
+        with self._lock:
+            cutoff = time.time() - self.ttl_seconds
+            evicted.extend(self._conn.execute(
+                f"SELECT job_id, result_path, result_size FROM jobs "
+                f"WHERE status IN ({placeholders}) AND created_at < ?",
+                (*TERMINAL_STATUSES, cutoff),
+            ).fetchall())
+
+            expired_ids = {row["job_id"] for row in evicted}
+            count, total_size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(result_size), 0) FROM jobs"
+            ).fetchone()
+            count -= len(evicted)
+            total_size -= sum(row["result_size"] for row in evicted)
+
+            if count > self.max_jobs or total_size > self.max_result_bytes:
+                for row in self._conn.execute(
+                    f"SELECT job_id, result_path, result_size FROM jobs WHERE status IN ({placeholders}) "
+                    f"ORDER BY created_at ASC",
+                    TERMINAL_STATUSES,
+                ):
+                    if count <= self.max_jobs and total_size <= self.max_result_bytes:
+                        break
+                    if row["job_id"] in expired_ids:
+                        continue
+                    evicted.append(row)
+                    count -= 1
+                    total_size -= row["result_size"]
+
+            if evicted:
+                self._conn.executemany("DELETE FROM jobs WHERE job_id = ?", [(row["job_id"],) for row in evicted])
+
+        for row in evicted:
+            if row["result_path"]:
+                try:
+                    os.remove(row["result_path"])
+                except FileNotFoundError:
+                    pass
+
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} job(s) from the job store")
+        return len(evicted)
@@ -0,0 +1,173 @@
+"""
+Offline reader for OpenStreetMap .osm.pbf extracts (Geofabrik, BBBike, ...).
+Streams an extract with pyosmium and yields the tagged elements carrying any
+of the requested keys, with node coordinates and bounding-box centers and
+extents of ways and relations (the same positions Overpass returns with
+"out center" or "out bb"). Memory is bounded by the node location index,
+which can live on disk for national-scale extracts.
+"""
+
+import logging
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import osmium
+except ImportError:
+    osmium = None
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directory searched for extracts given by file name
+EXTRACT_DIR = "data/osm_extracts"
+
+# (element type, OSM id, latitude, longitude, tags, (half height, half width) of the bounding box)
+PBFElement = Tuple[str, int, float, float, Dict[str, str], Tuple[float, float]]
+
+
+def resolve_extract_path(extract: str, extract_dir: str = None) -> str:
+    """
+    Path of an extract given by file name (looked up in env OSM_EXTRACT_DIR,
+    default data/osm_extracts).
+
+    Raises:
+        FileNotFoundError: No such extract
+    """
+    extract_dir = extract_dir or os.environ.get("OSM_EXTRACT_DIR", EXTRACT_DIR)
+    if os.path.basename(extract) != extract or not extract.endswith(".osm.pbf"):
+        raise FileNotFoundError(f"Invalid extract name: {extract}")
+    path = os.path.join(extract_dir, extract)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Extract not found: {path}")
+    return path
+
+
+class _BBox:
+    __slots__ = ("min_lat", "min_lon", "max_lat", "max_lon")
+
+    def __init__(self):
+        self.min_lat = self.min_lon = float("inf")
+        self.max_lat = self.max_lon = float("-inf")
+
+    def extend(self, lat: float, lon: float) -> None:
+        self.min_lat = min(self.min_lat, lat)
+        self.max_lat = max(self.max_lat, lat)
+        self.min_lon = min(self.min_lon, lon)
+        self.max_lon = max(self.max_lon, lon)
+
+    def extend_bbox(self, other: "_BBox") -> None:
+        if other.valid:
+            self.extend(other.min_lat, other.min_lon)
+            self.extend(other.max_lat, other.max_lon)
+
+    @property
+    def valid(self) -> bool:
+        return self.min_lat <= self.max_lat
+
+    def center(self) -> Tuple[float, float]:
+        return (self.min_lat + self.max_lat) / 2, (self.min_lon + self.max_lon) / 2
+
+    def extent(self) -> Tuple[float, float]:
+        return (self.max_lat - self.min_lat) / 2, (self.max_lon - self.min_lon) / 2
+
+
+def _way_bbox(way) -> _BBox:
+    bbox = _BBox()
+    for node in way.nodes:
+        location = node.location
+        if location.valid():
+            bbox.extend(location.lat, location.lon)
+    return bbox
+
+
+def iter_pbf_elements(
+    path: str,
+    keys: Iterable[str],
+    accept_relation=None,
+    location_index: str = None,
+) -> Iterator[PBFElement]:
+    """
+    Stream the elements of an extract that carry any of the given tag keys.
+
+    Nodes and ways are read in one pass with a node location index; relations
+    are read first (a cheap pass that skips nodes and ways) and, if any are
+    accepted, their member ways are read in a last pass to compute their
+    bounding boxes.
+
+    Args:
+        path: .osm.pbf (or any format libosmium reads) file
+        keys: Tag keys an element needs at least one of (e.g. "amenity", "power")
+        accept_relation: Optional callable (tags) -> bool selecting relations
+                         worth the extra pass; default accepts all
+        location_index: libosmium node location index (env OSM_PBF_LOCATION_INDEX,
+                        default "flex_mem"; use "dense_file_array,<file>" to keep
+                        the index on disk for planet or continent extracts)
+
+    Yields:
+        (element_type, osm_id, lat, lon, tags, extent) tuples (extent is (0, 0)
+        for nodes); elements without a position (e.g. ways whose nodes are
+        outside the extract) are skipped
+    """
+    if osmium is None:
+        raise RuntimeError("pyosmium is not installed; install it with 'pip install osmium'")
+    keys = sorted(set(keys))
+    location_index = location_index or os.environ.get("OSM_PBF_LOCATION_INDEX", "flex_mem")
+
+    # Pass 1: relations carrying the keys, and the ways they are made of
+    relations: Dict[int, Tuple[Dict[str, str], List[int]]] = {}
+    member_ways = set()
+    for relation in osmium.FileProcessor(path, osmium.osm.RELATION).with_filter(osmium.filter.KeyFilter(*keys)):
+        tags = dict(relation.tags)
+        if accept_relation is not None and not accept_relation(tags):
+            continue
+        way_ids = [member.ref for member in relation.members if member.type == "w"]
+        relations[relation.id] = (tags, way_ids)
+        member_ways.update(way_ids)
+
+    # Pass 2: nodes and ways carrying the keys
+    elements = 0
+    processor = (
+        osmium.FileProcessor(path, osmium.osm.NODE | osmium.osm.WAY)
+        .with_locations(location_index)
+        .with_filter(osmium.filter.KeyFilter(*keys))
+    )
+    for obj in processor:
+        if obj.is_node():
+            if not obj.location.valid():
+                continue
+            yield "node", obj.id, obj.location.lat, obj.location.lon, dict(obj.tags), (0.0, 0.0)
+        else:
+            bbox = _way_bbox(obj)
+            if not bbox.valid:
+                continue
+            lat, lon = bbox.center()
+            yield "way", obj.id, lat, lon, dict(obj.tags), bbox.extent()
+        elements += 1
+        if elements % 100000 == 0:
+            logger.info(f"Read {elements} tagged nodes and ways from {path}")
+
+    if not relations:
+        return
+
+    # Pass 3: bounding boxes of the relations' member ways (often untagged)
+    way_bboxes: Dict[int, _BBox] = {}
+    processor = (
+        osmium.FileProcessor(path, osmium.osm.NODE | osmium.osm.WAY)
+        .with_locations(location_index)
+        .with_filter(osmium.filter.EntityFilter(osmium.osm.WAY))
+        .with_filter(osmium.filter.IdFilter(member_ways))
+    )
+    for way in processor:
+        way_bboxes[way.id] = _way_bbox(way)
+
+    for relation_id, (tags, way_ids) in relations.items():
+        bbox = _BBox()
+        for way_id in way_ids:
+            if way_id in way_bboxes:
+                bbox.extend_bbox(way_bboxes[way_id])
+        if not bbox.valid:
+            continue
+        lat, lon = bbox.center()
+        yield "relation", relation_id, lat, lon, tags, bbox.extent()
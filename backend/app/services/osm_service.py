@@ -1,27 +1,102 @@
 """
 OpenStreetMap (OSM) data collection service for DisasterLens AI.
-This service uses overpy and osmnx to collect pre-disaster data for a location.
+This service uses Overpass (streamed into compact POI tables) and osmnx to
+collect pre-disaster data for a location.
 """
 
-import overpy
 import osmnx as ox
 import geopandas as gpd
+import shapely
 import json
 import os
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, BinaryIO, Optional, Callable, Hashable, Iterator, Tuple
 import logging
-import time
-import random
+
+from app.services.boundary_store import (
+    BOUNDARY_DIR,
+    boundary_path,
+    build_boundary_levels,
+    load_boundary_geometry,
+    load_boundary_metrics
+)
+from app.services.geocoder_store import GeocoderStore
+from app.services.osm_pbf import iter_pbf_elements
+from app.services.overpass_cache import OverpassCache
+from app.services.overpass_client import OverpassClient, OverpassError, OverpassQueryTooLarge
+from app.services.poi_dedup import deduplicate_table
+from app.services.poi_table import POITable, iter_overpass_elements
+from app.services.tag_schema import structure_schema
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Overpass derives area ids from the ids of closed ways and relations
+AREA_ID_OFFSETS = {"way": 2400000000, "relation": 3600000000}
+
+
+def matches_structure(element_type: str, tags: Dict[str, str], structure: str) -> bool:
+    """Whether an element returned by Overpass is of a structure type (see tag_schema)"""
+    return structure_schema(structure).matches(element_type, tags)
+
+
+def _frange(start: float, stop: float, step: float) -> List[float]:
+    """Tile origins from start (inclusive) to stop (exclusive)"""
+    count = max(1, int((stop - start) / step + 0.999999))
+    return [start + i * step for i in range(count)]
+
+
+def _split_tile(tile: tuple) -> List[tuple]:
+    """Four quadrants of a (min_lon, min_lat, max_lon, max_lat, depth) tile, one level deeper"""
+    min_lon, min_lat, max_lon, max_lat, depth = tile
+    mid_lon, mid_lat = (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+    return [
+        (min_lon, min_lat, mid_lon, mid_lat, depth + 1),
+        (mid_lon, min_lat, max_lon, mid_lat, depth + 1),
+        (min_lon, mid_lat, mid_lon, max_lat, depth + 1),
+        (mid_lon, mid_lat, max_lon, max_lat, depth + 1),
+    ]
+
+
 class OSMService:
     def __init__(self):
-        self.api = overpy.Overpass()
+        # Endpoints, mirrors and concurrency are configured with OVERPASS_* environment variables
+        self.overpass = OverpassClient()
+        # Responses are cached on disk by query; OVERPASS_CACHE_* variables set size and TTLs
+        self.cache = OverpassCache()
+        if os.environ.get("NOMINATIM_URL"):
+            ox.settings.nominatim_url = os.environ["NOMINATIM_URL"]
+        # Geocoded places are resolved from a local name/alias index (GEOCODER_* variables) before
+        # Nominatim is asked; osmnx's per-request response files are imported once, then no longer
+        # written (OSMNX_USE_CACHE=1 keeps them)
+        self.geocoder = GeocoderStore()
+        if len(self.geocoder) == 0:
+            self.geocoder.import_nominatim_cache(ox.settings.cache_folder)
+        ox.settings.use_cache = os.environ.get("OSMNX_USE_CACHE", "0") == "1"
+        # One union query for all structure types instead of one query per type
+        self.combined_query = os.environ.get("OVERPASS_COMBINED_QUERY", "1") != "0"
+        # Incremental refreshes ask for changes since the previous snapshot minus this margin
+        # (seconds), which covers the replication lag of the Overpass database
+        self.newer_margin = int(os.environ.get("OVERPASS_NEWER_MARGIN", 3600))
+        # Areas larger than this (km²) are collected in tiles of tile_degrees, split up to
+        # tile_max_depth times when a tile runs out of time or memory (tile_maxsize bytes)
+        self.tile_area_sqkm = float(os.environ.get("OVERPASS_TILE_AREA_SQKM", 50000))
+        self.tile_degrees = float(os.environ.get("OVERPASS_TILE_DEGREES", 1.0))
+        self.tile_max_depth = int(os.environ.get("OVERPASS_TILE_MAX_DEPTH", 4))
+        self.tile_maxsize = int(os.environ.get("OVERPASS_TILE_MAXSIZE", 256 * 1024 * 1024))
+        # POIs of one facility mapped several times (node and building, campus and its buildings)
+        # are merged when similarly named within this distance in metres, or nested (0 disables)
+        self.dedup_distance_m = float(os.environ.get("OSM_DEDUP_DISTANCE_M", 100))
         
-    def collect_poi_data(self, area_name: str, structures: List[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    def collect_poi_data(
+        self,
+        area_name: str,
+        structures: List[str] = None,
+        progress_callback: Optional[Callable[[int, int, str], None]] = None,
+        combined: Optional[bool] = None,
+        force_refresh: bool = False
+    ) -> Dict[str, List[Dict[str, Any]]]:
         """
         Collect Points of Interest (POIs) from OpenStreetMap for a given area.
         
@@ -29,117 +104,436 @@ class OSMService:
             area_name: Name of the area to search (city, district, etc.)
             structures: List of structure types to search for (e.g., "hospital", "school")
                         If None, defaults to ["hospital", "school", "shelter", "fire_station", "police"]
+            progress_callback: Optional callable invoked as (completed, total, structure)
+                               after each structure type has been collected
+            combined: Fetch all structure types with one union query and split the
+                      response by tags (default: env OVERPASS_COMBINED_QUERY, on).
+                      Falls back to per-structure queries if the union query fails.
+            force_refresh: Query Overpass even when a fresh response is cached
         
         Returns:
             Dictionary with structure types as keys and lists of POIs as values
         """
         if structures is None:
             structures = ["hospital", "school", "shelter", "fire_station", "police"]
+        if combined is None:
+            combined = self.combined_query
+        timestamp = datetime.now().isoformat()
+        
+        if combined and len(structures) > 1:
+            logger.info(f"Collecting {', '.join(structures)} data for {area_name} with one query")
+            query = self._build_improved_query(area_name, structures)
+            _, table, error = next(self._run_queries(
+                {"combined": query},
+                {"combined": self.cache.ttl_for(structures)},
+                self._table_parser(structures, timestamp, split=True),
+                force_refresh
+            ))
+            if error is not None:
+                logger.error(f"Combined query failed for {area_name}, querying per structure: {str(error)}")
+            else:
+                self._deduplicate(table, area_name)
+                counts = table.counts()
+                for index, structure in enumerate(structures):
+                    logger.info(f"Found {counts.get(structure, 0)} {structure}(s) in {area_name}")
+                    if progress_callback:
+                        progress_callback(index + 1, len(structures), structure)
+                return table.to_poi_data(structures)
+        
+        # One query per structure type, run in parallel within the endpoints' limits
+        logger.info(f"Collecting {', '.join(structures)} data for {area_name}")
+        queries = {structure: self._build_improved_query(area_name, structure) for structure in structures}
+        max_ages = {structure: self.cache.ttl_for([structure]) for structure in structures}
+        collected = POITable(timestamp)
+        completed = 0
+        
+        parse = self._table_parser(structures, timestamp)
+        for structure, table, error in self._run_queries(queries, max_ages, parse, force_refresh):
+            completed += 1
+            if error is not None:
+                # The structure type still gets an (empty) list in the result
+                logger.error(f"Error collecting {structure} data for {area_name}: {str(error)}")
+            else:
+                collected.extend(table)
+                logger.info(f"Found {len(table)} {structure}(s) in {area_name}")
+            
+            if progress_callback:
+                progress_callback(completed, len(structures), structure)
+        
+        self._deduplicate(collected, area_name)
+        # Keep the requested order of structure types
+        return collected.to_poi_data(structures)
+    
+    def _table_parser(
+        self, structures: List[str], timestamp: str, split: bool = False
+    ) -> Callable[[Hashable, BinaryIO], POITable]:
+        """
+        Parser for _run_queries that streams a response into a POITable.
+        
+        Args:
+            structures: Structure types of a split (combined) response; otherwise
+                        the query key is the single structure type of the response
+            timestamp: lastUpdated of the POIs
+            split: Assign elements to structure types by their tags
+        """
+        def parse(key: Hashable, body: BinaryIO) -> POITable:
+            table = POITable(timestamp)
+            if split:
+                table.add_elements(iter_overpass_elements(body), structures, matches=matches_structure)
+            else:
+                table.add_elements(iter_overpass_elements(body), [key])
+            return table
+        
+        return parse
+    
+    def should_tile(self, area_name: str) -> bool:
+        """Whether an area is large enough to be collected in tiles (see collect_poi_data_tiled)"""
+        boundary_info = self.collect_boundary_data(area_name)
+        return boundary_info is not None and boundary_info["area_sqkm"] > self.tile_area_sqkm
+    
+    def collect_poi_data_tiled(
+        self,
+        area_name: str,
+        structures: List[str] = None,
+        progress_callback: Optional[Callable[[int, int, str], None]] = None,
+        force_refresh: bool = False
+    ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, Any]]:
+        """
+        Collect POIs of a large area by splitting its boundary bbox into tiles.
+        
+        Tiles of tile_degrees that intersect the boundary are queried in parallel
+        (one union query per tile). A tile that runs out of time or memory is
+        split into four, up to tile_max_depth times; tiles that still fail are
+        reported instead of silently returning fewer POIs. POIs are de-duplicated
+        by OSM id and clipped to the boundary.
+        
+        Args:
+            area_name: Name of the area to search
+            structures: List of structure types to search for (same default as collect_poi_data)
+            progress_callback: Optional callable invoked as (completed, total, label) per tile
+            force_refresh: Query Overpass even when a fresh response is cached
         
-        results = {}
+        Returns:
+            (poi_data, coverage) where coverage holds the tile counts, the failed
+            tiles with their errors, the covered fraction of the boundary and
+            whether the collection is complete
         
+        Raises:
+            ValueError: The boundary of the area could not be resolved
+        """
+        if structures is None:
+            structures = ["hospital", "school", "shelter", "fire_station", "police"]
+        boundary_info = self.collect_boundary_data(area_name)
+        boundary = load_boundary_geometry(area_name) if boundary_info else None
+        if boundary is None:
+            raise ValueError(f"No boundary found for {area_name}")
+        
+        min_lon, min_lat, max_lon, max_lat = boundary_info["bbox"]
+        step = self.tile_degrees
+        tiles = [
+            (lon, lat, min(lon + step, max_lon), min(lat + step, max_lat), 0)
+            for lat in _frange(min_lat, max_lat, step)
+            for lon in _frange(min_lon, max_lon, step)
+        ]
+        pending = [tile for tile in tiles if boundary.intersects(shapely.box(*tile[:4]))]
+        logger.info(f"Collecting {', '.join(structures)} data for {area_name} in {len(pending)} tile(s)")
+        
+        timestamp = datetime.now().isoformat()
+        collected = POITable(timestamp)
+        completed, failed = [], []
+        max_age = self.cache.ttl_for(structures)
+        parse = self._table_parser(structures, timestamp, split=True)
+        while pending:
+            queries = {tile: self._build_improved_query(area_name, structures, bbox=tile[:4]) for tile in pending}
+            pending = []
+            outstanding = len(queries)
+            for tile, table, error in self._run_queries(queries, dict.fromkeys(queries, max_age), parse, force_refresh):
+                outstanding -= 1
+                depth = tile[4]
+                if error is None:
+                    # POIs on tile edges are returned by both tiles; the table keeps one
+                    collected.extend(table)
+                    completed.append(tile)
+                elif isinstance(error, OverpassQueryTooLarge) and depth < self.tile_max_depth:
+                    children = [child for child in _split_tile(tile) if boundary.intersects(shapely.box(*child[:4]))]
+                    logger.info(f"Tile {tile[:4]} is too large, splitting into {len(children)}")
+                    pending.extend(children)
+                    continue
+                else:
+                    logger.error(f"Tile {tile[:4]} of {area_name} failed: {str(error)}")
+                    failed.append((tile, str(error)))
+                
+                if progress_callback:
+                    done = len(completed) + len(failed)
+                    progress_callback(done, done + outstanding + len(pending), f"tile {done}")
+        
+        self._clip_table(collected, boundary)
+        self._deduplicate(collected, area_name)
+        counts = collected.counts()
         for structure in structures:
+            logger.info(f"Found {counts.get(structure, 0)} {structure}(s) in {area_name}")
+        
+        missing = shapely.union_all([shapely.box(*tile[:4]) for tile, _ in failed]) if failed else None
+        missing_area = boundary.intersection(missing).area if missing is not None else 0.0
+        coverage = {
+            "mode": "tiled",
+            "tiles": len(completed) + len(failed),
+            "tiles_failed": len(failed),
+            "failed_tiles": [{"bbox": list(tile[:4]), "error": error} for tile, error in failed],
+            "covered_fraction": round(1 - missing_area / boundary.area, 4) if boundary.area else 1.0,
+            "complete": not failed
+        }
+        return collected.to_poi_data(structures), coverage
+    
+    def _deduplicate(self, table: POITable, area_name: str) -> None:
+        """Merge POIs that describe the same facility (see poi_dedup)"""
+        removed = deduplicate_table(table, self.dedup_distance_m)
+        if removed:
+            logger.info(f"Merged {removed} duplicate POI(s) in {area_name}")
+    
+    def _clip_table(self, table: POITable, boundary) -> None:
+        """Drop the POIs of a table outside a (prepared) boundary geometry"""
+        if len(table):
+            table.keep(shapely.contains_xy(boundary, *table.coordinates()))
+    
+    def refresh_poi_data(
+        self,
+        area_name: str,
+        previous: Dict[str, List[Dict[str, Any]]],
+        since: datetime,
+        structures: List[str] = None,
+        progress_callback: Optional[Callable[[int, int, str], None]] = None
+    ) -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, Dict[str, int]]]:
+        """
+        Update the POIs of an earlier collection with the changes made in OSM since then.
+        
+        Two queries run in parallel: one returns only the elements changed since
+        `since` (a newer: filter), the other the ids of all elements that currently
+        match (out ids). Changed elements replace or extend the previous POIs by
+        OSM id, and previous POIs whose id no longer matches are dropped (deleted
+        or retagged). Duplicates are then merged across kept and changed POIs.
+        Structure types missing from `previous` are collected in full.
+        
+        Args:
+            area_name: Name of the area to search
+            previous: poi_data of the earlier collection (structure type -> POIs)
+            since: When the earlier collection was made (naive datetimes are local time)
+            structures: Structure types to return (default: those in previous)
+            progress_callback: Optional callable invoked as (completed, total, structure)
+        
+        Returns:
+            (poi_data, changes) where changes maps each refreshed structure type to
+            its number of added, modified and deleted POIs
+        
+        Raises:
+            OverpassError: One of the queries failed
+        """
+        if structures is None:
+            structures = list(previous.keys())
+        refreshed = [structure for structure in structures if structure in previous]
+        missing = [structure for structure in structures if structure not in previous]
+        
+        results, changes = {}, {}
+        if refreshed:
+            newer = (since.astimezone(timezone.utc) - timedelta(seconds=self.newer_margin)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            logger.info(f"Refreshing {', '.join(refreshed)} data for {area_name} with changes since {newer}")
+            queries = {
+                "changed": self._build_improved_query(area_name, refreshed, newer=newer),
+                "current": self._build_improved_query(area_name, refreshed, out="ids"),
+            }
+            changed = POITable()
+            current_ids, changed_ids = set(), set()
+            responses = self.overpass.query_many(queries, raw=True)
             try:
-                logger.info(f"Collecting {structure} data for {area_name}")
-                
-                # Try simpler query format first with proper timeout
-                query = self._build_improved_query(area_name, structure)
-                
-                # Add retry mechanism to handle transient errors
-                max_retries = 3
-                retry_count = 0
-                
-                while retry_count < max_retries:
-                    try:
-                        osm_result = self.api.query(query)
-                        break  # Success - exit retry loop
-                    except Exception as e:
-                        retry_count += 1
-                        if retry_count >= max_retries:
-                            logger.warning(f"Failed after {max_retries} attempts for {structure} data")
-                            raise e
-                        logger.info(f"Retry {retry_count}/{max_retries} for {structure} data")
-                        time.sleep(1 + random.random())  # Add jitter to prevent thundering herd
-                
-                # Process nodes
-                poi_list = []
-                for node in osm_result.nodes:
-                    poi = {
-                        "id": f"node_{node.id}",
-                        "name": node.tags.get("name", f"Unnamed {structure.capitalize()}"),
-                        "type": structure,
-                        "latitude": float(node.lat),
-                        "longitude": float(node.lon),
-                        "details": self._extract_details(node.tags),
-                        "status": "active",
-                        "lastUpdated": self._get_last_update_date()
-                    }
-                    poi_list.append(poi)
-                
-                # Process ways (for larger structures like hospitals that may be outlined)
-                for way in osm_result.ways:
-                    # Handle ways with center attribute
-                    if "center" in way.attributes:
-                        lat = float(way.attributes["center"]["lat"])
-                        lon = float(way.attributes["center"]["lon"])
-                    else:
-                        # Calculate centroid if center is not provided and way has nodes
-                        if way.nodes and len(way.nodes) > 0:
-                            coords = [(float(node.lat), float(node.lon)) for node in way.nodes]
-                            if coords:
-                                lat = sum(c[0] for c in coords) / len(coords)
-                                lon = sum(c[1] for c in coords) / len(coords)
-                            else:
-                                continue
+                for key, body, error in responses:
+                    if error is not None:
+                        raise error
+                    with body:
+                        if key == "changed":
+                            elements = self._collect_ids(iter_overpass_elements(body), changed_ids)
+                            changed.add_elements(elements, refreshed, matches=matches_structure)
                         else:
-                            continue
-                    
-                    poi = {
-                        "id": f"way_{way.id}",
-                        "name": way.tags.get("name", f"Unnamed {structure.capitalize()}"),
-                        "type": structure,
-                        "latitude": lat,
-                        "longitude": lon, 
-                        "details": self._extract_details(way.tags),
-                        "status": "active",
-                        "lastUpdated": self._get_last_update_date()
-                    }
-                    poi_list.append(poi)
-                
-                # Add any relations with center coordinates
-                for rel in osm_result.relations:
-                    # Skip relations without center coordinates
-                    if "center" not in rel.attributes:
-                        continue
-                        
-                    lat = float(rel.attributes["center"]["lat"])
-                    lon = float(rel.attributes["center"]["lon"])
-                    
-                    poi = {
-                        "id": f"relation_{rel.id}",
-                        "name": rel.tags.get("name", f"Unnamed {structure.capitalize()}"),
-                        "type": structure,
-                        "latitude": lat,
-                        "longitude": lon, 
-                        "details": self._extract_details(rel.tags),
-                        "status": "active",
-                        "lastUpdated": self._get_last_update_date()
-                    }
-                    poi_list.append(poi)
-                
-                results[structure] = poi_list
-                logger.info(f"Found {len(poi_list)} {structure}(s) in {area_name}")
-                
+                            current_ids.update(
+                                f"{element['type']}_{element['id']}" for element in iter_overpass_elements(body)
+                            )
+            finally:
+                # After a failure the other query's response has not been read; close it too
+                for _, body, _ in responses:
+                    if body is not None:
+                        body.close()
+            
+            # Kept: still present and unchanged; changed elements are re-assigned by their tags.
+            # Changed rows come first, so they win ties when deduplication merges them with kept POIs
+            merged = POITable(changed.timestamp)
+            merged.extend(changed)
+            kept = {}
+            for structure in refreshed:
+                kept[structure] = {
+                    poi["id"]: poi for poi in previous[structure]
+                    if poi["id"] in current_ids and poi["id"] not in changed_ids
+                }
+                for poi in kept[structure].values():
+                    merged.add_poi(poi)
+            # Duplicates can pair a changed POI with a kept one (e.g. a hospital newly mapped as a building)
+            self._deduplicate(merged, area_name)
+            merged_data = merged.to_poi_data(refreshed)
+            for index, structure in enumerate(refreshed):
+                previous_ids = {poi["id"] for poi in previous[structure]}
+                results[structure], updated_ids = [], set()
+                for poi in merged_data[structure]:
+                    original = kept[structure].get(poi["id"])
+                    if original is None:
+                        updated_ids.add(poi["id"])
+                        results[structure].append(poi)
+                    else:
+                        # Kept POIs keep their lastUpdated; deduplication may have named an unnamed one
+                        results[structure].append({**original, "name": poi["name"]})
+                changes[structure] = {
+                    "added": len(updated_ids - previous_ids),
+                    "modified": len(updated_ids & previous_ids),
+                    "deleted": len(previous_ids - {poi["id"] for poi in results[structure]}),
+                }
+                logger.info(
+                    f"{structure} in {area_name}: {changes[structure]['added']} added, "
+                    f"{changes[structure]['modified']} modified, {changes[structure]['deleted']} deleted"
+                )
+                if progress_callback:
+                    progress_callback(index + 1, len(structures), structure)
+        
+        if missing:
+            def on_missing_progress(completed: int, total: int, structure: str):
+                if progress_callback:
+                    progress_callback(len(refreshed) + completed, len(structures), structure)
+            
+            results.update(self.collect_poi_data(area_name, missing, progress_callback=on_missing_progress))
+        
+        return {structure: results[structure] for structure in structures}, changes
+    
+    def _collect_ids(self, elements: Iterator[Dict[str, Any]], ids: set) -> Iterator[Dict[str, Any]]:
+        """Pass elements through, adding their POI ids ("node_1", "way_2", ...) to ids"""
+        for element in elements:
+            ids.add(f"{element['type']}_{element['id']}")
+            yield element
+    
+    def _run_queries(
+        self,
+        queries: Dict[Hashable, str],
+        max_ages: Dict[Hashable, float],
+        parse: Callable[[Hashable, BinaryIO], Any],
+        force_refresh: bool = False
+    ) -> Iterator[Tuple[Hashable, Any, Optional[Exception]]]:
+        """
+        Answer queries from the response cache where a fresh response exists and
+        fetch the rest from Overpass in parallel, caching the new responses.
+        
+        Response bodies are never loaded whole: each one is handed to parse as a
+        binary file (see poi_table.iter_overpass_elements), and only stored in
+        the cache once it parsed.
+        
+        Args:
+            queries: Overpass QL queries by key
+            max_ages: Maximum age in seconds of a cached response, by key
+            parse: Callable (key, body) -> result reading a response body
+            force_refresh: Skip cached responses (new responses are still stored)
+        
+        Yields:
+            (key, result, error) tuples, cached responses first
+        """
+        misses = {}
+        for key, query in queries.items():
+            body = None if force_refresh else self.cache.open(query, max_ages[key])
+            if body is None:
+                misses[key] = query
+                continue
+            try:
+                with body:
+                    result = parse(key, body)
             except Exception as e:
-                logger.error(f"Error collecting {structure} data for {area_name}: {str(e)}")
-                # Make sure we include an empty list even when errors occur
-                results[structure] = []
+                self.cache.discard(query, reason=f"unparsable response: {str(e)}")
+                misses[key] = query
+                continue
+            yield key, result, None
         
-        return results
+        for key, body, error in self.overpass.query_many(misses, raw=True):
+            if error is not None:
+                yield key, None, error
+                continue
+            with body:
+                try:
+                    result = parse(key, body)
+                except Exception as e:
+                    yield key, None, OverpassError(f"Invalid Overpass response: {str(e)}")
+                    continue
+                try:
+                    body.seek(0)
+                    self.cache.put(misses[key], body)
+                except OSError as e:
+                    logger.warning(f"Could not cache Overpass response: {str(e)}")
+            yield key, result, None
+    
+    def collect_poi_data_from_extract(
+        self,
+        area_name: str,
+        extract_path: str,
+        structures: List[str] = None,
+        progress_callback: Optional[Callable[[int, int, str], None]] = None,
+        clip: bool = True
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Collect POIs from a local .osm.pbf extract instead of Overpass.
+        
+        Uses the same structure filters as the Overpass queries and positions
+        ways and relations at their bounding-box center, like "out center".
+        
+        Args:
+            area_name: Name of the area; POIs outside its boundary are dropped
+            extract_path: .osm.pbf file covering the area (see osm_pbf.resolve_extract_path)
+            structures: List of structure types to search for (same default as collect_poi_data)
+            progress_callback: Optional callable invoked as (completed, total, structure)
+            clip: Keep only POIs inside the area's boundary (all POIs in the extract
+                  are kept when the boundary cannot be resolved)
+        
+        Returns:
+            Dictionary with structure types as keys and lists of POIs as values
+        """
+        if structures is None:
+            structures = ["hospital", "school", "shelter", "fire_station", "police"]
+        
+        boundary = None
+        if clip:
+            if self.collect_boundary_data(area_name) is not None:
+                boundary = load_boundary_geometry(area_name)
+            if boundary is None:
+                logger.warning(f"No boundary for {area_name}, keeping every POI in {extract_path}")
+        
+        keys = {key for structure in structures for key in structure_schema(structure).keys}
+        
+        def accept_relation(tags: Dict[str, str]) -> bool:
+            return any(matches_structure("relation", tags, structure) for structure in structures)
+        
+        logger.info(f"Collecting {', '.join(structures)} data for {area_name} from {extract_path}")
+        table = POITable()
+        elements = iter_pbf_elements(extract_path, keys, accept_relation)
+        for element_type, element_id, lat, lon, tags, extent in elements:
+            for structure in structures:
+                if matches_structure(element_type, tags, structure):
+                    table.add(element_type, element_id, lat, lon, tags, structure, extent)
+        
+        if boundary is not None:
+            self._clip_table(table, boundary)
+        self._deduplicate(table, area_name)
+        counts = table.counts()
+        for index, structure in enumerate(structures):
+            logger.info(f"Found {counts.get(structure, 0)} {structure}(s) in {area_name}")
+            if progress_callback:
+                progress_callback(index + 1, len(structures), structure)
+        
+        return table.to_poi_data(structures)
     
     def collect_boundary_data(self, location: str) -> Optional[Dict[str, Any]]:
         """
-        Collect boundary data for a location and save it as GeoJSON.
+        Collect boundary data for a location, save it as GeoJSON and store its
+        simplified levels and metrics (see boundary_store).
         
         Args:
             location: Full location name (e.g., "Alappuzha, Kerala, India")
@@ -149,41 +543,47 @@ class OSMService:
         """
         try:
             # Create data directory if it doesn't exist
-            os.makedirs("data/boundaries", exist_ok=True)
-            
-            # Clean the location name to create a valid filename
-            clean_name = location.replace(", ", "_").replace(" ", "_").lower()
-            file_path = f"data/boundaries/{clean_name}_boundary.geojson"
+            os.makedirs(BOUNDARY_DIR, exist_ok=True)
+            file_path = boundary_path(location)
             
-            # Check if the boundary file already exists
-            if os.path.exists(file_path):
+            metrics = load_boundary_metrics(location)
+            place = self.geocoder.lookup(location)
+            gdf = None
+            if metrics is not None:
                 logger.info(f"Using cached boundary data for {location}")
-                gdf = gpd.read_file(file_path)
             else:
-                logger.info(f"Downloading boundary data for {location}")
-                gdf = ox.geocode_to_gdf(location)
-                
-                # Project to a suitable CRS for area calculation (e.g., UTM)
-                try:
-                    # Try to determine appropriate UTM zone based on centroid
-                    centroid = gdf.unary_union.centroid
-                    utm_crs = self._get_utm_crs(centroid.y, centroid.x)
-                    gdf_projected = gdf.to_crs(utm_crs)
-                    area_sqkm = round(gdf_projected.area.sum() / 1e6, 2)
-                except Exception:
-                    # Fallback if projection fails
-                    area_sqkm = round(gdf.area.sum() / 1e6, 2)
-                    logger.warning("Using geographic CRS for area calculation; results may be approximate")
+                # Check if the boundary file already exists
+                if os.path.exists(file_path):
+                    logger.info(f"Building boundary levels from cached boundary data for {location}")
+                    gdf = gpd.read_file(file_path)
+                else:
+                    if place is not None:
+                        logger.info(f"Resolved {location} to {place['display_name']} from the geocoder store")
+                        gdf = self.geocoder.polygon_gdf(place)
+                    else:
+                        logger.info(f"Downloading boundary data for {location}")
+                        gdf = ox.geocode_to_gdf(location)
+                        place = self.geocoder.add_gdf(location, gdf)
+                    
+                    # Save to GeoJSON
+                    gdf.to_file(file_path, driver="GeoJSON")
                 
-                # Save to GeoJSON
-                gdf.to_file(file_path, driver="GeoJSON")
+                metrics = build_boundary_levels(gdf, location)
+            
+            if place is None and os.path.exists(file_path):
+                # Boundaries downloaded before the geocoder store existed still carry their OSM id
+                place = self.geocoder.add_gdf(location, gdf if gdf is not None else gpd.read_file(file_path))
             
             # Extract and return basic information
             boundary_info = {
                 "name": location,
                 "file_path": file_path,
-                "area_sqkm": area_sqkm,
-                "bbox": gdf.total_bounds.tolist()
+                "area_sqkm": metrics["area_sqkm"],
+                "bbox": metrics["bbox"],
+                "centroid": metrics["centroid"],
+                "levels_m": [level["tolerance_m"] for level in metrics["levels"]],
+                "osm_type": place["osm_type"] if place else None,
+                "osm_id": place["osm_id"] if place else None
             }
             
             return boundary_info
@@ -192,92 +592,79 @@ class OSMService:
             logger.error(f"Error collecting boundary data for {location}: {str(e)}")
             return None
     
-    def _build_improved_query(self, area_name: str, structure: str) -> str:
-        """Build an improved Overpass QL query for a specific area and structure type"""
-        # For structures that are typically tagged with amenity
-        amenity_structures = ["hospital", "school", "shelter", "fire_station", "police"]
+    def _build_improved_query(
+        self, area_name: str, structures, newer: str = None, out: str = "center", bbox: tuple = None
+    ) -> str:
+        """
+        Build an Overpass QL query for a specific area.
         
-        if structure in amenity_structures:
-            return f"""
-                [out:json][timeout:60];
-                area["name"="{area_name}"][admin_level~"."]->.searchArea;
-                (
-                  node["amenity"="{structure}"](area.searchArea);
-                  way["amenity"="{structure}"](area.searchArea);
-                  relation["amenity"="{structure}"](area.searchArea);
-                );
-                out center;
-            """
-        # For infrastructure like water sources or power substations
-        elif structure == "water":
-            return f"""
-                [out:json][timeout:60];
-                area["name"="{area_name}"][admin_level~"."]->.searchArea;
-                (
-                  node["man_made"~"water_tower|water_well|water_works"](area.searchArea);
-                  way["man_made"~"water_tower|water_works"](area.searchArea);
-                  node["natural"="water"](area.searchArea);
-                  way["natural"="water"](area.searchArea);
-                );
-                out center;
-            """
-        elif structure == "power":
+        Args:
+            area_name: Name of the area to search
+            structures: One structure type, or a list of types to fetch with a single union query
+            newer: Only elements changed since this UTC timestamp (YYYY-MM-DDTHH:MM:SSZ)
+            out: Output mode ("center" for POIs, "ids" for ids only)
+            bbox: Query this (min_lon, min_lat, max_lon, max_lat) tile instead of the named
+                  area, with a 60 second timeout and tile_maxsize memory budget
+        """
+        if isinstance(structures, str):
+            structures = [structures]
+        
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            spatial_filter = f"{min_lat:.6f},{min_lon:.6f},{max_lat:.6f},{max_lon:.6f}"
+        else:
+            spatial_filter = "area.searchArea"
+        
+        statements = []
+        for structure in structures:
+            for statement in structure_schema(structure).overpass_statements(spatial_filter, newer):
+                if statement not in statements:
+                    statements.append(statement)
+        
+        # POIs only need a position and tags: nodes are printed with their coordinates, ways
+        # and relations with their bounding box (its middle is their center; its extent is used
+        # by deduplication) but without node and member lists ("out tags")
+        if out == "ids":
+            output = ".matches out ids qt;"
+        else:
+            output = "node.matches;\n                out qt;\n" \
+                     "                (way.matches; relation.matches;);\n                out tags bb qt;"
+        
+        # The area lookup is done once, however many structure types are requested
+        timeout = 60 if len(structures) == 1 else 180
+        body = "\n".join(f"                  {statement}" for statement in statements)
+        if bbox is not None:
             return f"""
-                [out:json][timeout:60];
-                area["name"="{area_name}"][admin_level~"."]->.searchArea;
+                [out:json][timeout:60][maxsize:{self.tile_maxsize}];
                 (
-                  node["power"~"substation|plant|generator"](area.searchArea);
-                  way["power"~"substation|plant|generator"](area.searchArea);
-                );
-                out center;
+{body}
+                )->.matches;
+                {output}
             """
-        else:
-            # Generic query for other structure types
-            return f"""
-                [out:json][timeout:60];
-                area["name"="{area_name}"][admin_level~"."]->.searchArea;
+        return f"""
+                [out:json][timeout:{timeout}];
+                {self._search_area(area_name)}
                 (
-                  node["{structure}"](area.searchArea);
-                  way["{structure}"](area.searchArea);
-                  relation["{structure}"](area.searchArea);
-                );
-                out center;
+{body}
+                )->.matches;
+                {output}
             """
     
-    def _get_utm_crs(self, lat: float, lon: float) -> int:
-        """Determine the UTM CRS code based on latitude and longitude"""
-        # UTM zones are 6 degrees wide
-        zone_number = int((lon + 180) / 6) + 1
-        
-        # Northern or southern hemisphere
-        epsg = 32600 + zone_number if lat >= 0 else 32700 + zone_number
+    def _search_area(self, area_name: str) -> str:
+        """
+        Overpass statement that sets .searchArea to the exact OSM area of a
+        location: the area of the relation (or closed way) it is geocoded to by
+        collect_boundary_data. Unlike a name match this neither scans every
+        area of that name nor unions namesakes, and every spelling of a place
+        yields the same query (and cache entry). Locations that cannot be
+        geocoded fall back to matching areas by name.
+        """
+        place = self.geocoder.lookup(area_name)
+        if place is None and self.collect_boundary_data(area_name) is not None:
+            place = self.geocoder.lookup(area_name)
+        if place is not None and place["osm_type"] in AREA_ID_OFFSETS:
+            return f"area(id:{AREA_ID_OFFSETS[place['osm_type']] + place['osm_id']})->.searchArea;"
         
-        return f"EPSG:{epsg}"
-    
-    def _extract_details(self, tags: Dict[str, str]) -> str:
-        """Extract useful details from OSM tags"""
-        details = []
-        
-        # Add important/common tags to the details
-        important_tags = ["capacity", "beds", "operator", "emergency", "healthcare", 
-                          "building", "levels", "water_supply", "generator:source",
-                          "phone", "contact:phone", "website", "contact:website"]
-        
-        for tag, value in tags.items():
-            if tag in important_tags and value:
-                details.append(f"{tag.replace('_', ' ').title()}: {value}")
-        
-        # If no important tags found, use description or name as fallback
-        if not details:
-            if "description" in tags:
-                return tags["description"]
-            elif "name" in tags:
-                return f"Name: {tags['name']}"
-            return "No detailed information available"
-            
-        return ". ".join(details)
-    
-    def _get_last_update_date(self) -> str:
-        """Return current date as last update date in ISO format"""
-        from datetime import datetime
-        return datetime.now().isoformat()
\ No newline at end of file
+        logger.warning(f"No OSM id known for {area_name}, matching the search area by name")
+        name = (place["name"] if place is not None else area_name).replace("\\", "\\\\").replace('"', '\\"')
+        return f'area["name"="{name}"][admin_level~"."]->.searchArea;'
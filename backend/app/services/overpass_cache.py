@@ -0,0 +1,225 @@
+"""
+Persistent cache of Overpass responses for DisasterLens AI.
+Responses are content-addressed by a hash of the Overpass QL that produced
+them and stored gzip-compressed on disk, with a SQLite index holding sizes and
+access times. Freshness is decided per read (each structure type has its own
+TTL) and the total size is bounded by evicting least recently used entries.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, BinaryIO, Dict, Iterable, Optional
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How long a response stays fresh per structure type. Shelters are opened and
+# closed during a disaster; hospitals and schools rarely change in OSM.
+DEFAULT_TTL_SECONDS = {
+    "shelter": 6 * 3600,
+    "hospital": 3 * 24 * 3600,
+    "fire_station": 3 * 24 * 3600,
+    "police": 3 * 24 * 3600,
+    "school": 7 * 24 * 3600,
+    "water": 7 * 24 * 3600,
+    "power": 7 * 24 * 3600,
+}
+
+
+def query_cache_key(query: str) -> str:
+    """
+    Content address of an Overpass QL query: SHA-256 of the query with
+    indentation and blank lines removed (whitespace inside lines is kept, since
+    it can be part of a tag value).
+    """
+    lines = [line.strip() for line in query.strip().splitlines()]
+    normalized = "\n".join(line for line in lines if line)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class OverpassCache:
+    def __init__(
+        self,
+        cache_dir: str = None,
+        max_bytes: int = None,
+        default_ttl: int = None,
+        ttls: Dict[str, int] = None,
+    ):
+        """
+        Open (or create) the response cache.
+
+        Args:
+            cache_dir: Directory for compressed responses and the index.db index
+                       (env OVERPASS_CACHE_DIR, default data/overpass_cache)
+            max_bytes: Maximum total size of the compressed responses
+                       (env OVERPASS_CACHE_MAX_BYTES, default 256 MB; 0 disables the cache)
+            default_ttl: Freshness of structure types without their own TTL
+                         (env OVERPASS_CACHE_TTL, default 1 day)
+            ttls: TTL overrides per structure type in seconds (env OVERPASS_CACHE_TTLS,
+                  e.g. "shelter=3600,hospital=86400"; defaults in DEFAULT_TTL_SECONDS)
+        """
+        self.cache_dir = cache_dir or os.environ.get("OVERPASS_CACHE_DIR", "data/overpass_cache")
+        self.max_bytes = (
+            max_bytes if max_bytes is not None
+            else int(os.environ.get("OVERPASS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+        )
+        self.default_ttl = default_ttl if default_ttl is not None else int(os.environ.get("OVERPASS_CACHE_TTL", 24 * 3600))
+        self.ttls = dict(DEFAULT_TTL_SECONDS)
+        if ttls is None:
+            ttls = {}
+            for item in os.environ.get("OVERPASS_CACHE_TTLS", "").split(","):
+                structure, _, seconds = item.partition("=")
+                if structure.strip() and seconds.strip():
+                    ttls[structure.strip()] = int(seconds)
+        self.ttls.update(ttls)
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(self.cache_dir, "index.db"), check_same_thread=False, isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                cache_key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                raw_size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def ttl_for(self, structures: Iterable[str]) -> int:
+        """Freshness of a response covering these structure types (the shortest of their TTLs)"""
+        return min((self.ttls.get(structure, self.default_ttl) for structure in structures), default=self.default_ttl)
+
+    def _path(self, cache_key: str) -> str:
+        return os.path.join(self.cache_dir, cache_key[:2], f"{cache_key}.json.gz")
+
+    def open(self, query: str, max_age: float) -> Optional[BinaryIO]:
+        """
+        Open the cached response of a query if it is younger than max_age seconds.
+
+        Returns:
+            A binary file that decompresses the response while it is read (the
+            caller closes it), or None on a miss
+        """
+        if not self.enabled:
+            return None
+        cache_key = query_cache_key(query)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at FROM responses WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None or now - row["created_at"] > max_age:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE cache_key = ?", (now, cache_key))
+
+        try:
+            body = gzip.open(self._path(cache_key), "rb")
+        except OSError as e:
+            self.discard(query, reason=str(e))
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return body
+
+    def discard(self, query: str, reason: str = None) -> None:
+        """Drop an entry (e.g. one that turned out to be unreadable)"""
+        cache_key = query_cache_key(query)
+        if reason:
+            logger.warning(f"Dropping Overpass cache entry {cache_key}: {reason}")
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE cache_key = ?", (cache_key,))
+        try:
+            os.remove(self._path(cache_key))
+        except FileNotFoundError:
+            pass
+
+    def put(self, query: str, body: BinaryIO) -> None:
+        """
+        Store the response of a query (read from a binary file, which is left at
+        its end), replacing an older one, and evict to stay within max_bytes.
+        """
+        if not self.enabled:
+            return
+        cache_key = query_cache_key(query)
+        path = self._path(cache_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        raw_size = 0
+        with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+            for chunk in iter(lambda: body.read(256 * 1024), b""):
+                f.write(chunk)
+                raw_size += len(chunk)
+        size = os.path.getsize(tmp_path)
+        if size > self.max_bytes:
+            os.remove(tmp_path)
+            return
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (cache_key, size, raw_size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (cache_key, size, raw_size, now, now),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used responses until the total size fits max_bytes (lock held)"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = []
+        for row in self._conn.execute("SELECT cache_key, size FROM responses ORDER BY accessed_at"):
+            if total <= self.max_bytes:
+                break
+            evicted.append(row["cache_key"])
+            total -= row["size"]
+        self._conn.executemany("DELETE FROM responses WHERE cache_key = ?", [(key,) for key in evicted])
+        for cache_key in evicted:
+            try:
+                os.remove(self._path(cache_key))
+            except FileNotFoundError:
+                pass
+        logger.info(f"Evicted {len(evicted)} Overpass response(s) from the cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, stored and uncompressed sizes, and hit/miss counters"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS size, COALESCE(SUM(raw_size), 0) AS raw_size "
+                "FROM responses"
+            ).fetchone()
+            return {
+                "enabled": self.enabled,
+                "entries": row["entries"],
+                "bytes": row["size"],
+                "uncompressed_bytes": row["raw_size"],
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
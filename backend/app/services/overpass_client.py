@@ -0,0 +1,445 @@
+"""
+Overpass API client for DisasterLens AI.
+Sends Overpass QL queries to a list of endpoints (the main instance and
+mirrors) with a per-endpoint concurrency limit, respects the slot budget an
+endpoint reports on /api/status, fails over to the next endpoint on errors,
+hedges slow requests on a second endpoint and keeps per-endpoint latency and
+error counters. Several queries (per structure type or per tile) can run in
+parallel with query_many. Response bodies are streamed into spooled
+temporary files (in memory up to a limit, on disk beyond), so callers can
+parse them incrementally and cache them without holding them in memory.
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Any, BinaryIO, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import overpy
+import requests
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The main instance (overpy's default); mirrors are opt-in through OVERPASS_URLS
+DEFAULT_ENDPOINTS = [
+    "https://overpass-api.de/api/interpreter",
+]
+
+# Seconds a parsed /api/status response is trusted
+STATUS_TTL_SECONDS = 5.0
+
+_SLOTS_AVAILABLE = re.compile(r"(\d+) slots? available now")
+_SLOT_AFTER = re.compile(r"Slot available after: \S+, in (-?\d+) seconds?")
+_RATE_LIMIT = re.compile(r"Rate limit: (\d+)")
+_REMARK = re.compile(rb'"remark"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+# Bytes read from the end of a response to find the remark and check it is complete
+_TAIL_BYTES = 64 * 1024
+
+
+class OverpassError(Exception):
+    """A query failed on an endpoint (HTTP error, timeout, rate limit or runtime error)"""
+
+
+class OverpassBadQuery(OverpassError):
+    """The endpoint rejected the query itself (HTTP 400); retrying elsewhere will not help"""
+
+
+class OverpassQueryTooLarge(OverpassBadQuery):
+    """The query ran out of time or memory; it needs to be split (e.g. into smaller tiles)"""
+
+
+def _close_result(future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class OverpassEndpoint:
+    def __init__(self, url: str, max_concurrency: int):
+        """
+        One Overpass endpoint with its concurrency limit, slot status and counters.
+
+        Args:
+            url: Interpreter URL (e.g. https://overpass-api.de/api/interpreter)
+            max_concurrency: Requests sent to this endpoint at the same time
+        """
+        self.url = url
+        self.status_url = url.rsplit("/", 1)[0] + "/status"
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.hedged = 0
+        self.in_flight = 0
+        self.consecutive_errors = 0
+        self.last_error: Optional[str] = None
+        self._cooldown_until = 0.0
+        self._latencies = deque(maxlen=200)
+
+        self._status_checked = 0.0
+        self._status_supported = True
+        self._slot_wait = 0.0
+
+    def slot_wait(self, session: requests.Session) -> float:
+        """
+        Seconds until this endpoint has a free slot for us, from /api/status.
+        Endpoints without a status page (or with no rate limit) report 0.
+        """
+        with self._lock:
+            if not self._status_supported:
+                return 0.0
+            if time.time() - self._status_checked < STATUS_TTL_SECONDS:
+                return max(0.0, self._slot_wait - (time.time() - self._status_checked))
+
+        try:
+            response = session.get(self.status_url, timeout=5)
+        except requests.RequestException:
+            return 0.0
+
+        with self._lock:
+            self._status_checked = time.time()
+            if response.status_code != 200:
+                self._status_supported = False
+                return 0.0
+            text = response.text
+            rate_limit = _RATE_LIMIT.search(text)
+            available = _SLOTS_AVAILABLE.search(text)
+            waits = [int(seconds) for seconds in _SLOT_AFTER.findall(text)]
+            if rate_limit and int(rate_limit.group(1)) == 0:
+                self._slot_wait = 0.0  # No rate limit on this instance
+            elif available and int(available.group(1)) > 0:
+                self._slot_wait = 0.0
+            else:
+                self._slot_wait = float(max(0, min(waits))) if waits else 0.0
+            return self._slot_wait
+
+    def acquire(self) -> None:
+        self._semaphore.acquire()
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    def record(self, latency: float, error: Optional[str] = None, rate_limited: bool = False) -> None:
+        with self._lock:
+            self.requests += 1
+            if error is None:
+                self._latencies.append(latency)
+                self.consecutive_errors = 0
+                return
+            self.errors += 1
+            self.rate_limited += int(rate_limited)
+            self.consecutive_errors += 1
+            self.last_error = error
+            # Back off from failing endpoints: 2, 4, 8 ... up to 60 seconds
+            self._cooldown_until = time.time() + min(60, 2 ** self.consecutive_errors)
+            if rate_limited:
+                # The slot budget is used up; re-read /api/status before the next request
+                self._status_checked = 0.0
+
+    def record_hedge(self) -> None:
+        with self._lock:
+            self.hedged += 1
+
+    def cooldown(self) -> float:
+        """Seconds until a recently failing endpoint is preferred again"""
+        return max(0.0, self._cooldown_until - time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+        def percentile(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+
+        return {
+            "url": self.url,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "hedged": self.hedged,
+            "consecutive_errors": self.consecutive_errors,
+            "cooldown_seconds": round(self.cooldown(), 1),
+            "slot_wait_seconds": round(self._slot_wait, 1) if self._status_supported else None,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+            "last_error": self.last_error,
+        }
+
+
+class OverpassClient:
+    def __init__(
+        self,
+        endpoints: List[str] = None,
+        max_concurrency: int = None,
+        hedge_after: float = None,
+        max_slot_wait: float = None,
+        timeout: float = None,
+        max_retries: int = None,
+        max_parallel_queries: int = None,
+        spool_bytes: int = None,
+    ):
+        """
+        Create the client.
+
+        Args:
+            endpoints: Interpreter URLs in order of preference (env OVERPASS_URLS, comma-separated;
+                       falls back to OVERPASS_URL, then overpass-api.de only)
+            max_concurrency: Concurrent requests per endpoint (env OVERPASS_MAX_CONCURRENCY, default 2)
+            hedge_after: Seconds after which a slow request is duplicated on the next endpoint
+                         (env OVERPASS_HEDGE_SECONDS, default 20; 0 disables hedging)
+            max_slot_wait: Longest wait for a free slot before failing over
+                           (env OVERPASS_MAX_SLOT_WAIT, default 30 seconds)
+            timeout: HTTP timeout per request (env OVERPASS_TIMEOUT, default 200 seconds)
+            max_retries: Rounds over all endpoints before a query fails (env OVERPASS_MAX_RETRIES, default 3)
+            max_parallel_queries: Queries run at once by query_many (default: total endpoint concurrency)
+            spool_bytes: Response size above which a body is spooled to disk
+                         (env OVERPASS_SPOOL_BYTES, default 16 MB)
+        """
+        if endpoints is None:
+            configured = os.environ.get("OVERPASS_URLS") or os.environ.get("OVERPASS_URL")
+            endpoints = [url.strip() for url in configured.split(",") if url.strip()] if configured else DEFAULT_ENDPOINTS
+        max_concurrency = max_concurrency or int(os.environ.get("OVERPASS_MAX_CONCURRENCY", 2))
+        self.endpoints = [OverpassEndpoint(url, max_concurrency) for url in endpoints]
+        self.hedge_after = hedge_after if hedge_after is not None else float(os.environ.get("OVERPASS_HEDGE_SECONDS", 20))
+        self.max_slot_wait = (
+            max_slot_wait if max_slot_wait is not None else float(os.environ.get("OVERPASS_MAX_SLOT_WAIT", 30))
+        )
+        self.timeout = timeout or float(os.environ.get("OVERPASS_TIMEOUT", 200))
+        self.max_retries = max_retries or int(os.environ.get("OVERPASS_MAX_RETRIES", 3))
+        self.max_parallel_queries = max_parallel_queries or max_concurrency * len(self.endpoints)
+        self.spool_bytes = spool_bytes or int(os.environ.get("OVERPASS_SPOOL_BYTES", 16 * 1024 * 1024))
+
+        # Response parsing only; requests are sent by this client
+        self._parser = overpy.Overpass()
+        self._local = threading.local()
+        # Runs individual endpoint requests, including hedged duplicates
+        self._fetch_pool = ThreadPoolExecutor(
+            max_workers=2 * max_concurrency * len(self.endpoints) + 2,
+            thread_name_prefix="overpass-fetch",
+        )
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _ranked_endpoints(self) -> List[OverpassEndpoint]:
+        """Healthy endpoints first (in configured order), then failing ones by remaining cooldown"""
+        healthy = [endpoint for endpoint in self.endpoints if endpoint.cooldown() == 0]
+        cooling = sorted((e for e in self.endpoints if e.cooldown() > 0), key=lambda e: e.cooldown())
+        return healthy + cooling
+
+    def parse(self, body: BinaryIO) -> overpy.Result:
+        """Parse a response body (JSON, or XML for [out:xml] queries) into an overpy result"""
+        content = body.read()
+        if content.lstrip()[:1] == b"<":
+            return self._parser.parse_xml(content)
+        return overpy.Result.from_json(json.loads(content), api=self._parser)
+
+    def _check_body(self, body: BinaryIO) -> Optional[str]:
+        """
+        Read the end of a JSON response: return the remark Overpass appends after
+        the elements (None if there is none), or raise ValueError if the body is
+        truncated.
+        """
+        size = body.seek(0, os.SEEK_END)
+        body.seek(max(0, size - _TAIL_BYTES))
+        tail = body.read()
+        body.seek(0)
+        if not tail.rstrip().endswith(b"}"):
+            raise ValueError("truncated JSON response")
+        match = _REMARK.search(tail)
+        return json.loads(match.group(1)) if match else None
+
+    def _fetch(self, endpoint: OverpassEndpoint, query: str) -> BinaryIO:
+        session = self._session()
+        slot_wait = endpoint.slot_wait(session)
+        if slot_wait > self.max_slot_wait:
+            raise OverpassError(f"{endpoint.url}: no free slot for {slot_wait:.0f}s")
+
+        if slot_wait > 0:
+            # Wait before taking a concurrency permit, so the endpoint's other requests are not held up
+            time.sleep(slot_wait)
+        endpoint.acquire()
+        try:
+            started = time.perf_counter()
+            body = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+            response = None
+            try:
+                try:
+                    response = session.post(endpoint.url, data=query.encode("utf-8"), timeout=self.timeout, stream=True)
+                    if response.status_code == 200:
+                        for chunk in response.iter_content(chunk_size=64 * 1024):
+                            body.write(chunk)
+                except requests.RequestException as e:
+                    body.close()
+                    endpoint.record(time.perf_counter() - started, error=f"{type(e).__name__}: {e}")
+                    raise OverpassError(f"{endpoint.url}: {e}") from e
+                latency = time.perf_counter() - started
+
+                if response.status_code == 400:
+                    body.close()
+                    # A malformed query is not the endpoint's fault; do not penalize it
+                    endpoint.record(latency)
+                    raise OverpassBadQuery(f"{endpoint.url}: bad query: {response.text[:200]}")
+                if response.status_code != 200:
+                    body.close()
+                    error = f"HTTP {response.status_code}"
+                    endpoint.record(latency, error=error, rate_limited=response.status_code in (429, 504))
+                    raise OverpassError(f"{endpoint.url}: {error}")
+
+                content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+                if content_type != "application/osm3s+xml":
+                    try:
+                        remark = self._check_body(body) or ""
+                    except ValueError as e:
+                        body.close()
+                        endpoint.record(latency, error=f"invalid response: {e}")
+                        raise OverpassError(f"{endpoint.url}: invalid response: {e}") from e
+                    # Timeouts and memory exhaustion are reported in a 200 response
+                    if "runtime error" in remark and ("timed out" in remark or "out of memory" in remark):
+                        body.close()
+                        # The query exceeded its [timeout]/[maxsize] budget; a mirror will not do better
+                        endpoint.record(latency)
+                        raise OverpassQueryTooLarge(f"{endpoint.url}: {remark}")
+                    if "runtime error" in remark:
+                        body.close()
+                        endpoint.record(latency, error=remark[:200])
+                        raise OverpassError(f"{endpoint.url}: {remark}")
+
+                endpoint.record(latency)
+                body.seek(0)
+                return body
+            finally:
+                # Return the connection to the pool; error responses are never read to the end
+                if response is not None:
+                    response.close()
+        finally:
+            endpoint.release()
+
+    def _query_once(self, query: str, endpoints: List[OverpassEndpoint], errors: List[str]) -> Optional[BinaryIO]:
+        """
+        One round over the endpoints: start on the first, move on to the next when
+        a request fails, and start a hedged duplicate when it is slower than hedge_after.
+        """
+        remaining = list(endpoints)
+        pending = {}
+
+        def launch() -> bool:
+            if not remaining:
+                return False
+            endpoint = remaining.pop(0)
+            pending[self._fetch_pool.submit(self._fetch, endpoint, query)] = endpoint
+            return True
+
+        launch()
+        while pending:
+            # Only hedge on an endpoint that is not cooling down after errors
+            hedge = self.hedge_after > 0 and len(pending) == 1 and remaining and remaining[0].cooldown() == 0
+            done, _ = wait(list(pending), timeout=self.hedge_after if hedge else None, return_when=FIRST_COMPLETED)
+            if not done:
+                slow = next(iter(pending.values()))
+                slow.record_hedge()
+                logger.info(f"Overpass request to {slow.url} is slow, hedging on another endpoint")
+                launch()
+                continue
+            for future in done:
+                endpoint = pending.pop(future)
+                try:
+                    body = future.result()
+                except OverpassBadQuery:
+                    raise
+                except Exception as e:
+                    errors.append(str(e))
+                    logger.warning(f"Overpass request failed: {str(e)}")
+                    launch()
+                else:
+                    # Discard the body of a hedged duplicate that finishes later
+                    for loser in pending:
+                        loser.add_done_callback(_close_result)
+                    return body
+        return None
+
+    def query(self, query: str) -> overpy.Result:
+        """
+        Run an Overpass QL query, failing over between endpoints.
+
+        Raises:
+            OverpassBadQuery: The query was rejected as malformed
+            OverpassError: No endpoint answered within max_retries rounds
+        """
+        with self.query_body(query) as body:
+            return self.parse(body)
+
+    def query_body(self, query: str) -> BinaryIO:
+        """
+        Like query, but return the unparsed response body: a binary file positioned
+        at the start, for incremental parsing or caching. The caller closes it.
+
+        Raises:
+            OverpassBadQuery: The query was rejected as malformed
+            OverpassError: No endpoint answered within max_retries rounds
+        """
+        errors: List[str] = []
+        for attempt in range(self.max_retries):
+            answer = self._query_once(query, self._ranked_endpoints(), errors)
+            if answer is not None:
+                return answer
+            if attempt + 1 < self.max_retries:
+                # Every endpoint failed: wait for the first one to leave its cooldown (with jitter)
+                delay = min(endpoint.cooldown() for endpoint in self.endpoints) + random.random()
+                logger.info(f"All Overpass endpoints failed, retrying in {delay:.1f}s")
+                time.sleep(delay)
+        raise OverpassError(f"Overpass query failed on all endpoints: {'; '.join(errors[-3:])}")
+
+    def query_many(
+        self, queries: Dict[Hashable, str], raw: bool = False
+    ) -> Iterator[Tuple[Hashable, Any, Optional[Exception]]]:
+        """
+        Run several queries in parallel (bounded by max_parallel_queries).
+
+        Args:
+            queries: Overpass QL queries by key
+            raw: Yield response bodies (see query_body) instead of parsed results
+
+        Yields:
+            (key, result, error) tuples in completion order; error is None on success
+        """
+        if not queries:
+            return
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_parallel_queries, len(queries)),
+            thread_name_prefix="overpass-query",
+        ) as executor:
+            run = self.query_body if raw else self.query
+            futures = {executor.submit(run, query): key for key, query in queries.items()}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-endpoint request, error, hedge and latency counters"""
+        return [endpoint.stats() for endpoint in self.endpoints]
@@ -0,0 +1,278 @@
+"""
+Cross-geometry POI de-duplication for DisasterLens AI.
+The same facility is often mapped more than once: a hospital as a node and as
+a building way, or as a campus relation plus its tagged buildings. POIs are
+bucketed into a uniform grid (cells as wide as the merge distance), so each
+one is only compared with the POIs of its own and the neighbouring cells, and
+ways and relations with the POIs inside their bounding box. Matches of the
+same structure type are merged when their names are similar and they are
+close, or when one lies inside the other (an unnamed part of a campus too);
+each group keeps the POI with the richest details.
+"""
+
+import difflib
+import logging
+import math
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from app.services.poi_table import POITable
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_METERS_PER_DEGREE = 111320.0
+_NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+
+
+def _name_key(name: str) -> str:
+    return _NON_ALPHANUMERIC.sub(" ", name.lower()).strip()
+
+
+def names_similar(a: str, b: str, min_ratio: float = 0.85) -> bool:
+    """
+    Whether two normalized names (see _name_key) refer to the same facility:
+    equal, one's words a subset of the other's ("general hospital" and
+    "alappuzha general hospital"), or a difflib similarity of at least min_ratio.
+    Names with different numbers ("lp school 1" and "lp school 13") never match.
+    """
+    if not a or not b:
+        return False
+    if a == b:
+        return True
+    words_a, words_b = set(a.split()), set(b.split())
+    numbers_a = {word for word in words_a if word.isdigit()}
+    numbers_b = {word for word in words_b if word.isdigit()}
+    if numbers_a and numbers_b and numbers_a != numbers_b:
+        return False
+    if words_a <= words_b or words_b <= words_a:
+        return True
+    matcher = difflib.SequenceMatcher(None, a, b)
+    return (
+        matcher.real_quick_ratio() >= min_ratio
+        and matcher.quick_ratio() >= min_ratio
+        and matcher.ratio() >= min_ratio
+    )
+
+
+def _detail_count(details: str) -> int:
+    """Number of tags shown in details (see poi_table.extract_details)"""
+    if details == "No detailed information available" or details.startswith("Name: "):
+        return 0
+    return details.count(". ") + 1
+
+
+def _cell_pairs(
+    order: np.ndarray,
+    cell_keys: np.ndarray,
+    starts: np.ndarray,
+    counts: np.ndarray,
+    queries: np.ndarray,
+    owners: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    All (owner, row) pairs of rows in the cells named by queries.
+
+    Args:
+        order: Rows sorted by cell key
+        cell_keys, starts, counts: Distinct cell keys and their slices of order
+        queries: Cell keys to look up
+        owners: Row each query belongs to
+    """
+    found = np.searchsorted(cell_keys, queries)
+    found = np.minimum(found, len(cell_keys) - 1)
+    hit = cell_keys[found] == queries
+    found, owners = found[hit], owners[hit]
+    sizes = counts[found]
+    total = int(sizes.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    query = np.repeat(np.arange(len(found)), sizes)
+    local = np.arange(total) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    return owners[query], order[starts[found][query] + local]
+
+
+def _components(a: np.ndarray, b: np.ndarray, count: int) -> Tuple[int, np.ndarray]:
+    """Connected components of count rows joined by the (a, b) pairs"""
+    graph = csr_matrix((np.ones(len(a), dtype=np.int8), (a, b)), shape=(count, count))
+    return connected_components(graph, directed=False)
+
+
+def deduplicate_table(
+    table: POITable, distance_m: float = 100.0, min_ratio: float = 0.85, max_extent_m: float = 2000.0
+) -> int:
+    """
+    Merge POIs of a table that describe the same facility.
+
+    Two POIs of the same structure type are merged when
+    - their names are similar (see names_similar) and they are at most
+      distance_m apart, or
+    - one lies inside the bounding box of the other (a way or relation up to
+      max_extent_m across) and their names are similar or one is unnamed.
+      Unnamed POIs are only merged with named ones when all the named POIs
+      they are paired with (directly or through other unnamed ones) form a
+      single group, so distinct facilities are never merged through them.
+
+    Each group of merged POIs keeps the member with the most detail tags
+    (named, then larger, members first on ties) at its own position, named
+    after its longest-named member if it has no name itself.
+
+    Args:
+        table: Table to de-duplicate in place
+        distance_m: Merge distance, also the grid cell size
+        min_ratio: Name similarity needed besides equal or contained names
+        max_extent_m: Larger ways and relations (e.g. a whole district tagged
+                      as one facility) are not used for containment
+
+    Returns:
+        Number of POIs removed
+    """
+    count = len(table)
+    if count < 2 or distance_m <= 0:
+        return 0
+
+    lon, lat = table.coordinates()
+    half_lat = np.frombuffer(table.half_lat, dtype=np.float32).astype(np.float64)
+    half_lon = np.frombuffer(table.half_lon, dtype=np.float32).astype(np.float64)
+    cos_lat = np.cos(np.radians(lat))
+    structure = np.frombuffer(table.structure, dtype=np.int16).astype(np.int64)
+
+    # Normalized names as integer codes (0: unnamed; generated "Unnamed <Type>" names count as none)
+    unnamed = {f"Unnamed {name.capitalize()}" for name in table.structures}
+    codes: Dict[str, int] = {"": 0}
+    name_keys = [""]
+    by_name: Dict[str, int] = {}
+    name_code = np.empty(count, dtype=np.int64)
+    for row, name in enumerate(table.name):
+        code = by_name.get(name)
+        if code is None:
+            key = "" if name in unnamed else _name_key(name)
+            code = codes.get(key)
+            if code is None:
+                code = codes[key] = len(name_keys)
+                name_keys.append(key)
+            by_name[name] = code
+        name_code[row] = code
+
+    # Cells of distance_m in latitude and at least distance_m in longitude (at the
+    # table's highest latitude), so close pairs are always in neighbouring cells
+    cell_lat = distance_m / _METERS_PER_DEGREE
+    cell_lon = cell_lat / math.cos(math.radians(min(89.0, float(np.abs(lat).max()))))
+    cell_x = np.floor(lon / cell_lon).astype(np.int64)
+    cell_y = np.floor(lat / cell_lat).astype(np.int64)
+    min_x, min_y = int(cell_x.min()) - 1, int(cell_y.min()) - 1
+    width = int(cell_x.max()) - min_x + 2
+    height = int(cell_y.max()) - min_y + 2
+
+    def cell_key(code, x, y):
+        return (code * width + (x - min_x)) * height + (y - min_y)
+
+    keys = cell_key(structure, cell_x, cell_y)
+    order = np.argsort(keys, kind="stable")
+    cell_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    pairs_a, pairs_b = [], []
+
+    # Close pairs with similar names: each named POI against its own and the neighbouring cells
+    named = np.flatnonzero(name_code > 0)
+    for d_x, d_y in ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        a, b = _cell_pairs(
+            order, cell_keys, starts, counts,
+            cell_key(structure[named], cell_x[named] + d_x, cell_y[named] + d_y), named
+        )
+        close = (a < b) & (name_code[b] > 0)
+        a, b = a[close], b[close]
+        distance = np.hypot((lon[a] - lon[b]) * cos_lat[a], lat[a] - lat[b]) * _METERS_PER_DEGREE
+        close = distance <= distance_m
+        pairs_a.append(a[close])
+        pairs_b.append(b[close])
+
+    # POIs inside the bounding box of a way or relation, looked up in every cell the box covers
+    extent_m = 2 * np.maximum(half_lat, half_lon * cos_lat) * _METERS_PER_DEGREE
+    containers = np.flatnonzero((extent_m > 0) & (extent_m <= max_extent_m))
+    if len(containers):
+        # Cells outside the grid hold no POIs (and would alias other cells' keys)
+        first_x, last_x = (
+            np.clip(np.floor((lon[containers] + sign * half_lon[containers]) / cell_lon), min_x, min_x + width - 1)
+            .astype(np.int64) for sign in (-1, 1)
+        )
+        first_y, last_y = (
+            np.clip(np.floor((lat[containers] + sign * half_lat[containers]) / cell_lat), min_y, min_y + height - 1)
+            .astype(np.int64) for sign in (-1, 1)
+        )
+        columns, lines = last_x - first_x + 1, last_y - first_y + 1
+        sizes = columns * lines
+        owner = np.repeat(np.arange(len(containers)), sizes)
+        local = np.arange(int(sizes.sum())) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        queries = cell_key(
+            structure[containers][owner],
+            first_x[owner] + local // lines[owner],
+            first_y[owner] + local % lines[owner],
+        )
+        a, b = _cell_pairs(order, cell_keys, starts, counts, queries, containers[owner])
+        inside = (
+            (a != b)
+            & (np.abs(lon[b] - lon[a]) <= half_lon[a])
+            & (np.abs(lat[b] - lat[a]) <= half_lat[a])
+        )
+        pairs_a.append(a[inside])
+        pairs_b.append(b[inside])
+
+    a, b = np.concatenate(pairs_a), np.concatenate(pairs_b)
+    # Pairs with an unnamed member (only found by containment) or equal names need no name comparison
+    compare = (name_code[a] > 0) & (name_code[b] > 0) & (name_code[a] != name_code[b])
+    accept = ~compare
+    similar: Dict[Tuple[int, int], bool] = {}
+    for index in np.flatnonzero(compare).tolist():
+        pair = (int(name_code[a[index]]), int(name_code[b[index]]))
+        if pair not in similar:
+            similar[pair] = names_similar(name_keys[pair[0]], name_keys[pair[1]], min_ratio)
+        accept[index] = similar[pair]
+    a, b = a[accept], b[accept]
+    if len(a) == 0:
+        return 0
+
+    # Unnamed POIs only join named ones when they touch a single group of similar names:
+    # an unnamed campus way around several distinct named facilities must not merge them all
+    named_a, named_b = name_code[a] > 0, name_code[b] > 0
+    both, neither, mixed = named_a & named_b, ~named_a & ~named_b, named_a != named_b
+    _, named_labels = _components(a[both], b[both], count)
+    _, unnamed_labels = _components(a[neither], b[neither], count)
+    unnamed_rows = np.where(named_a[mixed], b[mixed], a[mixed])
+    named_rows = np.where(named_a[mixed], a[mixed], b[mixed])
+    links = np.unique(np.stack([unnamed_labels[unnamed_rows], named_labels[named_rows]]), axis=1)
+    named_groups = np.bincount(links[0], minlength=count)
+    joined = both | neither
+    joined[np.flatnonzero(mixed)[named_groups[unnamed_labels[unnamed_rows]] == 1]] = True
+    a, b = a[joined], b[joined]
+
+    group_count, labels = _components(a, b, count)
+    if group_count == count:
+        return 0
+
+    # Each group of several POIs keeps its richest member
+    keep = np.ones(count, dtype=bool)
+    area = half_lat * half_lon
+    grouped = np.flatnonzero(np.bincount(labels)[labels] > 1)
+    groups: Dict[int, List[int]] = {}
+    for row in grouped.tolist():
+        groups.setdefault(int(labels[row]), []).append(row)
+    for group in groups.values():
+        best = max(
+            group, key=lambda row: (_detail_count(table.details[row]), name_code[row] > 0, area[row], -row)
+        )
+        if name_code[best] == 0:
+            named_rows = [row for row in group if name_code[row] > 0]
+            if named_rows:
+                table.name[best] = table.name[max(named_rows, key=lambda row: len(table.name[row]))]
+        keep[group] = False
+        keep[best] = True
+
+    removed = int(count - keep.sum())
+    table.keep(keep)
+    return removed
@@ -0,0 +1,275 @@
+"""
+Compact POI storage and streaming Overpass parsing for DisasterLens AI.
+Overpass responses are read element by element (ijson) straight into a
+column-oriented POI table: typed arrays for ids and coordinates, small integer
+codes for element and structure types, interned names and details, and one
+collection timestamp per run. Only the table grows with the result size; the
+per-POI dictionaries the API returns are built once at the end.
+"""
+
+import json
+import logging
+from array import array
+from datetime import datetime
+from typing import AbstractSet, Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.tag_schema import IMPORTANT_TAGS, structure_schema
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ELEMENT_TYPES = ("node", "way", "relation")
+_ELEMENT_CODES = {element_type: code for code, element_type in enumerate(ELEMENT_TYPES)}
+
+_IMPORTANT_TAG_SET = frozenset(IMPORTANT_TAGS)
+
+
+def extract_details(tags: Dict[str, str], detail_tags: AbstractSet[str] = _IMPORTANT_TAG_SET) -> str:
+    """Extract useful details from OSM tags (those in detail_tags, default IMPORTANT_TAGS)"""
+    details = []
+
+    # Add important/common tags to the details
+    for tag, value in tags.items():
+        if tag in detail_tags and value:
+            details.append(f"{tag.replace('_', ' ').title()}: {value}")
+
+    # If no important tags found, use description or name as fallback
+    if not details:
+        if "description" in tags:
+            return tags["description"]
+        elif "name" in tags:
+            return f"Name: {tags['name']}"
+        return "No detailed information available"
+
+    return ". ".join(details)
+
+
+def iter_overpass_elements(stream: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the elements of an Overpass JSON response one at a time.
+
+    With ijson installed only one element is held in memory at a time;
+    without it the whole response is loaded with json.
+    """
+    if ijson is None:
+        yield from json.load(stream).get("elements", [])
+        return
+    yield from ijson.items(stream, "elements.item", use_float=True)
+
+
+def element_position(element: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """
+    (lat, lon) of a node, or of the center of a way or relation ("out center",
+    or the middle of its bounding box with "out bb", which is the same point)
+    """
+    if "lat" in element and "lon" in element:
+        return element["lat"], element["lon"]
+    center = element.get("center")
+    if center:
+        return center["lat"], center["lon"]
+    bounds = element.get("bounds")
+    if bounds:
+        return (bounds["minlat"] + bounds["maxlat"]) / 2, (bounds["minlon"] + bounds["maxlon"]) / 2
+    return None
+
+
+def element_extent(element: Dict[str, Any]) -> Tuple[float, float]:
+    """Half height and half width in degrees of a way's or relation's bounding box ("out bb"); 0 for nodes"""
+    bounds = element.get("bounds")
+    if not bounds:
+        return 0.0, 0.0
+    return (bounds["maxlat"] - bounds["minlat"]) / 2, (bounds["maxlon"] - bounds["minlon"]) / 2
+
+
+class POITable:
+    __slots__ = (
+        "timestamp", "structures", "_structure_codes", "_strings",
+        "element_type", "osm_id", "lat", "lon", "half_lat", "half_lon", "structure", "name", "details", "_rows",
+    )
+
+    def __init__(self, timestamp: str = None):
+        """
+        Create an empty table.
+
+        Args:
+            timestamp: lastUpdated of every POI collected in this run (default: now)
+        """
+        self.timestamp = timestamp or datetime.now().isoformat()
+        self.structures: List[str] = []
+        self._structure_codes: Dict[str, int] = {}
+        # Interned names and details: many POIs share "Unnamed School" or the same operator
+        self._strings: Dict[str, str] = {}
+
+        self.element_type = array("b")
+        self.osm_id = array("q")
+        self.lat = array("d")
+        self.lon = array("d")
+        # Half extents (degrees) of the bounding boxes of ways and relations, 0 for nodes
+        self.half_lat = array("f")
+        self.half_lon = array("f")
+        self.structure = array("h")
+        self.name: List[str] = []
+        self.details: List[str] = []
+        # (element type code, OSM id, structure code) -> row, to de-duplicate (e.g. across tiles)
+        self._rows: Dict[Tuple[int, int, int], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.osm_id)
+
+    def _intern(self, value: str) -> str:
+        return self._strings.setdefault(value, value)
+
+    def _structure_code(self, structure: str) -> int:
+        code = self._structure_codes.get(structure)
+        if code is None:
+            code = self._structure_codes[structure] = len(self.structures)
+            self.structures.append(structure)
+        return code
+
+    def add(
+        self,
+        element_type: str,
+        osm_id: int,
+        lat: float,
+        lon: float,
+        tags: Dict[str, str],
+        structure: str,
+        extent: Tuple[float, float] = (0.0, 0.0),
+    ) -> None:
+        """
+        Add a POI; an element already in the table for the same structure type
+        is replaced. extent is the half height and width (degrees) of a way's or
+        relation's bounding box.
+        """
+        key = (_ELEMENT_CODES[element_type], osm_id, self._structure_code(structure))
+        name = self._intern(tags.get("name", f"Unnamed {structure.capitalize()}"))
+        details = self._intern(extract_details(tags, structure_schema(structure).detail_tags))
+        self._set_row(key, lat, lon, extent, name, details)
+
+    def _set_row(
+        self, key: Tuple[int, int, int], lat: float, lon: float, extent: Tuple[float, float], name: str, details: str
+    ) -> None:
+        row = self._rows.get(key)
+        if row is not None:
+            self.lat[row], self.lon[row] = lat, lon
+            self.half_lat[row], self.half_lon[row] = extent
+            self.name[row], self.details[row] = name, details
+            return
+        self._rows[key] = len(self.osm_id)
+        self.element_type.append(key[0])
+        self.osm_id.append(key[1])
+        self.lat.append(lat)
+        self.lon.append(lon)
+        self.half_lat.append(extent[0])
+        self.half_lon.append(extent[1])
+        self.structure.append(key[2])
+        self.name.append(name)
+        self.details.append(details)
+
+    def add_poi(self, poi: Dict[str, Any]) -> None:
+        """
+        Add a POI in the poi_data layout (see to_poi_data), e.g. one kept from an
+        earlier collection. Its bounding box is not known, so it has no extent.
+        """
+        element_type, _, osm_id = poi["id"].partition("_")
+        key = (_ELEMENT_CODES[element_type], int(osm_id), self._structure_code(poi["type"]))
+        self._set_row(
+            key, poi["latitude"], poi["longitude"], (0.0, 0.0), self._intern(poi["name"]), self._intern(poi["details"])
+        )
+
+    def extend(self, other: "POITable") -> None:
+        """Add the rows of another table (e.g. of one tile), replacing elements already present"""
+        codes = [self._structure_code(structure) for structure in other.structures]
+        for row in range(len(other)):
+            key = (other.element_type[row], other.osm_id[row], codes[other.structure[row]])
+            name, details = self._intern(other.name[row]), self._intern(other.details[row])
+            extent = (other.half_lat[row], other.half_lon[row])
+            self._set_row(key, other.lat[row], other.lon[row], extent, name, details)
+
+    def add_elements(
+        self,
+        elements: Iterator[Dict[str, Any]],
+        structures: Sequence[str],
+        matches: Optional[Callable[[str, Dict[str, str], str], bool]] = None,
+    ) -> int:
+        """
+        Add Overpass elements (see iter_overpass_elements) as POIs.
+
+        Args:
+            elements: Element dictionaries
+            structures: Structure types the elements are added as
+            matches: Optional (element_type, tags, structure) -> bool; when given an
+                     element is only added for the structure types it matches
+                     (used to split the response of a combined query)
+
+        Returns:
+            Number of elements read
+        """
+        count = 0
+        for element in elements:
+            count += 1
+            position = element_position(element)
+            if position is None:
+                # Ways and relations without a center cannot be placed
+                continue
+            element_type, tags = element["type"], element.get("tags", {})
+            for structure in structures:
+                if matches is None or matches(element_type, tags, structure):
+                    self.add(
+                        element_type, element["id"], position[0], position[1], tags, structure,
+                        element_extent(element)
+                    )
+        return count
+
+    def keep(self, mask: Sequence[bool]) -> None:
+        """Drop the rows where mask is False (e.g. outside a boundary)"""
+        rows = np.flatnonzero(np.asarray(mask, dtype=bool))
+        if len(rows) == len(self):
+            return
+        for name in ("element_type", "osm_id", "lat", "lon", "half_lat", "half_lon", "structure"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, np.frombuffer(column, dtype=column.typecode)[rows].tobytes()))
+        self.name = [self.name[row] for row in rows]
+        self.details = [self.details[row] for row in rows]
+        self._rows = {
+            (self.element_type[row], self.osm_id[row], self.structure[row]): row for row in range(len(self.osm_id))
+        }
+
+    def coordinates(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(lon, lat) arrays without copying"""
+        return np.frombuffer(self.lon, dtype=np.float64), np.frombuffer(self.lat, dtype=np.float64)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of POIs per structure type"""
+        codes = np.bincount(np.frombuffer(self.structure, dtype=np.int16), minlength=len(self.structures))
+        return {structure: int(codes[code]) for code, structure in enumerate(self.structures)}
+
+    def to_poi_data(self, structures: Optional[Sequence[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """POI dictionaries grouped by structure type, in the legacy poi_data layout"""
+        structures = list(structures) if structures is not None else list(self.structures)
+        poi_data: Dict[str, List[Dict[str, Any]]] = {structure: [] for structure in structures}
+        prefixes = [f"{element_type}_" for element_type in ELEMENT_TYPES]
+        for row in range(len(self.osm_id)):
+            structure = self.structures[self.structure[row]]
+            pois = poi_data.get(structure)
+            if pois is None:
+                continue
+            pois.append({
+                "id": f"{prefixes[self.element_type[row]]}{self.osm_id[row]}",
+                "name": self.name[row],
+                "type": structure,
+                "latitude": self.lat[row],
+                "longitude": self.lon[row],
+                "details": self.details[row],
+                "status": "active",
+                "lastUpdated": self.timestamp
+            })
+        return poi_data
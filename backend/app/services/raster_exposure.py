@@ -0,0 +1,396 @@
+"""
+Raster exposure analytics for DisasterLens AI.
+Computes zonal statistics of a local raster (population counts, land cover,
+elevation, ...) inside admin boundaries, hazard polygons and buffers around
+POIs. Rasters are never read whole: the part of the raster covered by the
+zones is split into block-aligned windows that are read and summarized in
+parallel against zone masks rasterized like rasterstats does, and the
+partial statistics are merged.
+Results are cached per (raster, geometry) pair, so repeated summaries of the
+same district cost one SQLite lookup.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from app.services.boundary_store import utm_crs
+
+try:
+    import rasterio
+    from rasterio.features import rasterize
+    from rasterio.transform import Affine
+    from rasterio.windows import Window, from_bounds
+except ImportError:
+    rasterio = None
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Directory searched for rasters given by file name
+RASTER_DIR = "data/rasters"
+
+RASTER_EXTENSIONS = (".tif", ".tiff", ".vrt", ".img")
+
+
+def resolve_raster_path(raster: str, raster_dir: str = None) -> str:
+    """
+    Path of a raster given by file name (looked up in env RASTER_DIR,
+    default data/rasters).
+
+    Raises:
+        FileNotFoundError: No such raster
+    """
+    raster_dir = raster_dir or os.environ.get("RASTER_DIR", RASTER_DIR)
+    if os.path.basename(raster) != raster or not raster.lower().endswith(RASTER_EXTENSIONS):
+        raise FileNotFoundError(f"Invalid raster name: {raster}")
+    path = os.path.join(raster_dir, raster)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Raster not found: {path}")
+    return path
+
+
+def _empty_stats() -> Dict[str, Any]:
+    # Statistics that can be merged across windows; mean is derived from sum and count
+    return {"count": 0, "sum": 0.0, "min": None, "max": None}
+
+
+def _merge_stats(total: Dict[str, Any], part: Dict[str, Any], categorical: bool) -> None:
+    """Add the statistics of one window to the running statistics of a zone"""
+    count = part.get("count") or 0
+    if not count:
+        return
+    total["count"] += count
+    total["sum"] += part["sum"]
+    total["min"] = part["min"] if total["min"] is None else min(total["min"], part["min"])
+    total["max"] = part["max"] if total["max"] is None else max(total["max"], part["max"])
+    if categorical:
+        categories = total.setdefault("categories", {})
+        for key, value in part.items():
+            if isinstance(key, (int, float)) and not isinstance(key, bool):
+                category = int(key) if float(key).is_integer() else key
+                categories[category] = categories.get(category, 0) + value
+
+
+def _finish_stats(total: Dict[str, Any]) -> Dict[str, Any]:
+    total["mean"] = total["sum"] / total["count"] if total["count"] else None
+    if "categories" in total:
+        total["categories"] = {str(key): count for key, count in sorted(total["categories"].items())}
+    return total
+
+
+def _zone_frame(geometry, transform) -> Tuple[int, int, int, int]:
+    """Rows and columns (row_start, row_stop, col_start, col_stop) of the pixels covering a zone's bounds"""
+    west, south, east, north = geometry.bounds
+    return (
+        math.floor((north - transform.f) / transform.e),
+        math.ceil((south - transform.f) / transform.e),
+        math.floor((west - transform.c) / transform.a),
+        math.ceil((east - transform.c) / transform.a),
+    )
+
+
+def _zone_mask(geometry, region: Tuple[int, int, int, int], transform, all_touched: bool) -> np.ndarray:
+    """
+    Pixels of a region (row_start, row_stop, col_start, col_stop) the zone covers.
+
+    Burned on the zone's frame (see _zone_frame) the mask matches rasterstats
+    exactly: that is the grid rasterstats burns the zone on, and GDAL's verdict
+    for pixels a zone edge passes through depends on the grid's origin, so a
+    window's grid can disagree with it there by a few pixels along the edges.
+    """
+    row_start, row_stop, col_start, col_stop = region
+    west, north = transform * (col_start, row_start)
+    return rasterize(
+        [(geometry, 1)],
+        out_shape=(row_stop - row_start, col_stop - col_start),
+        transform=Affine(transform.a, transform.b, west, transform.d, transform.e, north),
+        fill=0,
+        dtype="uint8",
+        all_touched=all_touched,
+    ).view(bool)
+
+
+def _overlap(frame: Tuple[int, int, int, int], window) -> Optional[Tuple[int, int, int, int]]:
+    """Rows and columns shared by a zone's frame and a window, or None"""
+    row_start, row_stop = max(frame[0], window.row_off), min(frame[1], window.row_off + window.height)
+    col_start, col_stop = max(frame[2], window.col_off), min(frame[3], window.col_off + window.width)
+    if row_start >= row_stop or col_start >= col_stop:
+        return None
+    return row_start, row_stop, col_start, col_stop
+
+
+class ExposureCache:
+    def __init__(self, path: str = None, max_entries: int = None):
+        """
+        Open (or create) the cache of zonal statistics.
+
+        Args:
+            path: SQLite file (env EXPOSURE_CACHE_PATH, default data/exposure_cache.db)
+            max_entries: Entries kept before the oldest are dropped
+                         (env EXPOSURE_CACHE_MAX_ENTRIES, default 100000)
+        """
+        self.path = path or os.environ.get("EXPOSURE_CACHE_PATH", "data/exposure_cache.db")
+        self.max_entries = (
+            max_entries if max_entries is not None
+            else int(os.environ.get("EXPOSURE_CACHE_MAX_ENTRIES", 100000))
+        )
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS exposures (
+                cache_key TEXT PRIMARY KEY,
+                stats TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_exposures_created ON exposures (created_at)")
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached statistics of the given keys (missing keys are left out)"""
+        found = {}
+        with self._lock:
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = list(keys[start:start + 500])
+                rows = self._conn.execute(
+                    f"SELECT cache_key, stats FROM exposures WHERE cache_key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((key, json.loads(stats)) for key, stats in rows)
+        return found
+
+    def put_many(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO exposures (cache_key, stats, created_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(stats), now) for key, stats in entries.items()],
+            )
+            self._conn.execute(
+                "DELETE FROM exposures WHERE cache_key IN "
+                "(SELECT cache_key FROM exposures ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.execute("COMMIT")
+
+
+class RasterExposure:
+    def __init__(
+        self, cache: ExposureCache = None, block_pixels: int = None, workers: int = None, max_mask_pixels: int = None
+    ):
+        """
+        Create the exposure calculator.
+
+        Args:
+            cache: Cache of statistics per (raster, geometry) (default: ExposureCache())
+            block_pixels: Width and height of the windows read at once, rounded to the
+                          raster's internal tiling (env RASTER_BLOCK_PIXELS, default 1024)
+            workers: Windows processed in parallel (env RASTER_WORKERS, default: CPU count)
+            max_mask_pixels: Largest zone frame (pixels of its bounding box) rasterized as one
+                             mask; larger zones are rasterized per window instead
+                             (env RASTER_MAX_MASK_PIXELS, default 64M, i.e. 64 MB per mask)
+        """
+        self.cache = cache or ExposureCache()
+        self.block_pixels = block_pixels or int(os.environ.get("RASTER_BLOCK_PIXELS", 1024))
+        self.workers = workers or int(os.environ.get("RASTER_WORKERS", os.cpu_count() or 4))
+        self.max_mask_pixels = max_mask_pixels or int(os.environ.get("RASTER_MAX_MASK_PIXELS", 64 * 1024 * 1024))
+
+    def _require_rasterio(self) -> None:
+        if rasterio is None:
+            raise RuntimeError("rasterio is not installed; install it with 'pip install rasterio'")
+
+    def zone_stats(
+        self,
+        raster_path: str,
+        geometries: Sequence[Any],
+        categorical: bool = False,
+        all_touched: bool = False,
+        band: int = 1,
+    ) -> List[Dict[str, Any]]:
+        """
+        Zonal statistics of polygons (EPSG:4326) such as admin boundaries or hazard areas.
+
+        Args:
+            raster_path: Raster file (see resolve_raster_path)
+            geometries: Shapely geometries in EPSG:4326
+            categorical: Also count pixels per value (land cover classes)
+            all_touched: Include every pixel a zone touches, not only those whose center it contains
+            band: Raster band to summarize
+
+        Returns:
+            One dictionary per geometry with count, sum, mean, min and max of the
+            valid pixels (and categories when categorical); the sum of a
+            population count raster is the exposed population
+        """
+        self._require_rasterio()
+        with rasterio.open(raster_path) as src:
+            crs = src.crs
+        projected = gpd.GeoSeries(list(geometries), crs="EPSG:4326").to_crs(crs)
+        return self._cached_stats(raster_path, list(projected.values), categorical, all_touched, band)
+
+    def buffer_stats(
+        self,
+        raster_path: str,
+        lat: Sequence[float],
+        lon: Sequence[float],
+        radius_m: float,
+        categorical: bool = False,
+        band: int = 1,
+    ) -> List[Dict[str, Any]]:
+        """
+        Zonal statistics of circular buffers around points (e.g. the people living
+        within 1 km of each hospital).
+
+        Buffers are drawn in metres in the UTM zone of the points and include
+        every pixel they touch, so small buffers on coarse rasters are not empty.
+        Arguments and results are as for zone_stats, one result per point.
+        """
+        self._require_rasterio()
+        if len(lat) == 0:
+            return []
+        with rasterio.open(raster_path) as src:
+            crs = src.crs
+        points = gpd.GeoSeries(gpd.points_from_xy(lon, lat), crs="EPSG:4326")
+        center = shapely.MultiPoint(list(points.values)).centroid
+        buffers = points.to_crs(utm_crs(center.y, center.x)).buffer(radius_m, resolution=8).to_crs(crs)
+        return self._cached_stats(raster_path, list(buffers.values), categorical, True, band)
+
+    def _cached_stats(
+        self, raster_path: str, geometries: List[Any], categorical: bool, all_touched: bool, band: int
+    ) -> List[Dict[str, Any]]:
+        """Statistics of geometries in the raster's CRS, answered from the cache where possible"""
+        stat = os.stat(raster_path)
+        fingerprint = f"{os.path.realpath(raster_path)}|{stat.st_size}|{stat.st_mtime_ns}|{band}|{categorical}|{all_touched}"
+        keys = [
+            hashlib.sha256(fingerprint.encode("utf-8") + shapely.to_wkb(geometry)).hexdigest()
+            for geometry in geometries
+        ]
+        cached = self.cache.get_many(list(set(keys)))
+        missing = [index for index, key in enumerate(keys) if key not in cached]
+        if missing:
+            started = time.perf_counter()
+            computed = self._compute_stats(raster_path, [geometries[i] for i in missing], categorical, all_touched, band)
+            fresh = {keys[index]: stats for index, stats in zip(missing, computed)}
+            self.cache.put_many(fresh)
+            cached.update(fresh)
+            logger.info(
+                f"Computed zonal statistics of {len(missing)} zone(s) on {os.path.basename(raster_path)} "
+                f"in {time.perf_counter() - started:.2f}s ({len(geometries) - len(missing)} cached)"
+            )
+        return [dict(cached[key]) for key in keys]
+
+    def _compute_stats(
+        self, raster_path: str, geometries: List[Any], categorical: bool, all_touched: bool, band: int
+    ) -> List[Dict[str, Any]]:
+        """Read the windows covered by the geometries in parallel and merge their statistics"""
+        with rasterio.open(raster_path) as src:
+            full = Window(0, 0, src.width, src.height)
+            block_height, block_width = src.block_shapes[band - 1]
+            transform = src.transform
+            area = from_bounds(*shapely.total_bounds(geometries), transform=transform)
+        col_end = min(full.width, math.ceil(area.col_off + area.width))
+        row_end = min(full.height, math.ceil(area.row_off + area.height))
+
+        # Windows aligned to the raster's internal blocks so each block is decoded once
+        step_x = max(block_width, self.block_pixels // block_width * block_width)
+        step_y = max(block_height, self.block_pixels // block_height * block_height)
+        col_start = max(0, math.floor(area.col_off)) // step_x * step_x
+        row_start = max(0, math.floor(area.row_off)) // step_y * step_y
+        frames = [_zone_frame(geometry, transform) for geometry in geometries]
+        tree = shapely.STRtree(geometries)
+        windows = []
+        # Ranges are empty when the zones do not overlap the raster
+        for row in range(row_start, row_end, step_y):
+            for col in range(col_start, col_end, step_x):
+                window = Window(col, row, step_x, step_y).intersection(full)
+                zones = [
+                    int(index)
+                    for index in tree.query(shapely.box(*rasterio.windows.bounds(window, transform)))
+                    if _overlap(frames[index], window) is not None
+                ]
+                if zones:
+                    windows.append((window, zones))
+
+        totals = [_empty_stats() for _ in geometries]
+        if windows:
+            needed = sorted({index for _, zones in windows for index in zones})
+            with ThreadPoolExecutor(
+                max_workers=min(self.workers, len(windows)), thread_name_prefix="raster-window"
+            ) as executor:
+                # Zones are rasterized once, on the pixel grid of their own bounds, so the results
+                # equal rasterstats' (see _zone_mask); the mask is shared by the windows a zone
+                # covers. Zones whose mask would exceed max_mask_pixels are rasterized per window
+                # instead, which bounds memory at the cost of parity for a few edge pixels.
+                masked = [
+                    index for index in needed
+                    if (frames[index][1] - frames[index][0]) * (frames[index][3] - frames[index][2]) <= self.max_mask_pixels
+                ]
+                masks = dict.fromkeys(needed)
+                masks.update(zip(masked, executor.map(
+                    lambda index: _zone_mask(geometries[index], frames[index], transform, all_touched), masked
+                )))
+                futures = [
+                    executor.submit(
+                        self._window_stats, raster_path, window, transform,
+                        [(index, geometries[index], frames[index], masks[index]) for index in zones],
+                        categorical, all_touched, band,
+                    )
+                    for window, zones in windows
+                ]
+                for future in as_completed(futures):
+                    for index, part in future.result():
+                        _merge_stats(totals[index], part, categorical)
+        return [_finish_stats(total) for total in totals]
+
+    def _window_stats(
+        self, raster_path: str, window, transform, zones: List[tuple], categorical: bool, all_touched: bool, band: int
+    ) -> List[tuple]:
+        """
+        (zone index, partial statistics) of the (index, geometry, frame, mask) zones
+        overlapping one window; zones without a mask are rasterized on the window
+        """
+        # Datasets are not thread-safe; every window opens its own handle
+        with rasterio.open(raster_path) as src:
+            data = src.read(band, window=window, masked=True)
+        values = data.astype("float64").filled(np.nan)
+        if np.isnan(values).all():
+            return []
+        parts = []
+        for index, geometry, frame, mask in zones:
+            overlap = _overlap(frame, window)
+            row_start, row_stop, col_start, col_stop = overlap
+            if mask is None:
+                inside = _zone_mask(geometry, overlap, transform, all_touched)
+            else:
+                inside = mask[
+                    row_start - frame[0]:row_stop - frame[0], col_start - frame[2]:col_stop - frame[2]
+                ]
+            pixels = values[
+                row_start - window.row_off:row_stop - window.row_off, col_start - window.col_off:col_stop - window.col_off
+            ][inside]
+            pixels = pixels[~np.isnan(pixels)]
+            if not pixels.size:
+                continue
+            part = {"count": int(pixels.size), "sum": float(pixels.sum()), "min": float(pixels.min()), "max": float(pixels.max())}
+            if categorical:
+                categories, counts = np.unique(pixels, return_counts=True)
+                part.update(zip(categories.tolist(), counts.tolist()))
+            parts.append((index, part))
+        return parts
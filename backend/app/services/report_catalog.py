@@ -0,0 +1,249 @@
+"""
+Report catalog for DisasterLens AI.
+Keeps a persistent SQLite index of disaster report metadata (title, event,
+date range, size, source count) so that report listings never have to open
+report bodies. Reports written by the pipeline are recorded directly and
+files added by other means are picked up by a periodic scan (by modification
+time) that runs at startup and in the background, never on the request path.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REPORT_PREFIX = "disaster_report_"
+REPORT_SUFFIX = ".md"
+
+_URL_PATTERN = re.compile(r"https?://\S+")
+
+
+def parse_report_metadata(content: str) -> Dict[str, Any]:
+    """Extract the title and number of cited sources from a markdown report"""
+    lines = content.split("\n")
+    title = None
+    for line in lines:
+        if line.startswith("# ") or line.startswith("## "):
+            title = line.lstrip("#").strip()
+            break
+
+    # Count distinct URLs listed under the "Sources" heading
+    sources = set()
+    in_sources = False
+    for line in lines:
+        if line.startswith("#"):
+            in_sources = "sources" in line.lower()
+            continue
+        if in_sources:
+            sources.update(url.rstrip(").,]>") for url in _URL_PATTERN.findall(line))
+
+    return {"title": title, "source_count": len(sources)}
+
+
+class ReportCatalog:
+    def __init__(self, reports_dir: str = ".", db_path: str = None, refresh_interval: float = None):
+        """
+        Open (or create) the report catalog.
+
+        Args:
+            reports_dir: Directory containing disaster_report_*.md files
+            db_path: Path of the SQLite index (env REPORT_CATALOG_PATH, default data/reports.db)
+            refresh_interval: Seconds between background scans for externally
+                              added files (env REPORT_CATALOG_REFRESH_SECONDS, default 10)
+        """
+        self.reports_dir = reports_dir
+        self.db_path = db_path or os.environ.get("REPORT_CATALOG_PATH", "data/reports.db")
+        self.refresh_interval = (
+            refresh_interval if refresh_interval is not None
+            else float(os.environ.get("REPORT_CATALOG_REFRESH_SECONDS", 10))
+        )
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS reports (
+                report_id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                event_name TEXT,
+                start_date TEXT,
+                end_date TEXT,
+                size INTEGER NOT NULL,
+                source_count INTEGER NOT NULL,
+                mtime REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_reports_mtime ON reports(mtime);
+            CREATE INDEX IF NOT EXISTS idx_reports_event_name ON reports(event_name);
+            """
+        )
+
+    def record(
+        self,
+        report_id: str,
+        content: str,
+        event_name: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> None:
+        """
+        Index a report that has just been written, using its in-memory content.
+
+        Args:
+            report_id: Report file name (relative to reports_dir)
+            content: Markdown content that was written to the file
+            event_name: Disaster event name from the discovery data
+            start_date: Event start date (YYYY-MM-DD)
+            end_date: Event end date (YYYY-MM-DD)
+        """
+        path = os.path.join(self.reports_dir, report_id)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            logger.warning(f"Not indexing missing report file {path}")
+            return
+
+        size = len(content.encode("utf-8"))
+        if stat.st_size != size:
+            # The file on disk is not this content (e.g. the write failed); let refresh() index it
+            logger.warning(f"Report file {path} does not match the generated content, not indexing")
+            return
+
+        metadata = parse_report_metadata(content)
+        self._upsert(
+            report_id,
+            title=metadata["title"] or report_id,
+            event_name=event_name,
+            start_date=start_date,
+            end_date=end_date,
+            size=size,
+            source_count=metadata["source_count"],
+            mtime=stat.st_mtime,
+        )
+
+    def _upsert(self, report_id: str, **values) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reports "
+                "(report_id, title, event_name, start_date, end_date, size, source_count, mtime) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    report_id,
+                    values["title"],
+                    values["event_name"],
+                    values["start_date"],
+                    values["end_date"],
+                    values["size"],
+                    values["source_count"],
+                    values["mtime"],
+                ),
+            )
+
+    def refresh(self) -> None:
+        """
+        Reconcile the index with the reports directory: index new or modified
+        files (by mtime) and drop entries whose file was removed. This scans
+        and stats the whole directory, so call it from startup or a background
+        task rather than from request handlers.
+        """
+        on_disk = {}
+        try:
+            with os.scandir(self.reports_dir) as entries:
+                for entry in entries:
+                    if entry.name.startswith(REPORT_PREFIX) and entry.name.endswith(REPORT_SUFFIX) and entry.is_file():
+                        on_disk[entry.name] = entry.stat()
+        except OSError as e:
+            logger.warning(f"Could not scan reports directory {self.reports_dir}: {str(e)}")
+            return
+
+        with self._lock:
+            indexed = {
+                row["report_id"]: row for row in self._conn.execute(
+                    "SELECT report_id, mtime, event_name, start_date, end_date FROM reports"
+                )
+            }
+
+        removed = [report_id for report_id in indexed if report_id not in on_disk]
+        if removed:
+            with self._lock:
+                self._conn.executemany("DELETE FROM reports WHERE report_id = ?", [(r,) for r in removed])
+
+        for name, stat in on_disk.items():
+            row = indexed.get(name)
+            if row is not None and row["mtime"] == stat.st_mtime:
+                continue
+            try:
+                with open(os.path.join(self.reports_dir, name), "r", encoding="utf-8") as f:
+                    content = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Could not index report {name}: {str(e)}")
+                continue
+
+            metadata = parse_report_metadata(content)
+            self._upsert(
+                name,
+                title=metadata["title"] or name,
+                # Keep event details recorded by the pipeline when a file is rewritten
+                event_name=row["event_name"] if row is not None else None,
+                start_date=row["start_date"] if row is not None else None,
+                end_date=row["end_date"] if row is not None else None,
+                size=stat.st_size,
+                source_count=metadata["source_count"],
+                mtime=stat.st_mtime,
+            )
+
+    def get(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """Return the indexed metadata of a report, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM reports WHERE report_id = ?", (report_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_reports(
+        self,
+        limit: int = 10,
+        offset: int = 0,
+        event: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        List indexed reports, newest first.
+
+        Args:
+            limit: Maximum number of reports to return
+            offset: Number of reports to skip
+            event: Case-insensitive substring matched against event name and title
+            date_from: Only reports whose event ends on or after this date (YYYY-MM-DD)
+            date_to: Only reports whose event starts on or before this date (YYYY-MM-DD)
+        """
+        clauses = []
+        params: List[Any] = []
+        if event:
+            clauses.append("(event_name LIKE ? OR title LIKE ?)")
+            params.extend([f"%{event}%", f"%{event}%"])
+        if date_from:
+            clauses.append("end_date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("start_date <= ?")
+            params.append(date_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM reports {where} ORDER BY mtime DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+        return [dict(row) for row in rows]
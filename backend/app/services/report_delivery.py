@@ -0,0 +1,170 @@
+"""
+Report delivery helpers for DisasterLens AI.
+Provides validators (ETag / Last-Modified) for file-backed reports, gzip or
+brotli content negotiation, a bounded cache of encoded response bodies and
+chunked streaming of raw report files.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def report_validators(path: str, variant: str) -> Dict[str, str]:
+    """
+    Compute the ETag and Last-Modified headers for a report file.
+
+    Args:
+        path: Report file
+        variant: Representation and encoding (e.g. "json-gzip", "raw"); each variant gets its own ETag
+    """
+    stat = os.stat(path)
+    digest = hashlib.sha1(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")).hexdigest()[:20]
+    return {
+        "ETag": f'"{digest}-{variant}"',
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+    }
+
+
+def is_not_modified(if_none_match: Optional[str], if_modified_since: Optional[str], validators: Dict[str, str]) -> bool:
+    """Evaluate conditional request headers against the current validators"""
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison, as required for If-None-Match
+        etag = validators["ETag"]
+        return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            modified = parsedate_to_datetime(validators["Last-Modified"])
+            return modified <= since
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick "br" or "gzip" from an Accept-Encoding header, or None for identity"""
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(","):
+        pieces = part.strip().split(";")
+        coding = pieces[0].strip().lower()
+        quality = 1.0
+        for param in pieces[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[coding] = quality
+
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = None
+    for coding in candidates:
+        quality = weights.get(coding, weights.get("*", 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (coding, quality)
+    return best[0] if best else None
+
+
+def encode_body(body: bytes, encoding: Optional[str]) -> bytes:
+    """Compress a complete body with the negotiated encoding"""
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def iter_report_file(path: str, encoding: Optional[str], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Stream a report file in chunks, compressing on the fly when an encoding is given"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        compress, flush = compressor.process, compressor.finish
+    elif encoding == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress, flush = compressor.compress, compressor.flush
+    else:
+        compress = flush = None
+
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            data = compress(chunk) if compress else chunk
+            if data:
+                yield data
+    if flush:
+        yield flush()
+
+
+class ReportResponseCache:
+    def __init__(self, max_bytes: int = None):
+        """
+        Bounded LRU cache of encoded JSON report envelopes keyed by ETag.
+
+        Args:
+            max_bytes: Total size of cached bodies (env REPORT_RESPONSE_CACHE_BYTES, default 32 MB)
+        """
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.environ.get("REPORT_RESPONSE_CACHE_BYTES", 32 * 1024 * 1024)
+        )
+        self._entries: "OrderedDict[str, Tuple[bytes, Optional[str]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_envelope(self, path: str, etag: str, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """
+        Return the {"content", "format"} JSON body for a report and the encoding
+        actually applied (small bodies are left uncompressed), building and
+        caching it on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+                return entry
+
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        body = json.dumps({"content": content, "format": "markdown"}).encode("utf-8")
+        if encoding and len(body) >= MIN_COMPRESS_SIZE:
+            body = encode_body(body, encoding)
+        else:
+            encoding = None
+
+        with self._lock:
+            if etag not in self._entries and len(body) <= self.max_bytes:
+                self._entries[etag] = (body, encoding)
+                self._size += len(body)
+                while self._size > self.max_bytes:
+                    _, (evicted, _) = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return body, encoding
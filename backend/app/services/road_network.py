@@ -0,0 +1,479 @@
+"""
+Road-network routing for DisasterLens AI.
+Downloads the drive or walk network of a boundary once with osmnx and stores
+it as compact arrays (node ids and coordinates, deduplicated directed edges
+with travel times) instead of GraphML. Multi-source Dijkstra over that graph
+gives, for every road node, the travel time to the nearest facility of a
+snapshot (hospitals, shelters, ...) and which facility that is; travel-time
+isochrones are drawn from the same field. Fields are cached on disk and only
+recomputed when a newly closed (impassable) edge lies on one of their
+shortest paths.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import osmnx as ox
+import shapely
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+from app.services.boundary_store import boundary_name
+from app.services.spatial_index import EARTH_RADIUS_KM, chord_to_km, to_unit_xyz
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROAD_NETWORK_DIR = "data/road_networks"
+
+NETWORK_TYPES = ("drive", "walk")
+
+# Walking speed used for walk networks (drive networks use osmnx's speed imputation)
+WALK_SPEED_KMH = 5.0
+
+# Isochrone polygons are padded by this much so thin road corridors stay visible
+_ISOCHRONE_PADDING_M = 150.0
+
+
+def graph_to_arrays(graph, network_type: str) -> Dict[str, np.ndarray]:
+    """
+    Compact arrays of an osmnx graph: node OSM ids and coordinates, and directed
+    edges (node positions) with their travel time in seconds. Parallel edges
+    keep the fastest one.
+    """
+    node_ids = np.fromiter(graph.nodes, dtype=np.int64, count=graph.number_of_nodes())
+    positions = {node_id: position for position, node_id in enumerate(node_ids.tolist())}
+    lon = np.array([graph.nodes[node_id]["x"] for node_id in node_ids.tolist()], dtype=np.float64)
+    lat = np.array([graph.nodes[node_id]["y"] for node_id in node_ids.tolist()], dtype=np.float64)
+
+    walk_speed = WALK_SPEED_KMH / 3.6
+    source, target, seconds = [], [], []
+    for u, v, data in graph.edges(data=True):
+        source.append(positions[u])
+        target.append(positions[v])
+        if network_type == "walk" or "travel_time" not in data:
+            seconds.append(float(data.get("length", 0.0)) / walk_speed)
+        else:
+            seconds.append(float(data["travel_time"]))
+    source = np.array(source, dtype=np.int32)
+    target = np.array(target, dtype=np.int32)
+    # Zero-cost edges would be dropped by the sparse graph
+    seconds = np.maximum(np.array(seconds, dtype=np.float32), 0.01)
+
+    order = np.lexsort((seconds, target, source))
+    source, target, seconds = source[order], target[order], seconds[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (source[1:] != source[:-1]) | (target[1:] != target[:-1])
+    return {
+        "node_ids": node_ids,
+        "lon": lon,
+        "lat": lat,
+        "source": source[first],
+        "target": target[first],
+        "seconds": seconds[first],
+    }
+
+
+class RoadNetwork:
+    def __init__(self, arrays: Dict[str, np.ndarray], path: str = None):
+        """
+        Routing graph over stored network arrays (see graph_to_arrays).
+
+        Args:
+            arrays: node_ids, lon, lat, source, target and seconds
+            path: File the arrays were loaded from
+        """
+        self.path = path
+        self.node_ids = arrays["node_ids"]
+        self.lon = arrays["lon"]
+        self.lat = arrays["lat"]
+        self.source = arrays["source"]
+        self.target = arrays["target"]
+        self.seconds = arrays["seconds"]
+        self.size = len(self.node_ids)
+        self._positions = None
+        self._tree = cKDTree(to_unit_xyz(self.lat, self.lon)) if self.size else None
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.source)
+
+    def node_positions(self, node_ids: Sequence[int]) -> np.ndarray:
+        """Positions of OSM node ids (-1 for nodes not in the network)"""
+        if self._positions is None:
+            self._positions = {node_id: position for position, node_id in enumerate(self.node_ids.tolist())}
+        return np.array([self._positions.get(int(node_id), -1) for node_id in node_ids], dtype=np.int64)
+
+    def nearest_nodes(self, lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Closest network node of each point and the straight-line distance to it in km"""
+        chords, nodes = self._tree.query(to_unit_xyz(np.asarray(lat), np.asarray(lon)))
+        return nodes, chord_to_km(chords)
+
+    def closed_edge_mask(self, closed: Sequence[Tuple[int, int]]) -> np.ndarray:
+        """Edges (in both directions) between the given pairs of OSM node ids"""
+        mask = np.zeros(self.edge_count, dtype=bool)
+        if not closed:
+            return mask
+        pairs = np.array(closed, dtype=np.int64).reshape(-1, 2)
+        u, v = self.node_positions(pairs[:, 0]), self.node_positions(pairs[:, 1])
+        known = (u >= 0) & (v >= 0)
+        keys = set(zip(u[known].tolist(), v[known].tolist())) | set(zip(v[known].tolist(), u[known].tolist()))
+        edge_keys = self.source.astype(np.int64) * self.size + self.target
+        wanted = np.array([a * self.size + b for a, b in keys], dtype=np.int64)
+        return np.isin(edge_keys, wanted)
+
+    def reverse_graph(self, closed_mask: Optional[np.ndarray] = None) -> csr_matrix:
+        """Sparse graph with edges reversed (so Dijkstra from facilities yields travel times towards them)"""
+        keep = ~closed_mask if closed_mask is not None else slice(None)
+        return csr_matrix(
+            (self.seconds[keep], (self.target[keep], self.source[keep])), shape=(self.size, self.size)
+        )
+
+
+class FacilityField:
+    def __init__(
+        self,
+        seconds: np.ndarray,
+        facility: np.ndarray,
+        next_node: np.ndarray,
+        facilities: List[Dict[str, Any]],
+        closures_checked: int,
+    ):
+        """
+        Travel time from every network node to its nearest facility.
+
+        Args:
+            seconds: Travel time per node (inf where no facility is reachable)
+            facility: Index into facilities of the nearest facility per node (-1 if none)
+            next_node: Next node on the fastest path towards that facility (-9999 at facilities
+                       and unreachable nodes), i.e. the shortest path tree
+            facilities: Facilities that were snapped to the network (id, name, type, latitude,
+                        longitude, node and snap_km)
+            closures_checked: Number of closed edges the field was computed or checked against
+        """
+        self.seconds = seconds
+        self.facility = facility
+        self.next_node = next_node
+        self.facilities = facilities
+        self.closures_checked = closures_checked
+
+    def uses_edges(self, network: RoadNetwork, edge_mask: np.ndarray) -> bool:
+        """Whether any of the masked edges lies on a fastest path of the field"""
+        source, target = network.source[edge_mask], network.target[edge_mask]
+        return bool(np.any(self.next_node[source] == target))
+
+
+class RoutingService:
+    def __init__(self, network_dir: str = None, max_networks: int = None, snap_km: float = None):
+        """
+        Create the routing service.
+
+        Args:
+            network_dir: Directory of stored networks, closures and fields
+                         (env ROAD_NETWORK_DIR, default data/road_networks)
+            max_networks: Networks kept loaded in memory (env ROAD_NETWORK_CACHE_SIZE, default 4)
+            snap_km: Facilities farther than this from any road node are left out
+                     (env ROUTING_SNAP_KM, default 2)
+        """
+        self.network_dir = network_dir or os.environ.get("ROAD_NETWORK_DIR", ROAD_NETWORK_DIR)
+        self.max_networks = max_networks or int(os.environ.get("ROAD_NETWORK_CACHE_SIZE", 4))
+        self.snap_km = snap_km if snap_km is not None else float(os.environ.get("ROUTING_SNAP_KM", 2.0))
+        os.makedirs(os.path.join(self.network_dir, "fields"), exist_ok=True)
+        self._networks: "OrderedDict[tuple, RoadNetwork]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def network_path(self, location: str, network_type: str) -> str:
+        return os.path.join(self.network_dir, f"{boundary_name(location)}_{network_type}.npz")
+
+    def _closures_path(self, location: str, network_type: str) -> str:
+        return os.path.join(self.network_dir, f"{boundary_name(location)}_{network_type}_closures.json")
+
+    def download(self, location: str, network_type: str, boundary) -> Dict[str, Any]:
+        """
+        Download the road network inside a boundary with osmnx and store it.
+
+        Args:
+            location: Location name the network is stored under
+            network_type: "drive" or "walk"
+            boundary: Shapely polygon (EPSG:4326)
+
+        Returns:
+            Summary with the stored path, node and edge counts and file size
+        """
+        if network_type not in NETWORK_TYPES:
+            raise ValueError(f"network_type must be one of {', '.join(NETWORK_TYPES)}")
+        logger.info(f"Downloading the {network_type} network of {location}")
+        graph = ox.graph_from_polygon(boundary, network_type=network_type)
+        if network_type == "drive":
+            graph = ox.add_edge_speeds(graph)
+            graph = ox.add_edge_travel_times(graph)
+        arrays = graph_to_arrays(graph, network_type)
+
+        path = self.network_path(location, network_type)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        # Closures refer to the previous download's edges
+        try:
+            os.remove(self._closures_path(location, network_type))
+        except FileNotFoundError:
+            pass
+        logger.info(f"Stored {len(arrays['node_ids'])} nodes and {len(arrays['source'])} edges in {path}")
+        return {
+            "location": location,
+            "network_type": network_type,
+            "file_path": path,
+            "nodes": len(arrays["node_ids"]),
+            "edges": len(arrays["source"]),
+            "bytes": os.path.getsize(path),
+        }
+
+    def load(self, location: str, network_type: str) -> Optional[RoadNetwork]:
+        """Stored network of a location, or None if it has not been downloaded"""
+        path = self.network_path(location, network_type)
+        try:
+            key = (path, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            network = self._networks.get(key)
+            if network is not None:
+                self._networks.move_to_end(key)
+                return network
+
+        with np.load(path) as arrays:
+            network = RoadNetwork({name: arrays[name] for name in arrays.files}, path=path)
+        with self._lock:
+            for stale_key in [k for k in self._networks if k[0] == path]:
+                del self._networks[stale_key]
+            self._networks[key] = network
+            while len(self._networks) > self.max_networks:
+                self._networks.popitem(last=False)
+        return network
+
+    def closures(self, location: str, network_type: str) -> List[List[int]]:
+        """Closed edges of a network as [u, v] OSM node id pairs, in the order they were closed"""
+        try:
+            with open(self._closures_path(location, network_type), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def close_edges(
+        self, location: str, network_type: str, edges: Sequence[Sequence[int]] = (), hazards: Sequence[Any] = ()
+    ) -> Dict[str, Any]:
+        """
+        Mark edges impassable (in both directions), e.g. from post-disaster reports.
+
+        Args:
+            edges: [u, v] OSM node id pairs
+            hazards: Shapely polygons (EPSG:4326); every edge with an end inside one is closed
+
+        Returns:
+            Numbers of newly and totally closed edges and of cached fields invalidated
+
+        Raises:
+            FileNotFoundError: The network has not been downloaded
+        """
+        network = self.load(location, network_type)
+        if network is None:
+            raise FileNotFoundError(f"No {network_type} network downloaded for {location}")
+        pairs = [[int(u), int(v)] for u, v in edges]
+        if hazards:
+            inside = np.zeros(network.size, dtype=bool)
+            for hazard in hazards:
+                inside |= shapely.contains_xy(hazard, network.lon, network.lat)
+            flooded = inside[network.source] | inside[network.target]
+            pairs.extend(
+                [int(u), int(v)]
+                for u, v in zip(network.node_ids[network.source[flooded]], network.node_ids[network.target[flooded]])
+            )
+
+        with self._lock:
+            closed = self.closures(location, network_type)
+            known = {tuple(pair) for pair in closed} | {(v, u) for u, v in closed}
+            added = []
+            for u, v in pairs:
+                if (u, v) not in known:
+                    known.update(((u, v), (v, u)))
+                    added.append([u, v])
+            closed.extend(added)
+            path = self._closures_path(location, network_type)
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(closed, f)
+            os.replace(f"{path}.tmp", path)
+
+        invalidated = 0
+        for field_path in self._field_paths(network):
+            if self._check_field(network, field_path, closed) is None:
+                invalidated += 1
+        return {"closed": len(added), "total_closed": len(closed), "fields_invalidated": invalidated}
+
+    def _field_key(self, network: RoadNetwork, index, structures: Sequence[str]) -> str:
+        network_stat = os.stat(network.path)
+        snapshot_stat = os.stat(index.source)
+        parts = [
+            network.path, str(network_stat.st_mtime_ns),
+            index.source, str(snapshot_stat.st_mtime_ns),
+            ",".join(sorted(structures or [])),
+        ]
+        prefix = os.path.splitext(os.path.basename(network.path))[0]
+        return f"{prefix}_{hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:16]}"
+
+    def _field_paths(self, network: RoadNetwork) -> List[str]:
+        prefix = f"{os.path.splitext(os.path.basename(network.path))[0]}_"
+        fields_dir = os.path.join(self.network_dir, "fields")
+        return [
+            os.path.join(fields_dir, name) for name in os.listdir(fields_dir)
+            if name.startswith(prefix) and name.endswith(".npz")
+        ]
+
+    def _check_field(self, network: RoadNetwork, path: str, closed: List[List[int]]) -> Optional[FacilityField]:
+        """
+        Load a cached field and check it against edges closed since it was computed:
+        it stays valid (and is marked as checked) unless one of them is on its
+        shortest path tree, in which case it is deleted and None is returned.
+        """
+        try:
+            with np.load(path) as arrays:
+                field = FacilityField(
+                    arrays["seconds"], arrays["facility"], arrays["next_node"],
+                    json.loads(str(arrays["facilities"])), int(arrays["closures_checked"]),
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+        if field.closures_checked < len(closed):
+            new_mask = network.closed_edge_mask(closed[field.closures_checked:])
+            if field.uses_edges(network, new_mask):
+                logger.info(f"Closed roads change {os.path.basename(path)}, dropping it")
+                os.remove(path)
+                return None
+            field.closures_checked = len(closed)
+            self._save_field(path, field)
+        return field
+
+    def _save_field(self, path: str, field: FacilityField) -> None:
+        tmp_path = f"{path}.{threading.get_ident()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            seconds=field.seconds,
+            facility=field.facility,
+            next_node=field.next_node,
+            facilities=np.array(json.dumps(field.facilities)),
+            closures_checked=np.array(field.closures_checked),
+        )
+        os.replace(tmp_path, path)
+
+    def facility_field(
+        self, location: str, network_type: str, index, structures: Sequence[str]
+    ) -> Tuple[RoadNetwork, FacilityField]:
+        """
+        Travel time from every road node to the nearest facility of a snapshot,
+        from the cache if no edge closed since lies on its shortest paths.
+
+        Args:
+            location: Location whose network is used
+            network_type: "drive" or "walk"
+            index: POIIndex of the snapshot holding the facilities
+            structures: Structure types that count as facilities (e.g. ["hospital"])
+
+        Raises:
+            FileNotFoundError: The network has not been downloaded
+        """
+        network = self.load(location, network_type)
+        if network is None:
+            raise FileNotFoundError(f"No {network_type} network downloaded for {location}")
+        closed = self.closures(location, network_type)
+        path = os.path.join(self.network_dir, "fields", f"{self._field_key(network, index, structures)}.npz")
+        if os.path.exists(path):
+            field = self._check_field(network, path, closed)
+            if field is not None:
+                return network, field
+
+        positions = index.select(structures)
+        nodes, snap_km = network.nearest_nodes(index.lat[positions], index.lon[positions])
+        facilities = []
+        node_facility = {}
+        for position, node, distance in zip(positions, nodes, snap_km):
+            if distance > self.snap_km:
+                continue
+            facility = {**index.to_pois([position])[0], "node": int(network.node_ids[node]), "snap_km": round(float(distance), 4)}
+            # Facilities snapped to the same node share it; the first one is reported
+            node_facility.setdefault(int(node), len(facilities))
+            facilities.append(facility)
+
+        seconds = np.full(network.size, np.inf)
+        facility = np.full(network.size, -1, dtype=np.int32)
+        next_node = np.full(network.size, -9999, dtype=np.int32)
+        if node_facility:
+            sources = np.array(list(node_facility), dtype=np.int32)
+            graph = network.reverse_graph(network.closed_edge_mask(closed))
+            seconds, predecessors, origins = dijkstra(
+                graph, directed=True, indices=sources, min_only=True, return_predecessors=True
+            )
+            node_to_facility = np.full(network.size, -1, dtype=np.int32)
+            node_to_facility[sources] = list(node_facility.values())
+            reached = origins >= 0
+            facility[reached] = node_to_facility[origins[reached]]
+            # A predecessor in the reversed graph is the next node towards the facility
+            next_node = predecessors.astype(np.int32)
+        field = FacilityField(seconds, facility, next_node, facilities, len(closed))
+        self._save_field(path, field)
+        logger.info(
+            f"Computed travel times to {len(facilities)} {'/'.join(structures)} facilities over "
+            f"{network.size} {network_type} network nodes of {location}"
+        )
+        return network, field
+
+    def isochrones(self, network: RoadNetwork, field: FacilityField, minutes: Sequence[float]) -> Dict[str, Any]:
+        """
+        Travel-time isochrones as a GeoJSON FeatureCollection: for each threshold the
+        area within that many minutes of a facility, drawn as the concave hull of
+        the reached road nodes of each facility's catchment (padded slightly).
+        """
+        padding = _ISOCHRONE_PADDING_M / (np.radians(1.0) * EARTH_RADIUS_KM * 1000)
+        features = []
+        for limit in sorted(minutes):
+            reached = np.flatnonzero(field.seconds <= limit * 60)
+            geometry = shapely.Polygon()
+            if len(reached):
+                # One multipoint per facility catchment (shapely wants sorted, contiguous labels)
+                _, labels = np.unique(field.facility[reached], return_inverse=True)
+                order = np.argsort(labels, kind="stable")
+                catchments = shapely.multipoints(
+                    shapely.points(network.lon[reached[order]], network.lat[reached[order]]), indices=labels[order]
+                )
+                hulls = shapely.buffer(shapely.concave_hull(catchments, ratio=0.3), padding, quad_segs=4)
+                geometry = shapely.union_all(hulls)
+            features.append({
+                "type": "Feature",
+                "properties": {
+                    "minutes": limit,
+                    "nodes": int(len(reached)),
+                    "facilities": int(len(np.unique(field.facility[reached]))) if len(reached) else 0,
+                },
+                "geometry": shapely.geometry.mapping(geometry),
+            })
+        return {"type": "FeatureCollection", "features": features}
+
+    def nearest_facility(
+        self, network: RoadNetwork, field: FacilityField, lat: float, lon: float
+    ) -> Optional[Dict[str, Any]]:
+        """Nearest facility by road from a point (snapped to its closest road node), or None if none is reachable"""
+        nodes, snap_km = network.nearest_nodes(np.array([lat]), np.array([lon]))
+        node = int(nodes[0])
+        if field.facility[node] < 0:
+            return None
+        return {
+            "facility": field.facilities[field.facility[node]],
+            "travel_time_s": round(float(field.seconds[node]), 1),
+            "snap_km": round(float(snap_km[0]), 4),
+        }
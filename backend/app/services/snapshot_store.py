@@ -0,0 +1,209 @@
+"""
+Columnar storage for pre-disaster snapshots.
+Snapshots are written as Parquet with one row per POI (typed lat/lon columns,
+dictionary-encoded type and status) and snapshot-level information (location,
+timestamp, boundary, structure list) in the file metadata. The loader reads
+only the requested columns and rows; JSON export keeps the legacy format.
+"""
+
+import glob
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = "data/pre_disaster"
+
+# Key of the snapshot-level metadata in the Parquet schema metadata
+_METADATA_KEY = b"disasterlens.snapshot"
+
+POI_SCHEMA = pa.schema([
+    pa.field("id", pa.string()),
+    pa.field("name", pa.string()),
+    pa.field("type", pa.dictionary(pa.int16(), pa.string())),
+    pa.field("latitude", pa.float64()),
+    pa.field("longitude", pa.float64()),
+    pa.field("details", pa.string()),
+    pa.field("status", pa.dictionary(pa.int8(), pa.string())),
+    pa.field("last_updated", pa.string()),
+])
+
+# Column names in the legacy JSON format
+_JSON_FIELDS = {"last_updated": "lastUpdated"}
+
+
+def snapshot_basename(location: str, timestamp: datetime = None) -> str:
+    """File name (without extension) used for a snapshot of a location"""
+    timestamp = timestamp or datetime.now()
+    return f"predisaster_{location.replace(' ', '_').lower()}_{timestamp.strftime('%Y%m%d_%H%M%S')}"
+
+
+def write_snapshot(results: Dict[str, Any], path: str) -> str:
+    """
+    Write a snapshot (the dict built by run_location_data_collection) as Parquet.
+
+    Args:
+        results: Dictionary with location, timestamp, poi_data and boundary_info
+        path: Destination .parquet file
+
+    Returns:
+        The written path
+    """
+    columns = {field.name: [] for field in POI_SCHEMA}
+    # Rows are grouped by type so row-group statistics can skip whole structure types
+    for structure, pois in sorted(results.get("poi_data", {}).items()):
+        for poi in pois:
+            columns["id"].append(poi.get("id"))
+            columns["name"].append(poi.get("name"))
+            columns["type"].append(poi.get("type", structure))
+            columns["latitude"].append(poi.get("latitude"))
+            columns["longitude"].append(poi.get("longitude"))
+            columns["details"].append(poi.get("details"))
+            columns["status"].append(poi.get("status"))
+            columns["last_updated"].append(poi.get("lastUpdated"))
+
+    snapshot_metadata = {
+        "location": results.get("location"),
+        "timestamp": results.get("timestamp"),
+        "structures": list(results.get("poi_data", {}).keys()),
+        "boundary_info": results.get("boundary_info"),
+    }
+    if results.get("coverage"):
+        # Tiled collections record which tiles failed
+        snapshot_metadata["coverage"] = results["coverage"]
+    schema = POI_SCHEMA.with_metadata({_METADATA_KEY: json.dumps(snapshot_metadata).encode("utf-8")})
+    table = pa.Table.from_pydict(columns, schema=schema)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd", row_group_size=64 * 1024)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_snapshot_metadata(path: str) -> Dict[str, Any]:
+    """Return snapshot-level metadata (location, timestamp, structures, boundary_info) without reading rows"""
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            data = json.load(f)
+        return {
+            "location": data.get("location"),
+            "timestamp": data.get("timestamp"),
+            "structures": list(data.get("poi_data", {}).keys()),
+            "boundary_info": data.get("boundary_info"),
+        }
+
+    schema = pq.read_schema(path)
+    raw = (schema.metadata or {}).get(_METADATA_KEY)
+    return json.loads(raw) if raw else {}
+
+
+def load_snapshot(
+    path: str,
+    columns: Optional[Sequence[str]] = None,
+    structures: Optional[Sequence[str]] = None,
+    bbox: Optional[Sequence[float]] = None,
+) -> pa.Table:
+    """
+    Load POI rows of a snapshot as an Arrow table.
+
+    Args:
+        path: Snapshot file (.parquet, or a legacy .json snapshot)
+        columns: Columns to read (default: all)
+        structures: Only rows of these structure types
+        bbox: Only rows inside [min_lon, min_lat, max_lon, max_lat]
+
+    Returns:
+        pyarrow.Table with the requested columns
+    """
+    filters = []
+    if structures:
+        filters.append(("type", "in", list(structures)))
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        filters.extend([
+            ("longitude", ">=", min_lon),
+            ("longitude", "<=", max_lon),
+            ("latitude", ">=", min_lat),
+            ("latitude", "<=", max_lat),
+        ])
+
+    if path.endswith(".json"):
+        # Legacy snapshot: convert in memory, then apply the same filters
+        with open(path, "r") as f:
+            table = _json_to_table(json.load(f))
+        if filters:
+            table = table.filter(pq.filters_to_expression(filters))
+        return table.select(list(columns)) if columns else table
+
+    return pq.read_table(
+        path,
+        columns=list(columns) if columns else None,
+        filters=filters or None,
+    )
+
+
+def _json_to_table(data: Dict[str, Any]) -> pa.Table:
+    columns = {field.name: [] for field in POI_SCHEMA}
+    for structure, pois in data.get("poi_data", {}).items():
+        for poi in pois:
+            for field in POI_SCHEMA:
+                key = _JSON_FIELDS.get(field.name, field.name)
+                value = poi.get(key)
+                if field.name == "type" and value is None:
+                    value = structure
+                columns[field.name].append(value)
+    return pa.Table.from_pydict(columns, schema=POI_SCHEMA)
+
+
+def snapshot_to_json(path: str, structures: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Export a snapshot in the legacy JSON format (poi_data grouped by structure type)"""
+    metadata = read_snapshot_metadata(path)
+    wanted = list(structures) if structures else metadata.get("structures", [])
+    poi_data: Dict[str, List[Dict[str, Any]]] = {structure: [] for structure in wanted}
+
+    table = load_snapshot(path, structures=structures)
+    for row in table.to_pylist():
+        poi = {_JSON_FIELDS.get(key, key): value for key, value in row.items()}
+        poi_data.setdefault(row["type"], []).append(poi)
+
+    return {
+        "location": metadata.get("location"),
+        "timestamp": metadata.get("timestamp"),
+        "poi_data": poi_data,
+        "boundary_info": metadata.get("boundary_info"),
+    }
+
+
+def list_snapshots(location: Optional[str] = None, snapshot_dir: str = SNAPSHOT_DIR) -> List[str]:
+    """
+    List snapshot files, newest first. Parquet and legacy JSON snapshots are both
+    included; when both exist for the same name the Parquet file wins.
+    """
+    prefix = f"predisaster_{location.replace(' ', '_').lower()}_" if location else "predisaster_"
+    by_name = {}
+    for path in glob.glob(os.path.join(snapshot_dir, f"{prefix}*")):
+        name, extension = os.path.splitext(os.path.basename(path))
+        if extension not in (".parquet", ".json"):
+            continue
+        # Location names may contain underscores; the timestamp is always the last two parts
+        if location and name[len(prefix):].count("_") != 1:
+            continue
+        if extension == ".parquet" or name not in by_name:
+            by_name[name] = path
+    # Names end with YYYYmmdd_HHMMSS, so sorting by the suffix orders by time
+    return sorted(by_name.values(), key=lambda p: os.path.splitext(os.path.basename(p))[0][-15:], reverse=True)
+
+
+def latest_snapshot(location: str, snapshot_dir: str = SNAPSHOT_DIR) -> Optional[str]:
+    """Path of the most recent snapshot for a location, or None"""
+    snapshots = list_snapshots(location, snapshot_dir)
+    return snapshots[0] if snapshots else None
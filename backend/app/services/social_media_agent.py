@@ -2,6 +2,7 @@ import urllib.request
 from PIL import Image
 import io
 import json
+import os
 import pandas as pd
 import base64
 import httpx
@@ -13,8 +14,10 @@ from pydantic import BaseModel
 from fastapi import FastAPI, HTTPException
 
 # API Configuration
-APIFY_API_TOKEN = "apify_api_TabodbTjNhFC2uGHT3oif5RayVuBcf2nGZkd"
-RAG_SERVER_URL = "http://localhost:8000"
+APIFY_API_TOKEN = os.environ.get("APIFY_API_TOKEN", "apify_api_TabodbTjNhFC2uGHT3oif5RayVuBcf2nGZkd")
+APIFY_API_URL = os.environ.get("APIFY_API_URL", "https://api.apify.com")
+RAG_SERVER_URL = os.environ.get("RAG_SERVER_URL", "http://localhost:8000")
+BRAVO_BACKEND_URL = os.environ.get("BRAVO_BACKEND_URL", "http://localhost:8080")
 
 # Data models for RAG integration
 class SocialPost(BaseModel):
@@ -48,7 +51,7 @@ async def fetch_social_media_posts(query: DisasterQuery) -> pd.DataFrame:
     search_query = f"flood OR damage OR rescue OR trapped {location}"
     
     # Initialize the ApifyClient
-    client = ApifyClient(APIFY_API_TOKEN)
+    client = ApifyClient(APIFY_API_TOKEN, api_url=APIFY_API_URL)
     
     # Twitter/X scraper actor ID
     ACTOR = "rBaTEHzveTxZPraGv"
@@ -316,7 +319,7 @@ async def generate_combined_report(query: DisasterQuery) -> Dict:
     try:
         async with httpx.AsyncClient(timeout=60.0) as client:
             response = await client.post(
-                "http://localhost:8080/compile_report_from_rag",
+                f"{BRAVO_BACKEND_URL}/compile_report_from_rag",
                 json=query.dict()
             )
             
@@ -0,0 +1,379 @@
+"""
+Spatial index over pre-disaster snapshot POIs.
+Builds KD-trees on unit-sphere (ECEF) coordinates, one per structure type plus
+one over all POIs, so k-nearest and radius queries use true great-circle
+ordering anywhere on the globe. Bounding-box queries use longitude-sorted
+arrays per structure type. Indexes are cached per snapshot file.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pyarrow.compute as pc
+import shapely
+from scipy.spatial import cKDTree
+
+from app.services.snapshot_store import latest_snapshot, load_snapshot
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+_INDEX_COLUMNS = ["id", "name", "type", "latitude", "longitude", "status"]
+
+
+def to_unit_xyz(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Convert degrees to points on the unit sphere (chord length is monotonic in great-circle distance)"""
+    lat_rad = np.radians(lat)
+    lon_rad = np.radians(lon)
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)))
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def km_to_chord(distance_km: float) -> float:
+    return 2 * np.sin(min(distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+class POIIndex:
+    def __init__(self, table, source: str = None):
+        """
+        Build the index from a snapshot table (see snapshot_store.load_snapshot).
+
+        Args:
+            table: pyarrow.Table with at least id, name, type, latitude, longitude and status
+            source: Snapshot path the table was loaded from
+        """
+        self.source = source
+        valid = table.filter(pc.and_(pc.is_valid(table.column("latitude")), pc.is_valid(table.column("longitude"))))
+        self.ids = valid.column("id").to_pylist()
+        self.names = valid.column("name").to_pylist()
+        self.types = np.array(valid.column("type").cast("string").to_pylist(), dtype=object)
+        self.statuses = np.array(valid.column("status").cast("string").to_pylist(), dtype=object)
+        self.lat = valid.column("latitude").to_numpy()
+        self.lon = valid.column("longitude").to_numpy()
+        self.size = len(self.ids)
+
+        # Integer status codes keep filters vectorized
+        self._status_codes = {status: code for code, status in enumerate(sorted(set(self.statuses)))}
+        self.status_code = np.array([self._status_codes[s] for s in self.statuses], dtype=np.int16)
+        self._type_names, type_code = np.unique(self.types, return_inverse=True) if self.size else ([], [])
+        self.type_code = np.asarray(type_code, dtype=np.int16)
+
+        # Planar points for polygon overlays, built on first use (see _planar_points)
+        self._lon_scale = float(np.cos(np.radians(np.mean(self.lat)))) if self.size else 1.0
+        self._points = None
+        self._point_tree = None
+
+        xyz = to_unit_xyz(self.lat, self.lon)
+        self._all = self._build_group(np.arange(self.size), xyz)
+        self._by_type = {}
+        for structure in np.unique(self.types) if self.size else []:
+            positions = np.flatnonzero(self.types == structure)
+            self._by_type[structure] = self._build_group(positions, xyz)
+
+    def _build_group(self, positions: np.ndarray, xyz: np.ndarray) -> Dict[str, Any]:
+        """KD-tree plus longitude-sorted positions (for bounding boxes) over a subset of POIs"""
+        lon_order = positions[np.argsort(self.lon[positions], kind="stable")]
+        return {
+            "positions": positions,
+            "tree": cKDTree(xyz[positions]) if len(positions) else None,
+            "lon_order": lon_order,
+            "lon_sorted": self.lon[lon_order],
+        }
+
+    @property
+    def structures(self) -> List[str]:
+        return sorted(self._by_type)
+
+    def _groups(self, structures: Optional[Sequence[str]]) -> List[Dict[str, Any]]:
+        if not structures:
+            return [self._all] if self.size else []
+        return [self._by_type[s] for s in structures if s in self._by_type]
+
+    def _status_mask(self, positions: np.ndarray, status: str) -> np.ndarray:
+        code = self._status_codes.get(status)
+        if code is None:
+            return np.zeros(len(positions), dtype=bool)
+        return self.status_code[positions] == code
+
+    def _to_poi(self, position: int, distance_km: float = None) -> Dict[str, Any]:
+        poi = {
+            "id": self.ids[position],
+            "name": self.names[position],
+            "type": self.types[position],
+            "latitude": float(self.lat[position]),
+            "longitude": float(self.lon[position]),
+            "status": self.statuses[position],
+        }
+        if distance_km is not None:
+            poi["distance_km"] = round(float(distance_km), 4)
+        return poi
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int = 5,
+        structures: Optional[Sequence[str]] = None,
+        status: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return the k POIs closest to a point, optionally filtered by structure type and status"""
+        point = to_unit_xyz(np.array([lat]), np.array([lon]))[0]
+        candidates = []
+        for group in self._groups(structures):
+            positions, tree = group["positions"], group["tree"]
+            # Widen the search until enough POIs pass the status filter
+            want = min(k, len(positions))
+            while True:
+                chords, local = tree.query(point, k=want)
+                chords, local = np.atleast_1d(chords), np.atleast_1d(local)
+                found = local < len(positions)
+                chords, matched = chords[found], positions[local[found]]
+                if status is not None:
+                    keep = self._status_mask(matched, status)
+                    chords, matched = chords[keep], matched[keep]
+                if len(matched) >= k or want >= len(positions):
+                    break
+                want = min(want * 4, len(positions))
+            candidates.extend(zip(chords[:k], matched[:k]))
+
+        candidates.sort(key=lambda item: item[0])
+        return [self._to_poi(position, chord_to_km(chord)) for chord, position in candidates[:k]]
+
+    def within_radius(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        structures: Optional[Sequence[str]] = None,
+        status: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return POIs within radius_km of a point, nearest first"""
+        point = to_unit_xyz(np.array([lat]), np.array([lon]))[0]
+        radius_chord = km_to_chord(radius_km)
+        matched_parts = []
+        for group in self._groups(structures):
+            local = group["tree"].query_ball_point(point, radius_chord)
+            if local:
+                matched_parts.append(group["positions"][np.asarray(local)])
+        if not matched_parts:
+            return []
+
+        matched = np.concatenate(matched_parts)
+        if status is not None:
+            matched = matched[self._status_mask(matched, status)]
+        xyz = to_unit_xyz(self.lat[matched], self.lon[matched])
+        distances = chord_to_km(np.linalg.norm(xyz - point, axis=1))
+        order = np.argsort(distances, kind="stable")[:limit]
+        return [self._to_poi(matched[i], distances[i]) for i in order]
+
+    def within_bbox(
+        self,
+        min_lon: float,
+        min_lat: float,
+        max_lon: float,
+        max_lat: float,
+        structures: Optional[Sequence[str]] = None,
+        status: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return POIs inside a bounding box (min_lon > max_lon crosses the antimeridian)"""
+        if min_lon <= max_lon:
+            ranges = [(min_lon, max_lon)]
+        else:
+            ranges = [(min_lon, 180.0), (-180.0, max_lon)]
+
+        parts = []
+        for group in self._groups(structures):
+            for low, high in ranges:
+                start = np.searchsorted(group["lon_sorted"], low, side="left")
+                end = np.searchsorted(group["lon_sorted"], high, side="right")
+                parts.append(group["lon_order"][start:end])
+        if not parts:
+            return []
+
+        matched = np.concatenate(parts)
+        lat = self.lat[matched]
+        keep = (lat >= min_lat) & (lat <= max_lat)
+        if status is not None:
+            keep &= self._status_mask(matched, status)
+        matched = matched[keep][:limit]
+        return [self._to_poi(position) for position in matched]
+
+    def select(
+        self,
+        structures: Optional[Sequence[str]] = None,
+        geometry=None,
+        status: Optional[str] = None,
+    ) -> np.ndarray:
+        """Positions of the POIs of some structure types, optionally inside a (shapely, EPSG:4326) geometry"""
+        keep = np.ones(self.size, dtype=bool)
+        if structures:
+            codes = [code for code, name in enumerate(self._type_names) if name in structures]
+            keep &= np.isin(self.type_code, codes)
+        if status is not None:
+            keep &= self.status_code == self._status_codes.get(status, -1)
+        if geometry is not None:
+            positions = np.flatnonzero(keep)
+            return positions[shapely.contains_xy(geometry, self.lon[positions], self.lat[positions])]
+        return np.flatnonzero(keep)
+
+    def to_pois(self, positions: Sequence[int]) -> List[Dict[str, Any]]:
+        """POI dictionaries at positions returned by select"""
+        return [self._to_poi(position) for position in positions]
+
+    def _planar(self, geometries: Sequence[Any]) -> np.ndarray:
+        """Geometries (EPSG:4326) in the index's equirectangular plane (longitude scaled by cos of the mean latitude)"""
+        return shapely.transform(np.asarray(geometries, dtype=object), lambda xy: xy * (self._lon_scale, 1.0))
+
+    def _planar_points(self):
+        if self._point_tree is None:
+            self._points = shapely.points(self.lon * self._lon_scale, self.lat)
+            self._point_tree = shapely.STRtree(self._points)
+        return self._points, self._point_tree
+
+    def overlay(
+        self,
+        hazards: Sequence[Any],
+        near_km: float = 1.0,
+        structures: Optional[Sequence[str]] = None,
+        status: Optional[str] = None,
+        include_safe: bool = False,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Classify POIs against hazard polygons (e.g. flood or fire footprints).
+
+        Bulk STRtree queries of the prepared polygons against the indexed POIs find
+        the POIs inside any polygon and, with the polygons grown by near_km, the
+        candidates near an edge; exact distances are only computed for those.
+        Distances are planar in the equirectangular projection at the snapshot's
+        mean latitude, which is accurate for city- to country-sized snapshots.
+
+        Args:
+            hazards: Shapely polygons in EPSG:4326
+            near_km: POIs outside every hazard but within this distance are near_edge
+            structures: Limit to these structure types
+            status: Limit to POIs with this status
+            include_safe: Also list the safe POIs with their distance to the nearest
+                          hazard (slower: a nearest-neighbour query per safe POI)
+
+        Returns:
+            Per structure type: affected POIs (with the index of a hazard containing
+            them), near_edge and safe POIs (with the nearest hazard and distance_km)
+            and the counts of each
+        """
+        positions = self.select(structures, status=status)
+        hazards = self._planar(hazards)
+        shapely.prepare(hazards)
+        points, tree = self._planar_points()
+
+        # (hazard, POI) pairs where the hazard contains the POI
+        hazard_idx, point_idx = tree.query(hazards, predicate="contains")
+        containing = np.full(self.size, -1, dtype=np.int64)
+        containing[point_idx] = hazard_idx
+        affected = positions[containing[positions] >= 0]
+        outside = positions[containing[positions] < 0]
+
+        # Candidates near an edge: POIs inside the hazards grown by near_km (slightly more, since
+        # buffers approximate arcs with chords), then exact distances for those candidates only
+        km_per_degree = np.radians(1.0) * EARTH_RADIUS_KM
+        nearest = np.full(self.size, -1, dtype=np.int64)
+        distance_km = np.full(self.size, np.inf)
+        grown = shapely.buffer(hazards, near_km / km_per_degree * 1.01, quad_segs=8)
+        shapely.prepare(grown)
+        hazard_idx, point_idx = tree.query(grown, predicate="intersects")
+        is_outside = np.zeros(self.size, dtype=bool)
+        is_outside[outside] = True
+        candidate = is_outside[point_idx]
+        hazard_idx, point_idx = hazard_idx[candidate], point_idx[candidate]
+        distances = shapely.distance(hazards[hazard_idx], points[point_idx]) * km_per_degree
+        # Keep the closest hazard per POI: the first pair of each POI ordered by distance
+        order = np.lexsort((distances, point_idx))
+        closest = order[np.unique(point_idx[order], return_index=True)[1]]
+        nearest[point_idx[closest]] = hazard_idx[closest]
+        distance_km[point_idx[closest]] = distances[closest]
+
+        near_edge = outside[distance_km[outside] <= near_km]
+        near_edge = near_edge[np.argsort(distance_km[near_edge], kind="stable")]
+        safe = outside[distance_km[outside] > near_km]
+        if include_safe and len(safe) and len(hazards):
+            (query_idx, tree_idx), distances = shapely.STRtree(hazards).query_nearest(
+                points[safe], return_distance=True, all_matches=False
+            )
+            nearest[safe[query_idx]] = tree_idx
+            distance_km[safe[query_idx]] = distances * km_per_degree
+
+        groups = {"affected": affected, "near_edge": near_edge, "safe": safe}
+        present = np.bincount(self.type_code[positions], minlength=len(self._type_names))
+        results = {
+            self._type_names[code]: {"counts": dict.fromkeys(groups, 0)} for code in np.flatnonzero(present)
+        }
+        for category, matched in groups.items():
+            counts = np.bincount(self.type_code[matched], minlength=len(self._type_names))
+            for code in np.flatnonzero(counts):
+                results[self._type_names[code]]["counts"][category] = int(counts[code])
+            if category == "safe" and not include_safe:
+                continue
+            for entry in results.values():
+                entry[category] = []
+            for position in matched:
+                if category == "affected":
+                    poi = {**self._to_poi(position), "hazard": int(containing[position])}
+                elif nearest[position] >= 0:
+                    poi = {**self._to_poi(position, distance_km[position]), "hazard": int(nearest[position])}
+                else:
+                    poi = {**self._to_poi(position), "hazard": None}
+                results[self.types[position]][category].append(poi)
+        return results
+
+
+class SpatialIndexCache:
+    def __init__(self, max_entries: int = None):
+        """
+        LRU cache of POI indexes keyed by snapshot file.
+
+        Args:
+            max_entries: Number of indexes kept in memory (env SPATIAL_INDEX_CACHE_SIZE, default 8)
+        """
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.environ.get("SPATIAL_INDEX_CACHE_SIZE", 8)
+        )
+        self._entries: "OrderedDict[tuple, POIIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_for_snapshot(self, path: str) -> POIIndex:
+        """Return the index of a snapshot file, rebuilding it if the file changed"""
+        key = (path, os.stat(path).st_mtime_ns)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                return index
+
+        index = POIIndex(load_snapshot(path, columns=_INDEX_COLUMNS), source=path)
+        logger.info(f"Built spatial index over {index.size} POIs from {path}")
+
+        with self._lock:
+            # Drop indexes of older versions of the same file
+            for stale_key in [k for k in self._entries if k[0] == path]:
+                del self._entries[stale_key]
+            self._entries[key] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+    def get_for_location(self, location: str) -> Optional[POIIndex]:
+        """Return the index of the latest snapshot for a location, or None if there is none"""
+        path = latest_snapshot(location)
+        return self.get_for_snapshot(path) if path else None
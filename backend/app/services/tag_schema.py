@@ -0,0 +1,164 @@
+"""
+Tag schemas of the structure types DisasterLens AI collects.
+Each structure type maps to the exact OSM tag predicates that select it (per
+element type) and to the tags its POI details are built from. The same schema
+builds the Overpass statements, splits combined responses and filters .osm.pbf
+extracts, so all three agree on what e.g. "water" means.
+"""
+
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tags copied into a POI's details when its schema names none
+IMPORTANT_TAGS = ["capacity", "beds", "operator", "emergency", "healthcare",
+                  "building", "levels", "water_supply", "generator:source",
+                  "phone", "contact:phone", "website", "contact:website"]
+
+_CONTACT_TAGS = ("operator", "phone", "contact:phone", "website", "contact:website")
+_BUILDING_TAGS = ("building", "levels")
+
+NWR = ("node", "way", "relation")
+
+# (tag key, operator, value): "=" exact value, "~" regex (anchored where the
+# value list is exhaustive), "!=" / "!~" their negations (also met when the key
+# is missing), None only requires the key
+Predicate = Tuple[str, Optional[str], Optional[str]]
+
+
+def _quote(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+class TagSchema:
+    __slots__ = ("structure", "clauses", "detail_tags")
+
+    def __init__(
+        self,
+        structure: str,
+        clauses: Sequence[Tuple[Tuple[str, ...], Sequence[Predicate]]],
+        detail_tags: Iterable[str] = IMPORTANT_TAGS,
+    ):
+        """
+        Args:
+            structure: Structure type name
+            clauses: (element types, predicates) pairs; an element is of the
+                     structure type if it matches every predicate of a clause
+                     for its element type
+            detail_tags: Tags shown in the POI details
+        """
+        self.structure = structure
+        self.clauses = [(tuple(element_types), tuple(predicates)) for element_types, predicates in clauses]
+        self.detail_tags: FrozenSet[str] = frozenset(detail_tags)
+
+    @property
+    def keys(self) -> List[str]:
+        """Tag key every element of a clause carries (its first positive predicate), per clause"""
+        return [
+            next(key for key, operator, _ in predicates if operator not in ("!=", "!~"))
+            for _, predicates in self.clauses
+        ]
+
+    def matches(self, element_type: str, tags: Dict[str, str]) -> bool:
+        """Whether an element is of this structure type"""
+        for element_types, predicates in self.clauses:
+            if element_type in element_types and all(
+                _predicate_matches(predicate, tags) for predicate in predicates
+            ):
+                return True
+        return False
+
+    def overpass_statements(self, spatial_filter: str, newer: str = None) -> List[str]:
+        """Overpass QL statements selecting the structure type within a spatial filter"""
+        statements = []
+        for element_types, predicates in self.clauses:
+            tag_filter = "".join(
+                f'["{_quote(key)}"]' if operator is None else f'["{_quote(key)}"{operator}"{_quote(value)}"]'
+                for key, operator, value in predicates
+            )
+            if newer:
+                tag_filter += f'(newer:"{newer}")'
+            statements.extend(f"{element_type}{tag_filter}({spatial_filter});" for element_type in element_types)
+        return statements
+
+
+def _predicate_matches(predicate: Predicate, tags: Dict[str, str]) -> bool:
+    key, operator, value = predicate
+    tag = tags.get(key)
+    if operator == "!=":
+        return tag != value
+    if operator == "!~":
+        return tag is None or re.search(value, tag) is None
+    if tag is None:
+        return False
+    if operator is None:
+        return True
+    if operator == "=":
+        return tag == value
+    return re.search(value, tag) is not None
+
+
+# Structure types by name. Predicates are as narrow as the analysis needs:
+# reservoirs rather than every pond, utility and backup generators rather than
+# every rooftop solar panel.
+STRUCTURE_SCHEMAS: Dict[str, TagSchema] = {schema.structure: schema for schema in [
+    TagSchema(
+        "hospital", [(NWR, [("amenity", "=", "hospital")])],
+        ("capacity", "beds", "emergency", "healthcare") + _BUILDING_TAGS + _CONTACT_TAGS,
+    ),
+    TagSchema(
+        "school", [(NWR, [("amenity", "=", "school")])],
+        ("capacity",) + _BUILDING_TAGS + _CONTACT_TAGS,
+    ),
+    TagSchema(
+        "shelter", [(NWR, [("amenity", "=", "shelter")])],
+        ("capacity", "emergency") + _BUILDING_TAGS + _CONTACT_TAGS,
+    ),
+    TagSchema(
+        "fire_station", [(NWR, [("amenity", "=", "fire_station")])],
+        ("emergency",) + _BUILDING_TAGS + _CONTACT_TAGS,
+    ),
+    TagSchema(
+        "police", [(NWR, [("amenity", "=", "police")])],
+        ("emergency",) + _BUILDING_TAGS + _CONTACT_TAGS,
+    ),
+    TagSchema(
+        "water",
+        [
+            (("node",), [("man_made", "~", "^(water_tower|water_well|water_works)$")]),
+            (("way",), [("man_made", "~", "^(water_tower|water_works)$")]),
+            (NWR, [("natural", "=", "water"), ("water", "=", "reservoir")]),
+        ],
+        ("capacity", "water_supply", "operator"),
+    ),
+    TagSchema(
+        "power",
+        [
+            (NWR, [("power", "~", "^(substation|plant)$")]),
+            (("node", "way"), [("power", "=", "generator"), ("generator:source", "!~", "^(solar|wind)$")]),
+        ],
+        ("capacity", "generator:source", "operator"),
+    ),
+]}
+
+
+@lru_cache(maxsize=256)
+def structure_schema(structure: str) -> TagSchema:
+    """
+    Tag schema of a structure type: a registered one, "key=value" for an exact
+    tag ("key=*" for any value of the key), or amenity=<name> for other names
+    (e.g. "pharmacy").
+    """
+    if structure in STRUCTURE_SCHEMAS:
+        return STRUCTURE_SCHEMAS[structure]
+    key, separator, value = structure.partition("=")
+    if separator:
+        predicate = (key.strip(), None, None) if value.strip() == "*" else (key.strip(), "=", value.strip())
+        return TagSchema(structure, [(NWR, [predicate])])
+    logger.info(f"No tag schema for {structure}, selecting amenity={structure}")
+    return TagSchema(structure, [(NWR, [("amenity", "=", structure)])])
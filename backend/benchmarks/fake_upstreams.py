@@ -0,0 +1,550 @@
+"""
+Local stand-ins for the external services DisasterLens AI depends on.
+One FastAPI app serves canned Overpass JSON, Nominatim boundaries, Gemini
+generateContent responses, article pages for the scrapers, deterministic
+Ollama embeddings and an Apify actor/dataset API. Latency and payload sizes
+are configurable so benchmarks can model slow or large upstream responses.
+
+Run it on its own with:
+    python -m benchmarks.fake_upstreams --port 9100 --latency-ms 50
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List
+from urllib.parse import unquote_plus
+
+from fastapi import APIRouter, FastAPI, Request, Response
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+
+_WORDS = (
+    "flood rescue relief water level rainfall district village shelter hospital "
+    "evacuation road bridge damage power outage volunteers government teams army "
+    "boats families displaced camps supplies food medical aid warning river dam "
+    "landslide crops houses collapsed injured missing restored status update"
+).split()
+
+# Overpass statements such as node["amenity"="hospital"] or way["natural"="water"]["water"="reservoir"],
+# and the tag filters within them
+_OVERPASS_STATEMENT = re.compile(r'(node|way|relation|nwr)((?:\["[^"]+"(?:!?[=~]"[^"]*")?\])+)')
+_OVERPASS_FILTER = re.compile(r'\["([^"]+)"(?:(!?[=~])"([^"]*)")?\]')
+# End of the union around the query statements, optionally stored in a named set: ");" or ")->.matches;"
+_OVERPASS_UNION_END = re.compile(r'[^;]*;\s*\)\s*(?:->\s*\.(\w+)\s*)?;')
+# Statements after the union: set selections ("node.matches;", "(way.matches; relation.matches;);")
+# and output statements (".matches out ids qt;", "out tags bb qt;")
+_OVERPASS_OUTPUT_STEP = re.compile(
+    r'\s*(?:\(\s*(?P<union>(?:(?:node|way|relation|nwr)\.\w+\s*;\s*)+)\)\s*;'
+    r'|(?P<type>node|way|relation|nwr)\.(?P<set>\w+)\s*;'
+    r'|(?:\.(?P<out_set>\w+)\s+)?out\b(?P<modifiers>[^;]*);)'
+)
+_OVERPASS_SELECTION = re.compile(r'(node|way|relation|nwr)\.(\w+)')
+# Bounding-box filters: (south,west,north,east)
+_OVERPASS_BBOX = re.compile(r"\((-?[\d.]+),(-?[\d.]+),(-?[\d.]+),(-?[\d.]+)\)")
+_URL_PATTERN = re.compile(r"https?://[^\s\]\)\"'<>]+")
+
+
+class FakeConfig:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter: float = 0.2,
+        overpass_latency_ms: float = None,
+        gemini_latency_ms: float = None,
+        ollama_latency_ms: float = None,
+        apify_latency_ms: float = None,
+        overpass_elements: int = 200,
+        overpass_max_tile_degrees: float = None,
+        article_words: int = 1500,
+        summary_words: int = 250,
+        report_words: int = 1200,
+        sources: int = 5,
+        embedding_dim: int = 768,
+        apify_items: int = 20,
+        seed: int = 42,
+    ):
+        """
+        Behaviour of the fake upstreams.
+
+        Args:
+            latency_ms: Default added latency per request
+            jitter: Relative random spread applied to every latency (0.2 = +/-20%)
+            overpass_latency_ms: Latency of Overpass and Nominatim (default: latency_ms)
+            gemini_latency_ms: Latency of Gemini and article pages (default: latency_ms)
+            ollama_latency_ms: Latency of the embedding server (default: latency_ms)
+            apify_latency_ms: Latency of the Apify API (default: latency_ms)
+            overpass_elements: Elements returned per tag filter of an Overpass query
+            overpass_max_tile_degrees: Bounding-box queries spanning more degrees than this
+                                       time out (to exercise tile splitting); default never
+            article_words: Words per article page
+            summary_words: Words per Gemini summary
+            report_words: Words per Gemini report
+            sources: Sources listed in a fake discovery result
+            embedding_dim: Embedding vector length
+            apify_items: Dataset items produced per actor run
+            seed: Seed for the latency jitter
+        """
+        self.latency_ms = {
+            "overpass": latency_ms if overpass_latency_ms is None else overpass_latency_ms,
+            "gemini": latency_ms if gemini_latency_ms is None else gemini_latency_ms,
+            "ollama": latency_ms if ollama_latency_ms is None else ollama_latency_ms,
+            "apify": latency_ms if apify_latency_ms is None else apify_latency_ms,
+        }
+        self.jitter = jitter
+        self.overpass_elements = overpass_elements
+        self.overpass_max_tile_degrees = overpass_max_tile_degrees
+        self.article_words = article_words
+        self.summary_words = summary_words
+        self.report_words = report_words
+        self.sources = sources
+        self.embedding_dim = embedding_dim
+        self.apify_items = apify_items
+        self.random = random.Random(seed)
+
+
+def _stable_seed(*parts: Any) -> int:
+    digest = hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def _text(seed: int, words: int) -> str:
+    rng = random.Random(seed)
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 20))
+        sentence = " ".join(rng.choice(_WORDS) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        remaining -= length
+    return " ".join(sentences)
+
+
+def create_app(config: FakeConfig = None) -> FastAPI:
+    """Build the fake upstream app; every service lives under its own path prefix"""
+    config = config or FakeConfig()
+    app = FastAPI(title="DisasterLens fake upstreams")
+    app.state.config = config
+    app.state.requests = {}
+    app.state.apify_runs = {}
+
+    async def delay(service: str) -> None:
+        app.state.requests[service] = app.state.requests.get(service, 0) + 1
+        latency = config.latency_ms[service]
+        if latency > 0:
+            spread = 1 + config.jitter * (2 * config.random.random() - 1)
+            await asyncio.sleep(latency * spread / 1000)
+
+    @app.get("/stats")
+    async def stats():
+        """Requests served per fake service"""
+        return app.state.requests
+
+    # Overpass and Nominatim
+    osm = APIRouter()
+
+    @osm.post("/overpass/api/interpreter")
+    async def overpass_interpreter(request: Request):
+        await delay("overpass")
+        body = (await request.body()).decode("utf-8")
+        if body.startswith("data="):
+            body = unquote_plus(body[len("data="):])
+
+        area = re.search(r'area\[[^\]]*"([^"]+)"\]', body)
+        area_key = area.group(1) if area else body
+        rng = random.Random(_stable_seed("overpass", area_key))
+        center_lat, center_lon = rng.uniform(-50, 50), rng.uniform(-170, 170)
+        half_lat = half_lon = 0.2
+
+        bbox = _OVERPASS_BBOX.search(body)
+        if bbox:
+            south, west, north, east = (float(value) for value in bbox.groups())
+            limit = config.overpass_max_tile_degrees
+            if limit is not None and max(north - south, east - west) > limit:
+                # Same shape as a query that hit its [timeout]
+                return Response(content=json.dumps({
+                    "version": 0.6,
+                    "elements": [],
+                    "remark": 'runtime error: Query timed out in "query" at line 3 after 60 seconds.',
+                }), media_type="application/json")
+            # Elements spread over the requested box
+            center_lat, center_lon = (south + north) / 2, (west + east) / 2
+            half_lat, half_lon = (north - south) / 2, (east - west) / 2
+
+        filters = {}
+        statements = list(_OVERPASS_STATEMENT.finditer(body))
+        last_statement = None
+        for statement in statements:
+            element_type, tag_filters = statement.groups()
+            tags = []
+            for key, operator, value in _OVERPASS_FILTER.findall(tag_filters):
+                if operator.startswith("!"):
+                    # Negated filters are met by leaving the key out
+                    continue
+                # Regex filters ("^(a|b|c)$") produce elements tagged with the first alternative
+                value = value.strip("^$()").split("|")[0] if operator else "yes"
+                tags.append((key, value))
+            filters.setdefault(tuple(tags), []).append(element_type)
+            last_statement = (element_type, tuple(tags))
+
+        # Queries with a newer: filter see 1 in 20 elements as changed
+        changed_only = "(newer:" in body
+
+        # (element, tags of the statement that found it)
+        matched = []
+        # OSM ids are global: elements of different tiles must not share ids
+        next_id = 1 + (_stable_seed("overpass", bbox.groups()) % 10**6) * 10**4 if bbox else 1
+        for tags, element_types in sorted(filters.items()):
+            value = tags[0][1]
+            for i in range(config.overpass_elements):
+                if changed_only and i % 20:
+                    next_id += 1
+                    continue
+                element_type = element_types[i % len(element_types)]
+                if element_type == "nwr":
+                    element_type = ("node", "way", "relation")[i % 3]
+                lat = round(center_lat + rng.uniform(-half_lat, half_lat), 7)
+                lon = round(center_lon + rng.uniform(-half_lon, half_lon), 7)
+                element = {
+                    "type": element_type,
+                    "id": next_id,
+                    "tags": {**dict(tags), "name": f"{value.replace('_', ' ').title()} {i + 1}", "operator": "Benchmark"},
+                    "lat": lat,
+                    "lon": lon,
+                }
+                matched.append((element, tags))
+                next_id += 1
+
+        # Result sets: the union's result goes to its named set; the default set "_" then holds
+        # the result of its last statement only, as in Overpass
+        sets = {"_": [element for element, _ in matched]}
+        position = len(body)
+        if statements:
+            union_end = _OVERPASS_UNION_END.match(body, statements[-1].end())
+            if union_end:
+                position = union_end.end()
+                if union_end.group(1):
+                    last_type, last_tags = last_statement
+                    sets[union_end.group(1)] = sets["_"]
+                    sets["_"] = [
+                        element for element, tags in matched
+                        if tags == last_tags and last_type in ("nwr", element["type"])
+                    ]
+
+        def select(selections: str) -> list:
+            return [
+                element
+                for element_type, name in _OVERPASS_SELECTION.findall(selections)
+                for element in sets.get(name, [])
+                if element_type in ("nwr", element["type"])
+            ]
+
+        def render(element: dict, modifiers: List[str]) -> dict:
+            # "out ids" drops tags and geometry; "out center" gives ways and relations a center and
+            # "out bb" their bounds; "out tags" leaves the node and member lists out
+            if "ids" in modifiers:
+                return {"type": element["type"], "id": element["id"]}
+            lat, lon = element["lat"], element["lon"]
+            rendered = {"type": element["type"], "id": element["id"], "tags": element["tags"]}
+            if element["type"] == "node":
+                rendered.update({"lat": lat, "lon": lon})
+                return rendered
+            if "bb" in modifiers:
+                rendered["bounds"] = {
+                    "minlat": round(lat - 0.0005, 7), "minlon": round(lon - 0.0005, 7),
+                    "maxlat": round(lat + 0.0005, 7), "maxlon": round(lon + 0.0005, 7),
+                }
+            elif "center" in modifiers:
+                rendered["center"] = {"lat": lat, "lon": lon}
+            if "tags" not in modifiers:
+                if element["type"] == "way":
+                    rendered["nodes"] = [element["id"] * 10 + n for n in range(5)]
+                else:
+                    rendered["members"] = []
+            return rendered
+
+        elements = []
+        while True:
+            step = _OVERPASS_OUTPUT_STEP.match(body, position)
+            if step is None:
+                break
+            position = step.end()
+            if step.group("union"):
+                sets["_"] = select(step.group("union"))
+            elif step.group("type"):
+                sets["_"] = select(f"{step.group('type')}.{step.group('set')}")
+            else:
+                modifiers = step.group("modifiers").split()
+                elements.extend(render(element, modifiers) for element in sets.get(step.group("out_set") or "_", []))
+
+        payload = {
+            "version": 0.6,
+            "generator": "DisasterLens fake Overpass",
+            "osm3s": {"timestamp_osm_base": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())},
+            "elements": elements,
+        }
+        return Response(content=json.dumps(payload), media_type="application/json")
+
+    @osm.get("/overpass/api/status", response_class=PlainTextResponse)
+    async def overpass_status():
+        # Like a self-hosted instance: no rate limit
+        return "Connected as: 0\nAnnounced endpoint: none\nRate limit: 0\nCurrently running queries (pid, space limit, time limit, start time):\n"
+
+    @osm.get("/nominatim/search")
+    async def nominatim_search(q: str = ""):
+        await delay("overpass")
+        rng = random.Random(_stable_seed("overpass", q.split(",")[0].strip()))
+        lat, lon = rng.uniform(-50, 50), rng.uniform(-170, 170)
+        south, north, west, east = lat - 0.25, lat + 0.25, lon - 0.25, lon + 0.25
+        ring = [[west, south], [east, south], [east, north], [west, north], [west, south]]
+        return [{
+            "place_id": _stable_seed(q) % 10**8,
+            "osm_type": "relation",
+            "osm_id": _stable_seed("relation", q) % 10**7,
+            "boundingbox": [str(south), str(north), str(west), str(east)],
+            "lat": str(lat),
+            "lon": str(lon),
+            "display_name": q,
+            "class": "boundary",
+            "type": "administrative",
+            "importance": 0.7,
+            "geojson": {"type": "Polygon", "coordinates": [ring]},
+        }]
+
+    # Gemini and the article pages its discovery results point to
+    gemini = APIRouter()
+
+    @gemini.post("/gemini/{version}/models/{model_action}")
+    async def gemini_generate(version: str, model_action: str, request: Request):
+        await delay("gemini")
+        body = await request.json()
+        prompt = "\n".join(
+            part.get("text", "")
+            for content in body.get("contents", [])
+            for part in content.get("parts", [])
+            if isinstance(part, dict)
+        )
+        seed = _stable_seed("gemini", prompt)
+
+        if "summarize" in prompt.lower():
+            text = _text(seed, config.summary_words)
+        elif body.get("systemInstruction") or body.get("system_instruction"):
+            # Agent pipeline turns: answer with a discovery result
+            base = str(request.base_url).rstrip("/")
+            text = "```json\n" + json.dumps({
+                "event_name": "Benchmark Floods",
+                "start_date": "2024-07-01",
+                "end_date": "2024-07-07",
+                "sources": [
+                    {
+                        "url": f"{base}/articles/{seed % 100000}-{i}",
+                        "title": f"Benchmark article {i + 1}",
+                        "description": _text(seed + i, 20),
+                    }
+                    for i in range(config.sources)
+                ],
+            }, indent=2) + "\n```"
+        else:
+            urls = sorted(set(_URL_PATTERN.findall(prompt)))
+            sections = ["# Disaster Report: Benchmark Event", "## Executive Summary", _text(seed, config.report_words // 2),
+                        "## Impact Assessment", _text(seed + 1, config.report_words // 2), "## Sources"]
+            sections.extend(f"{i + 1}. {url}" for i, url in enumerate(urls))
+            text = "\n\n".join(sections)
+
+        words = len(text.split())
+        payload = {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": len(prompt.split()),
+                "candidatesTokenCount": words,
+                "totalTokenCount": len(prompt.split()) + words,
+            },
+            "modelVersion": model_action.split(":")[0],
+        }
+        if model_action.endswith(":streamGenerateContent"):
+            return Response(content=f"data: {json.dumps(payload)}\r\n\r\n", media_type="text/event-stream")
+        return payload
+
+    @gemini.get("/articles/{slug}", response_class=HTMLResponse)
+    async def article(slug: str):
+        await delay("gemini")
+        seed = _stable_seed("article", slug)
+        paragraphs = "".join(
+            f"<p>{_text(seed + i, 100)}</p>" for i in range(max(1, math.ceil(config.article_words / 100)))
+        )
+        return (
+            f"<html><head><title>Benchmark article {slug}</title></head>"
+            f"<body><article><h1>Benchmark article {slug}</h1>{paragraphs}</article></body></html>"
+        )
+
+    # Ollama embeddings
+    ollama = APIRouter()
+
+    def embedding(text: str) -> List[float]:
+        rng = random.Random(_stable_seed("embedding", text))
+        vector = [rng.gauss(0, 1) for _ in range(config.embedding_dim)]
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    @ollama.post("/ollama/api/embeddings")
+    async def ollama_embeddings(request: Request):
+        await delay("ollama")
+        body = await request.json()
+        return {"embedding": embedding(body.get("prompt", ""))}
+
+    @ollama.post("/ollama/api/embed")
+    async def ollama_embed(request: Request):
+        await delay("ollama")
+        body = await request.json()
+        inputs = body.get("input", "")
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        return {"model": body.get("model"), "embeddings": [embedding(text) for text in inputs]}
+
+    # Apify actor runs and datasets
+    apify = APIRouter()
+
+    def run_object(run_id: str) -> Dict[str, Any]:
+        run = app.state.apify_runs[run_id]
+        return {
+            "id": run_id,
+            "actId": run["actor"],
+            "status": "SUCCEEDED",
+            "startedAt": run["started_at"],
+            "finishedAt": run["started_at"],
+            "defaultDatasetId": f"{run_id}-dataset",
+            "defaultKeyValueStoreId": f"{run_id}-store",
+            "defaultRequestQueueId": f"{run_id}-queue",
+            "buildId": "benchmark",
+            "meta": {"origin": "API"},
+            "stats": {},
+            "options": {},
+        }
+
+    @apify.post("/apify/v2/acts/{actor}/runs")
+    async def apify_start_run(actor: str, request: Request):
+        await delay("apify")
+        raw = await request.body()
+        try:
+            run_input = json.loads(raw) if raw else {}
+        except ValueError:
+            run_input = {}
+        run_id = uuid.uuid4().hex[:17]
+        app.state.apify_runs[run_id] = {
+            "actor": actor,
+            "input": run_input,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+        }
+        return JSONResponse({"data": run_object(run_id)}, status_code=201)
+
+    @apify.get("/apify/v2/actor-runs/{run_id}")
+    async def apify_get_run(run_id: str):
+        await delay("apify")
+        if run_id not in app.state.apify_runs:
+            return JSONResponse({"error": {"type": "record-not-found", "message": "Run not found"}}, status_code=404)
+        return {"data": run_object(run_id)}
+
+    @apify.get("/apify/v2/actor-runs/{run_id}/log", response_class=PlainTextResponse)
+    @apify.get("/apify/v2/logs/{run_id}", response_class=PlainTextResponse)
+    async def apify_log(run_id: str):
+        return ""
+
+    @apify.get("/apify/v2/datasets/{dataset_id}/items")
+    async def apify_dataset_items(dataset_id: str, offset: int = 0, limit: int = 1000, desc: bool = False):
+        await delay("apify")
+        run_id = dataset_id.rsplit("-dataset", 1)[0]
+        run = app.state.apify_runs.get(run_id, {"input": {}})
+        query = run["input"].get("query", "")
+        total = config.apify_items
+        items = []
+        for i in range(offset, min(total, offset + limit)):
+            seed = _stable_seed("apify", query, i)
+            items.append({
+                "postId": str(seed % 10**15),
+                "postText": f"{_text(seed, 30)} #flood #rescue",
+                "timestamp": int(time.time() * 1000) - i * 60000,
+                "author": {"name": f"user{seed % 10000}"},
+                "media": [],
+                "url": f"https://x.com/user{seed % 10000}/status/{seed % 10**15}",
+            })
+        headers = {
+            "x-apify-pagination-total": str(total),
+            "x-apify-pagination-offset": str(offset),
+            "x-apify-pagination-count": str(len(items)),
+            "x-apify-pagination-limit": str(limit),
+            "x-apify-pagination-desc": str(desc).lower(),
+        }
+        return JSONResponse(items, headers=headers)
+
+    for router in (osm, gemini, ollama, apify):
+        app.include_router(router)
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Command line options shared with the benchmark runner"""
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every fake response")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative latency spread (0.2 = +/-20%%)")
+    parser.add_argument("--overpass-latency-ms", type=float, default=None)
+    parser.add_argument("--gemini-latency-ms", type=float, default=None)
+    parser.add_argument("--ollama-latency-ms", type=float, default=None)
+    parser.add_argument("--apify-latency-ms", type=float, default=None)
+    parser.add_argument("--overpass-elements", type=int, default=200, help="Overpass elements per tag filter")
+    parser.add_argument("--overpass-max-tile-degrees", type=float, default=None,
+                        help="Bounding-box queries larger than this time out")
+    parser.add_argument("--article-words", type=int, default=1500)
+    parser.add_argument("--summary-words", type=int, default=250)
+    parser.add_argument("--report-words", type=int, default=1200)
+    parser.add_argument("--sources", type=int, default=5, help="Sources per fake discovery result")
+    parser.add_argument("--embedding-dim", type=int, default=768)
+    parser.add_argument("--apify-items", type=int, default=20, help="Dataset items per actor run")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    return FakeConfig(
+        latency_ms=args.latency_ms,
+        jitter=args.jitter,
+        overpass_latency_ms=args.overpass_latency_ms,
+        gemini_latency_ms=args.gemini_latency_ms,
+        ollama_latency_ms=args.ollama_latency_ms,
+        apify_latency_ms=args.apify_latency_ms,
+        overpass_elements=args.overpass_elements,
+        overpass_max_tile_degrees=args.overpass_max_tile_degrees,
+        article_words=args.article_words,
+        summary_words=args.summary_words,
+        report_words=args.report_words,
+        sources=args.sources,
+        embedding_dim=args.embedding_dim,
+        apify_items=args.apify_items,
+    )
+
+
+def config_to_args(args: argparse.Namespace) -> List[str]:
+    """Turn parsed options back into command line arguments (used to spawn the server)"""
+    argv = []
+    for name in ("latency_ms", "jitter", "overpass_latency_ms", "gemini_latency_ms", "ollama_latency_ms",
+                 "apify_latency_ms", "overpass_elements", "overpass_max_tile_degrees", "article_words",
+                 "summary_words", "report_words", "sources", "embedding_dim", "apify_items"):
+        value = getattr(args, name)
+        if value is not None:
+            argv.extend([f"--{name.replace('_', '-')}", str(value)])
+    return argv
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the DisasterLens fake upstream services")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
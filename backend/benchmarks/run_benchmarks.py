@@ -0,0 +1,457 @@
+"""
+End-to-end benchmarks for DisasterLens AI.
+
+Starts the fake upstreams (benchmarks/fake_upstreams.py) and the services
+under test as separate processes in a scratch working directory, points the
+services at the fakes through their *_URL environment variables, drives each
+endpoint with concurrent requests and reports p50/p95/p99 latency, throughput
+and the peak RSS of the serving process per endpoint.
+
+Background-job endpoints (/api/pre-disaster/collect, /api/generate-report) are
+timed from submission until the job reaches a terminal status, followed over
+the job's event stream.
+
+Examples (run from backend/):
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --scenarios collect,report --requests 50 --concurrency 8
+    python -m benchmarks.run_benchmarks --latency-ms 100 --output results.json
+    python -m benchmarks.run_benchmarks --baseline results.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_upstreams import add_arguments, config_to_args
+
+try:
+    import psutil
+except ImportError:  # psutil is optional; /proc is used on Linux
+    psutil = None
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICES_DIR = os.path.join(BACKEND_DIR, "app", "services")
+
+# Services under test: uvicorn app, import directory and readiness path
+SERVICES = {
+    "api": {"app": "main:app", "app_dir": BACKEND_DIR, "ready": "/"},
+    "rag": {"app": "RAG:app", "app_dir": SERVICES_DIR, "ready": "/health"},
+    "bravo": {"app": "bravo-backend:app", "app_dir": SERVICES_DIR, "ready": "/docs"},
+    "social": {"app": "social_agent_api:app", "app_dir": SERVICES_DIR, "ready": "/docs"},
+}
+
+STRUCTURES = ["hospital", "school", "shelter", "fire_station", "police", "water", "power"]
+
+TERMINAL_STATUSES = ("completed", "error")
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process, or None if it cannot be read"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            pass
+    return None
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def to_ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class RSSSampler:
+    def __init__(self, pid: int, interval: float = 0.05):
+        """Samples the RSS of a process in a background thread and keeps the peak"""
+        self.pid = pid
+        self.interval = interval
+        self.peak = read_rss_bytes(pid) or 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            rss = read_rss_bytes(self.pid)
+            if rss is not None and rss > self.peak:
+                self.peak = rss
+
+    def __enter__(self) -> "RSSSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class ServiceProcess:
+    def __init__(self, name: str, command: List[str], cwd: str, env: Dict[str, str], port: int, ready_path: str):
+        self.name = name
+        self.command = command
+        self.cwd = cwd
+        self.env = env
+        self.port = port
+        self.ready_path = ready_path
+        self.url = f"http://127.0.0.1:{port}"
+        self.log_path = os.path.join(cwd, "logs", f"{name}.log")
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        log = open(self.log_path, "w")
+        self.process = subprocess.Popen(self.command, cwd=self.cwd, env=self.env, stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+
+    def wait_ready(self, timeout: float) -> None:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited during startup:\n{self.log_tail()}")
+            try:
+                if httpx.get(f"{self.url}{self.ready_path}", timeout=2.0).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"{self.name} did not become ready within {timeout:.0f}s:\n{self.log_tail()}")
+
+    def log_tail(self, lines: int = 20) -> str:
+        try:
+            with open(self.log_path, "r", errors="replace") as f:
+                return "".join(f.readlines()[-lines:])
+        except OSError:
+            return ""
+
+    def stop(self) -> None:
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+async def wait_for_job(client: httpx.AsyncClient, base_url: str, job_id: str) -> None:
+    """Follow a job's event stream until it finishes, raising if it did not complete"""
+    state = {}
+    async with client.stream("GET", f"{base_url}/api/job/{job_id}/events") as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                state = json.loads(line[len("data: "):])
+                if state.get("status") in TERMINAL_STATUSES:
+                    break
+    if state.get("status") != "completed":
+        raise RuntimeError(f"job ended with status {state.get('status')}: {state.get('error')}")
+
+
+# Scenario callables: (client, service URLs, request index); they raise on failure
+async def call_collect(client, urls, i):
+    response = await client.post(
+        f"{urls['api']}/api/pre-disaster/collect",
+        # A distinct location per request, so requests are not coalesced into one job
+        json={"location": f"Benchtown {i:05d}", "structures": STRUCTURES},
+    )
+    response.raise_for_status()
+    await wait_for_job(client, urls["api"], response.json()["job_id"])
+
+
+async def call_report(client, urls, i):
+    response = await client.post(
+        f"{urls['api']}/api/generate-report",
+        json={"discovery_file": f"benchmark_discovery_{i % 10}.json", "bypass_cache": True},
+    )
+    response.raise_for_status()
+    await wait_for_job(client, urls["api"], response.json()["job_id"])
+
+
+async def call_rag_add(client, urls, i):
+    response = await client.post(
+        f"{urls['rag']}/add/news",
+        json={
+            "title": f"Benchmark article {i}",
+            "content": f"Flood waters rose in district {i % 50} and rescue teams evacuated families to shelter {i}.",
+            "source": "benchmark",
+            "url": f"https://news.example/benchmark/{i}",
+        },
+    )
+    response.raise_for_status()
+
+
+async def call_rag_query(client, urls, i):
+    response = await client.post(
+        f"{urls['rag']}/query",
+        json={"query": f"flood rescue district {i % 50}", "limit": 5},
+    )
+    response.raise_for_status()
+
+
+def disaster_query(i):
+    return {"event_name": f"Benchmark Floods {i % 10}", "start_date": "2024-07-01", "end_date": "2024-07-07"}
+
+
+async def call_compile(client, urls, i):
+    response = await client.post(f"{urls['bravo']}/compile_report_from_rag", json=disaster_query(i))
+    response.raise_for_status()
+
+
+async def call_combined(client, urls, i):
+    response = await client.post(f"{urls['social']}/combined_report", json=disaster_query(i))
+    response.raise_for_status()
+
+
+class Scenario:
+    def __init__(self, name: str, endpoint: str, service: str, requires: List[str], call: Callable[..., Awaitable[None]]):
+        self.name = name
+        self.endpoint = endpoint
+        self.service = service
+        self.requires = requires
+        self.call = call
+
+
+# Run in this order: rag-query needs the documents added by rag-add
+SCENARIOS = [
+    Scenario("collect", "POST /api/pre-disaster/collect", "api", ["api"], call_collect),
+    Scenario("report", "POST /api/generate-report", "api", ["api"], call_report),
+    Scenario("rag-add", "POST /add/news", "rag", ["rag"], call_rag_add),
+    Scenario("rag-query", "POST /query", "rag", ["rag"], call_rag_query),
+    Scenario("compile", "POST /compile_report_from_rag", "bravo", ["rag", "bravo"], call_compile),
+    Scenario("combined", "POST /combined_report", "social", ["rag", "bravo", "social"], call_combined),
+]
+
+
+async def run_scenario(scenario: Scenario, urls: Dict[str, str], pid: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Drive one endpoint with args.requests requests at args.concurrency and summarize the results"""
+    limits = httpx.Limits(max_connections=args.concurrency * 2 + 4)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        for i in range(args.warmup):
+            try:
+                await scenario.call(client, urls, args.requests + i)
+            except Exception:
+                pass
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies: List[float] = []
+        errors: List[str] = []
+
+        async def one(i):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    await scenario.call(client, urls, i)
+                    latencies.append(time.perf_counter() - started)
+                except Exception as e:
+                    errors.append(f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}")
+
+        with RSSSampler(pid) as sampler:
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(args.requests)))
+            wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "endpoint": scenario.endpoint,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": args.requests - len(latencies),
+        "p50_ms": to_ms(percentile(latencies, 50)),
+        "p95_ms": to_ms(percentile(latencies, 95)),
+        "p99_ms": to_ms(percentile(latencies, 99)),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall > 0 else None,
+        "peak_rss_mb": round(sampler.peak / (1024 * 1024), 1),
+        "sample_errors": sorted(set(errors))[:3],
+    }
+
+
+def write_discovery_files(workdir: str, fake_url: str, sources: int) -> None:
+    """Discovery files for the report scenario, with sources served by the fake article server"""
+    data_dir = os.path.join(workdir, "disaster_data")
+    os.makedirs(data_dir, exist_ok=True)
+    for n in range(10):
+        discovery = {
+            "event_name": f"Benchmark Floods {n}",
+            "start_date": "2024-07-01",
+            "end_date": "2024-07-07",
+            "sources": [
+                {"url": f"{fake_url}/articles/discovery-{n}-{i}", "title": f"Benchmark article {i + 1}"}
+                for i in range(sources)
+            ],
+        }
+        with open(os.path.join(data_dir, f"benchmark_discovery_{n}.json"), "w") as f:
+            json.dump(discovery, f, indent=2)
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    columns = [
+        ("scenario", None), ("endpoint", "endpoint"), ("n", "requests"), ("err", "errors"),
+        ("p50 ms", "p50_ms"), ("p95 ms", "p95_ms"), ("p99 ms", "p99_ms"),
+        ("req/s", "throughput_rps"), ("peak RSS MB", "peak_rss_mb"),
+    ]
+    rows = [[name] + ["-" if r[key] is None else str(r[key]) for _, key in columns[1:]] for name, r in results.items()]
+    widths = [max(len(title), *(len(row[i]) for row in rows)) for i, (title, _) in enumerate(columns)]
+    print("  ".join(title.ljust(widths[i]) for i, (title, _) in enumerate(columns)))
+    for row in rows:
+        print("  ".join(cell.ljust(widths[i]) for i, cell in enumerate(row)))
+
+
+def compare_to_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions against a previous --output file: slower p95, lower throughput, more memory or new errors"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        for key, higher_is_worse in (("p95_ms", True), ("throughput_rps", False), ("peak_rss_mb", True)):
+            old, new = previous.get(key), current.get(key)
+            if not old or new is None:
+                continue
+            if (higher_is_worse and new > old * (1 + tolerance)) or (not higher_is_worse and new < old * (1 - tolerance)):
+                regressions.append(f"{name}: {key} {old} -> {new}")
+        if current["errors"] > previous.get("errors", 0):
+            regressions.append(f"{name}: errors {previous.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark DisasterLens AI endpoints against local fake upstreams")
+    parser.add_argument("--scenarios", default=",".join(s.name for s in SCENARIOS),
+                        help="Comma-separated scenarios: " + ", ".join(s.name for s in SCENARIOS))
+    parser.add_argument("--requests", type=int, default=20, help="Measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight per scenario")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured requests before each scenario")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Timeout per request in seconds")
+    parser.add_argument("--startup-timeout", type=float, default=120.0, help="Seconds to wait for each service")
+    parser.add_argument("--workdir", help="Working directory for the services (default: a temporary directory)")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the working directory and service logs")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression against the baseline")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    selected = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(selected) - {s.name for s in SCENARIOS}
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    scenarios = [s for s in SCENARIOS if s.name in selected]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="disasterlens-bench-")
+    os.makedirs(workdir, exist_ok=True)
+
+    fake_port = free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    ports = {name: free_port() for name in SERVICES}
+    urls = {name: f"http://127.0.0.1:{port}" for name, port in ports.items()}
+
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [BACKEND_DIR, env.get("PYTHONPATH")])),
+        "OVERPASS_URL": f"{fake_url}/overpass/api/interpreter",
+        "NOMINATIM_URL": f"{fake_url}/nominatim/",
+        "GOOGLE_GEMINI_BASE_URL": f"{fake_url}/gemini/",
+        "GEMINI_API_KEY": "benchmark",
+        "GOOGLE_API_KEY": "benchmark",
+        "GOOGLE_GENAI_USE_VERTEXAI": "false",
+        "OLLAMA_URL": f"{fake_url}/ollama",
+        "APIFY_API_URL": f"{fake_url}/apify",
+        "APIFY_API_TOKEN": "benchmark",
+        "RAG_SERVER_URL": urls["rag"],
+        "BRAVO_BACKEND_URL": urls["bravo"],
+    })
+
+    processes = [ServiceProcess(
+        "fake_upstreams",
+        [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port)] + config_to_args(args),
+        workdir, env, fake_port, "/stats",
+    )]
+    needed = {service for scenario in scenarios for service in scenario.requires}
+    for name in SERVICES:
+        if name in needed:
+            service = SERVICES[name]
+            processes.append(ServiceProcess(
+                name,
+                [sys.executable, "-m", "uvicorn", service["app"], "--app-dir", service["app_dir"],
+                 "--host", "127.0.0.1", "--port", str(ports[name]), "--log-level", "warning"],
+                workdir, env, ports[name], service["ready"],
+            ))
+    by_name = {process.name: process for process in processes}
+
+    write_discovery_files(workdir, fake_url, args.sources)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for process in processes:
+            print(f"Starting {process.name} on {process.url}")
+            process.start()
+        for process in processes:
+            process.wait_ready(args.startup_timeout)
+
+        for scenario in scenarios:
+            print(f"Running {scenario.name}: {args.requests} x {scenario.endpoint} at concurrency {args.concurrency}")
+            pid = by_name[scenario.service].process.pid
+            results[scenario.name] = asyncio.run(run_scenario(scenario, urls, pid, args))
+            for error in results[scenario.name]["sample_errors"]:
+                print(f"  {error}")
+    finally:
+        for process in reversed(processes):
+            process.stop()
+        if args.keep_workdir or args.workdir:
+            print(f"Service logs and data kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%} of {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,85 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import os
 import sys
 import json
+import asyncio
+import logging
 from datetime import datetime
 
 # Import the bravo module and osm_service
 from app.services import bravo
 from app.services.osm_service import OSMService
+from app.services.job_store import JobStore, new_job_id, request_fingerprint
+from app.services.job_queue import JobQueue, QueueFullError
+from app.services.job_events import JobEventBroker
+from app.services.report_catalog import ReportCatalog, parse_report_metadata
+from app.services.discovery_cache import DiscoveryCache, discovery_cache_key
+from app.services.snapshot_store import (
+    SNAPSHOT_DIR,
+    latest_snapshot,
+    list_snapshots,
+    read_snapshot_metadata,
+    snapshot_basename,
+    snapshot_to_json,
+    write_snapshot
+)
+from app.services.spatial_index import SpatialIndexCache
+from app.services.boundary_store import (
+    boundary_level,
+    geometries_from_geojson,
+    geometry_from_geojson,
+    load_boundary_geometry
+)
+from app.services.osm_pbf import resolve_extract_path
+from app.services.raster_exposure import RasterExposure, resolve_raster_path
+from app.services.road_network import NETWORK_TYPES, RoutingService
+from app.services.report_delivery import (
+    ReportResponseCache,
+    is_not_modified,
+    iter_report_file,
+    negotiate_encoding,
+    report_validators
+)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 # Initialize OSM service
 osm_service = OSMService()
 
+# Persistent job store (SQLite, results stored out of line)
+job_store = JobStore()
+
+# Bounded worker pools for blocking background jobs
+job_queue = JobQueue(job_store)
+
+# Push job progress to SSE/WebSocket subscribers
+job_events = JobEventBroker()
+job_store.add_listener(job_events.publish)
+
+# Metadata index of disaster_report_*.md files
+report_catalog = ReportCatalog()
+
+# Reuse discoveries for the same event instead of calling Gemini again
+discovery_cache = DiscoveryCache()
+
+# Encoded report bodies, keyed by ETag
+report_response_cache = ReportResponseCache()
+
+# Spatial indexes over pre-disaster snapshots, cached per snapshot file
+spatial_indexes = SpatialIndexCache()
+
+# Zonal statistics of local rasters, cached per (raster, geometry)
+raster_exposure = RasterExposure()
+
+# Stored road networks and travel-time fields to facilities
+routing_service = RoutingService()
+
 app = FastAPI()
 
 # Enable CORS
@@ -25,173 +91,729 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store active jobs (in a real app, use a database)
-active_jobs = {}
-
 # Request models
 class DiscoveryRequest(BaseModel):
     query: str
+    bypass_cache: bool = False
 
 class ReportRequest(BaseModel):
     discovery_file: Optional[str] = None
     query: Optional[str] = None
+    bypass_cache: bool = False
     
 class LocationRequest(BaseModel):
     location: str
     structures: Optional[List[str]] = None
+    force_refresh: bool = False
+    incremental: bool = False
+    extract: Optional[str] = None
+    tiled: Optional[bool] = None
+
+class ExposureRequest(BaseModel):
+    raster: str
+    locations: List[str] = []
+    hazard: Optional[Dict[str, Any]] = None
+    buffer_m: Optional[float] = None
+    structures: Optional[List[str]] = None
+    snapshot_id: Optional[str] = None
+    categorical: bool = False
+
+class OverlayRequest(BaseModel):
+    hazards: Dict[str, Any]
+    location: Optional[str] = None
+    snapshot_id: Optional[str] = None
+    structures: Optional[List[str]] = None
+    status: Optional[str] = None
+    near_km: float = 1.0
+    include_safe: bool = False
+
+class RoadNetworkRequest(BaseModel):
+    location: str
+    network_type: str = "drive"
+    force_refresh: bool = False
+
+class IsochroneRequest(BaseModel):
+    location: str
+    network_type: str = "drive"
+    structures: List[str] = ["hospital"]
+    minutes: List[float] = [5, 10, 15, 30]
+    snapshot_id: Optional[str] = None
+
+class ClosureRequest(BaseModel):
+    location: str
+    network_type: str = "drive"
+    edges: List[List[int]] = []
+    hazards: Optional[Dict[str, Any]] = None
+
+def submit_job(kind: str, job_id: str, func, *args):
+    """Queue a background job, failing the request if the queue for its type is full"""
+    try:
+        job_queue.submit(kind, job_id, func, *args)
+    except QueueFullError as e:
+        job_store.update(job_id, status="error", error=str(e))
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.on_event("startup")
+async def bind_job_events():
+    job_events.bind_loop(asyncio.get_running_loop())
+
+async def refresh_report_catalog():
+    """Index reports added outside the pipeline, off the request path"""
+    while True:
+        await asyncio.to_thread(report_catalog.refresh)
+        await asyncio.sleep(report_catalog.refresh_interval)
+
+@app.on_event("startup")
+async def start_report_catalog_refresh():
+    app.state.report_catalog_refresh = asyncio.create_task(refresh_report_catalog())
+
+@app.on_event("shutdown")
+def shutdown_job_queue():
+    job_queue.shutdown(wait=False)
+
+@app.on_event("shutdown")
+def stop_report_catalog_refresh():
+    app.state.report_catalog_refresh.cancel()
 
 @app.get("/")
 async def root():
     return {"message": "DisasterLens AI API"}
 
 @app.post("/api/pre-disaster/collect")
-async def collect_location_data(request: LocationRequest, background_tasks: BackgroundTasks):
+async def collect_location_data(request: LocationRequest):
     """Collect pre-disaster data for a location using OpenStreetMap"""
-    job_id = f"predisaster_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    
     # Default structures if not provided
     if not request.structures:
         request.structures = ["hospital", "school", "shelter", "fire_station", "police", "water", "power"]
     
-    active_jobs[job_id] = {
-        "status": "collecting",
-        "location": request.location,
-        "structures": request.structures,
-        "progress": 0,
-        "result": None,
-        "error": None
+    # Collect from a local .osm.pbf extract instead of Overpass
+    extract_path = None
+    if request.extract:
+        try:
+            extract_path = resolve_extract_path(request.extract)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    
+    fingerprint = request_fingerprint(
+        "predisaster",
+        location=request.location,
+        structures=request.structures,
+        incremental=request.incremental,
+        extract=request.extract,
+        tiled=request.tiled
+    )
+    if request.force_refresh:
+        # Always query Overpass again, but let later identical requests attach to this job
+        job_id, created = new_job_id("predisaster"), True
+        job_store.create(
+            job_id,
+            kind="predisaster",
+            status="collecting",
+            fingerprint=fingerprint,
+            location=request.location,
+            structures=request.structures
+        )
+    else:
+        # Identical in-flight or fresh requests share one job
+        job_id, created = job_store.create_or_attach(
+            new_job_id("predisaster"),
+            kind="predisaster",
+            status="collecting",
+            fingerprint=fingerprint,
+            location=request.location,
+            structures=request.structures
+        )
+    
+    # Run collection on the worker pool
+    if created:
+        submit_job(
+            "predisaster", job_id, run_location_data_collection,
+            job_id, request.location, request.structures,
+            request.force_refresh, request.incremental, extract_path, request.tiled
+        )
+    
+    return {"job_id": job_id, "reused": not created}
+
+@app.get("/api/pre-disaster/snapshots")
+def get_snapshots(location: Optional[str] = None):
+    """List stored pre-disaster snapshots, newest first"""
+    snapshots = []
+    for path in list_snapshots(location):
+        name, extension = os.path.splitext(os.path.basename(path))
+        metadata = read_snapshot_metadata(path)
+        snapshots.append({
+            "id": name,
+            "location": metadata.get("location"),
+            "timestamp": metadata.get("timestamp"),
+            "structures": metadata.get("structures"),
+            "complete": metadata.get("coverage", {}).get("complete", True),
+            "format": extension.lstrip("."),
+            "size": os.path.getsize(path)
+        })
+    return snapshots
+
+def resolve_snapshot_path(snapshot_id: str) -> str:
+    """Map a snapshot ID to its file, preferring Parquet over legacy JSON"""
+    if os.path.basename(snapshot_id) != snapshot_id or not snapshot_id.startswith("predisaster_"):
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    for extension in (".parquet", ".json"):
+        path = os.path.join(SNAPSHOT_DIR, f"{snapshot_id}{extension}")
+        if os.path.exists(path):
+            return path
+    raise HTTPException(status_code=404, detail="Snapshot not found")
+
+@app.get("/api/pre-disaster/snapshots/{snapshot_id}")
+def get_snapshot(snapshot_id: str, format: str = "json", structures: Optional[str] = None):
+    """
+    Export a pre-disaster snapshot.
+    
+    format=json returns the legacy poi_data layout (optionally limited to a
+    comma-separated list of structures); format=parquet returns the columnar file.
+    """
+    path = resolve_snapshot_path(snapshot_id)
+    if format == "parquet":
+        if not path.endswith(".parquet"):
+            raise HTTPException(status_code=404, detail="Snapshot is only available as JSON")
+        return FileResponse(path, media_type="application/vnd.apache.parquet", filename=os.path.basename(path))
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'parquet'")
+    
+    return snapshot_to_json(path, structures=parse_structures(structures))
+
+@app.get("/api/pre-disaster/boundary")
+def get_boundary(location: str, zoom: Optional[float] = Query(None, ge=0, le=24)):
+    """
+    Boundary of a collected location as GeoJSON, simplified for a web map zoom
+    level (finest level if no zoom is given). Area, bbox and centroid are in the
+    feature properties.
+    """
+    level = boundary_level(location, zoom)
+    if level is None:
+        raise HTTPException(status_code=404, detail="No boundary collected for this location")
+    path, tolerance = level
+    return FileResponse(
+        path,
+        media_type="application/geo+json",
+        headers={"X-Boundary-Tolerance-M": str(tolerance)}
+    )
+
+def get_poi_index(location: Optional[str], snapshot_id: Optional[str]):
+    """Spatial index of a given snapshot, or of the latest snapshot for a location"""
+    if snapshot_id:
+        return spatial_indexes.get_for_snapshot(resolve_snapshot_path(snapshot_id))
+    if not location:
+        raise HTTPException(status_code=400, detail="Either location or snapshot_id must be provided")
+    index = spatial_indexes.get_for_location(location)
+    if index is None:
+        raise HTTPException(status_code=404, detail=f"No pre-disaster snapshot for {location}")
+    return index
+
+def parse_structures(structures: Optional[str]) -> Optional[List[str]]:
+    return [s.strip() for s in structures.split(",") if s.strip()] if structures else None
+
+@app.get("/api/poi/nearest")
+def get_nearest_pois(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=1000),
+    location: Optional[str] = None,
+    snapshot_id: Optional[str] = None,
+    structures: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """Find the k nearest POIs to a point (e.g. the 5 nearest active hospitals)"""
+    index = get_poi_index(location, snapshot_id)
+    return {
+        "snapshot": os.path.basename(index.source),
+        "results": index.nearest(lat, lon, k=k, structures=parse_structures(structures), status=status)
+    }
+
+@app.get("/api/poi/radius")
+def get_pois_within_radius(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(..., gt=0),
+    location: Optional[str] = None,
+    snapshot_id: Optional[str] = None,
+    structures: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1)
+):
+    """Find all POIs within a radius of a point, nearest first"""
+    index = get_poi_index(location, snapshot_id)
+    return {
+        "snapshot": os.path.basename(index.source),
+        "results": index.within_radius(
+            lat, lon, radius_km, structures=parse_structures(structures), status=status, limit=limit
+        )
+    }
+
+@app.get("/api/poi/bbox")
+def get_pois_in_bbox(
+    min_lon: float = Query(..., ge=-180, le=180),
+    min_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    location: Optional[str] = None,
+    snapshot_id: Optional[str] = None,
+    structures: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1)
+):
+    """Find all POIs inside a bounding box"""
+    index = get_poi_index(location, snapshot_id)
+    return {
+        "snapshot": os.path.basename(index.source),
+        "results": index.within_bbox(
+            min_lon, min_lat, max_lon, max_lat, structures=parse_structures(structures), status=status, limit=limit
+        )
+    }
+
+@app.post("/api/poi/overlay")
+def overlay_hazards(request: OverlayRequest):
+    """
+    Classify the POIs of a snapshot against hazard footprints (a GeoJSON
+    geometry, Feature or FeatureCollection of flood/fire polygons): affected
+    (inside a hazard), near_edge (within near_km of one) and safe, per
+    structure type. Hazards are referred to by their position in the collection.
+    """
+    try:
+        hazards = geometries_from_geojson(request.hazards)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.near_km < 0:
+        raise HTTPException(status_code=400, detail="near_km must not be negative")
+    
+    index = get_poi_index(request.location, request.snapshot_id)
+    return {
+        "snapshot": os.path.basename(index.source),
+        "hazards": len(hazards),
+        "near_km": request.near_km,
+        "structures": index.overlay(
+            hazards,
+            near_km=request.near_km,
+            structures=request.structures,
+            status=request.status,
+            include_safe=request.include_safe
+        )
+    }
+
+def validate_network_type(network_type: str):
+    if network_type not in NETWORK_TYPES:
+        raise HTTPException(status_code=400, detail=f"network_type must be one of {', '.join(NETWORK_TYPES)}")
+
+@app.post("/api/routing/network")
+async def download_road_network(request: RoadNetworkRequest):
+    """Download and store the drive or walk network of a location (background job)"""
+    validate_network_type(request.network_type)
+    path = routing_service.network_path(request.location, request.network_type)
+    if os.path.exists(path) and not request.force_refresh:
+        return {"job_id": None, "reused": True, "file_path": path}
+    
+    job_id, created = job_store.create_or_attach(
+        new_job_id("routing"),
+        kind="routing",
+        status="downloading",
+        fingerprint=request_fingerprint("routing", location=request.location, network_type=request.network_type),
+        location=request.location,
+        network_type=request.network_type
+    )
+    if created:
+        submit_job("routing", job_id, run_road_network_download, job_id, request.location, request.network_type)
+    return {"job_id": job_id, "reused": not created}
+
+def get_facility_field(location: str, network_type: str, structures: List[str], snapshot_id: Optional[str]):
+    """Road network and travel-time field to the facilities of a snapshot"""
+    validate_network_type(network_type)
+    index = get_poi_index(location, snapshot_id)
+    try:
+        return routing_service.facility_field(location, network_type, index, structures)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"{e}; download it with /api/routing/network")
+
+@app.post("/api/routing/isochrones")
+def get_isochrones(request: IsochroneRequest):
+    """
+    Travel-time isochrones (GeoJSON) around the facilities of a snapshot over the
+    stored road network, taking closed roads into account
+    """
+    if not request.minutes or any(limit <= 0 for limit in request.minutes):
+        raise HTTPException(status_code=400, detail="minutes must be positive")
+    network, field = get_facility_field(
+        request.location, request.network_type, request.structures, request.snapshot_id
+    )
+    isochrones = routing_service.isochrones(network, field, request.minutes)
+    isochrones["facilities"] = len(field.facilities)
+    return isochrones
+
+@app.get("/api/routing/nearest-facility")
+def get_nearest_facility_by_road(
+    location: str,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    structures: str = "hospital",
+    network_type: str = "drive",
+    snapshot_id: Optional[str] = None
+):
+    """Nearest facility by road travel time from a point, and the travel time"""
+    network, field = get_facility_field(location, network_type, parse_structures(structures), snapshot_id)
+    nearest = routing_service.nearest_facility(network, field, lat, lon)
+    if nearest is None:
+        raise HTTPException(status_code=404, detail="No facility reachable by road from this point")
+    return nearest
+
+@app.post("/api/routing/closures")
+def close_roads(request: ClosureRequest):
+    """
+    Mark roads impassable: explicit [u, v] OSM node pairs and/or every edge with an
+    end inside GeoJSON hazard polygons. Cached travel-time fields whose fastest
+    paths use a closed road are invalidated; the others are kept.
+    """
+    validate_network_type(request.network_type)
+    try:
+        hazards = geometries_from_geojson(request.hazards) if request.hazards is not None else []
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if any(len(edge) != 2 for edge in request.edges):
+        raise HTTPException(status_code=400, detail="edges must be [u, v] OSM node id pairs")
+    try:
+        return routing_service.close_edges(request.location, request.network_type, request.edges, hazards)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.post("/api/exposure")
+def get_exposure(request: ExposureRequest):
+    """
+    Zonal statistics of a local raster (e.g. population counts or land cover):
+    per admin unit (the boundaries of the given locations, intersected with the
+    hazard polygon if one is given), for the hazard polygon as a whole, and per
+    POI within buffer_m metres of each facility of the locations' latest
+    snapshots (or of snapshot_id), limited to the hazard polygon if given.
+    """
+    try:
+        raster_path = resolve_raster_path(request.raster)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        hazard = geometry_from_geojson(request.hazard) if request.hazard is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not request.locations and hazard is None:
+        raise HTTPException(status_code=400, detail="Either locations or hazard must be provided")
+    if request.buffer_m is not None and not (0 < request.buffer_m <= 100000):
+        raise HTTPException(status_code=400, detail="buffer_m must be between 0 and 100000")
+    
+    zones = []
+    for location in request.locations:
+        boundary = load_boundary_geometry(location) if osm_service.collect_boundary_data(location) else None
+        if boundary is None:
+            raise HTTPException(status_code=404, detail=f"No boundary found for {location}")
+        zones.append(boundary.intersection(hazard) if hazard is not None else boundary)
+    if hazard is not None:
+        zones.append(hazard)
+    
+    stats = raster_exposure.zone_stats(raster_path, zones, categorical=request.categorical)
+    response = {
+        "raster": request.raster,
+        "units": [{"location": location, **unit} for location, unit in zip(request.locations, stats)]
     }
+    if hazard is not None:
+        response["hazard"] = stats[-1]
     
-    # Run collection in background
-    background_tasks.add_task(run_location_data_collection, job_id, request.location, request.structures)
+    if request.buffer_m is not None:
+        if request.snapshot_id:
+            indexes = [get_poi_index(None, request.snapshot_id)]
+        elif request.locations:
+            indexes = [get_poi_index(location, None) for location in request.locations]
+        else:
+            raise HTTPException(status_code=400, detail="POI buffers need locations or snapshot_id")
+        
+        pois = []
+        for index in indexes:
+            positions = index.select(request.structures, hazard)
+            buffers = raster_exposure.buffer_stats(
+                raster_path, index.lat[positions], index.lon[positions], request.buffer_m,
+                categorical=request.categorical
+            )
+            pois.extend({**poi, **poi_stats} for poi, poi_stats in zip(index.to_pois(positions), buffers))
+        response["buffer_m"] = request.buffer_m
+        response["pois"] = pois
     
-    return {"job_id": job_id}
+    return response
 
 @app.post("/api/discover")
-async def discover_disaster_data(request: DiscoveryRequest, background_tasks: BackgroundTasks):
+async def discover_disaster_data(request: DiscoveryRequest):
     """Discover disaster data based on query"""
-    job_id = f"job_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    
-    active_jobs[job_id] = {
-        "status": "discovering",
-        "query": request.query,
-        "progress": 0,
-        "result": None,
-        "error": None
-    }
+    fingerprint = request_fingerprint("discovery", query=request.query)
+    if request.bypass_cache:
+        # Always run a fresh discovery, but let later identical requests attach to it
+        job_id, created = new_job_id("job"), True
+        job_store.create(job_id, kind="discovery", status="discovering", fingerprint=fingerprint, query=request.query)
+    else:
+        job_id, created = job_store.create_or_attach(
+            new_job_id("job"),
+            kind="discovery",
+            status="discovering",
+            fingerprint=fingerprint,
+            query=request.query
+        )
     
-    # Run discovery in background
-    background_tasks.add_task(run_discovery, job_id, request.query)
+    # Run discovery on the worker pool
+    if created:
+        submit_job("discovery", job_id, run_discovery, job_id, request.query, request.bypass_cache)
     
-    return {"job_id": job_id}
+    return {"job_id": job_id, "reused": not created}
 
 @app.post("/api/generate-report")
-async def generate_report(request: ReportRequest, background_tasks: BackgroundTasks):
+async def generate_report(request: ReportRequest):
     """Generate a comprehensive disaster report"""
     if not request.discovery_file and not request.query:
         raise HTTPException(status_code=400, detail="Either discovery_file or query must be provided")
     
-    job_id = f"job_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    
-    active_jobs[job_id] = {
-        "status": "processing",
-        "progress": 0,
-        "result": None,
-        "error": None
-    }
+    fingerprint = request_fingerprint("report", discovery_file=request.discovery_file, query=request.query)
+    if request.bypass_cache:
+        job_id, created = new_job_id("job"), True
+        job_store.create(job_id, kind="report", status="processing", fingerprint=fingerprint)
+    else:
+        job_id, created = job_store.create_or_attach(
+            new_job_id("job"),
+            kind="report",
+            status="processing",
+            fingerprint=fingerprint
+        )
     
-    # Run report generation in background
-    background_tasks.add_task(run_report_generation, job_id, request.discovery_file, request.query)
+    # Run report generation on the worker pool
+    if created:
+        submit_job(
+            "report", job_id, run_report_generation,
+            job_id, request.discovery_file, request.query, request.bypass_cache
+        )
     
-    return {"job_id": job_id}
+    return {"job_id": job_id, "reused": not created}
 
 @app.get("/api/job/{job_id}")
 async def get_job_status(job_id: str):
     """Check the status of a job"""
-    if job_id not in active_jobs:
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job
+
+@app.get("/api/job/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Stream job status and progress changes as Server-Sent Events"""
+    job = job_store.get(job_id, include_result=False)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return active_jobs[job_id]
+    async def event_stream():
+        async for data in job_events.subscribe(job_id, job):
+            if data is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"data: {data}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/api/job/{job_id}/events")
+async def websocket_job_events(websocket: WebSocket, job_id: str):
+    """Push job status and progress changes over a WebSocket"""
+    await websocket.accept()
+    job = job_store.get(job_id, include_result=False)
+    if job is None:
+        await websocket.close(code=4404, reason="Job not found")
+        return
+    
+    try:
+        async for data in job_events.subscribe(job_id, job):
+            if data is not None:
+                await websocket.send_text(data)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/api/queue")
+async def get_queue_status():
+    """Get worker limits and queued/running/finished job counts per job type"""
+    return job_queue.stats()
+
+@app.get("/api/overpass")
+async def get_overpass_status():
+    """
+    Get per-endpoint request, error and latency counters of the Overpass client,
+    response cache statistics and the place/alias counts and hit/miss counters
+    of the local geocoder store
+    """
+    return {
+        "endpoints": osm_service.overpass.stats(),
+        "cache": osm_service.cache.stats(),
+        "geocoder": osm_service.geocoder.stats(),
+    }
 
 @app.get("/api/reports")
-async def get_recent_reports():
-    """Get list of recently generated reports"""
-    reports = []
+def get_recent_reports(
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    event: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+):
+    """Get a page of recently generated reports, optionally filtered by event or event dates"""
+    filters = {"event": event, "date_from": date_from, "date_to": date_to}
     
-    # Get report files
-    os.makedirs("disaster_data", exist_ok=True)
-    report_files = []
-    for file in os.listdir("."):
-        if file.startswith("disaster_report_") and file.endswith(".md"):
-            report_files.append(file)
+    # Both indexes are sorted newest first; merge the first offset+limit of each
+    window = offset + limit
+    reports = []
     
-    # Sort by creation time (newest first)
-    report_files.sort(key=lambda f: os.path.getctime(f) if os.path.exists(f) else 0, reverse=True)
+    # Add report files (served from the catalog index, bodies are never opened)
+    for entry in report_catalog.list_reports(limit=window, **filters):
+        reports.append({
+            "id": entry["report_id"],
+            "title": entry["title"],
+            "date": datetime.fromtimestamp(entry["mtime"]).strftime('%Y-%m-%d %H:%M:%S'),
+            "type": "file",
+            "event_name": entry["event_name"],
+            "start_date": entry["start_date"],
+            "end_date": entry["end_date"],
+            "size": entry["size"],
+            "source_count": entry["source_count"],
+            "_timestamp": entry["mtime"]
+        })
     
-    # Add report files
-    for file in report_files[:10]:  # Limit to 10
-        try:
-            with open(file, 'r') as f:
-                content = f.read()
-                title = content.split('\n')[0].replace('# ', '') if content.startswith('# ') else file
-                
-                reports.append({
-                    "id": file,
-                    "title": title,
-                    "date": datetime.fromtimestamp(os.path.getctime(file)).strftime('%Y-%m-%d %H:%M:%S'),
-                    "type": "file"
-                })
-        except:
-            pass
-    
-    # Add completed jobs with reports
-    for job_id, job in active_jobs.items():
-        if job["status"] == "completed" and job.get("result") and isinstance(job.get("result"), str):
-            if job["result"].startswith("# "):  # It's a markdown report
-                title = job["result"].split('\n')[0].replace('# ', '')
-                reports.append({
-                    "id": job_id,
-                    "title": title,
-                    "date": job_id.replace("job_", "").replace("_", " "),
-                    "type": "job"
-                })
+    # Add completed jobs with reports (titles are indexed, result bodies stay on disk)
+    for job in job_store.list_reports(limit=window, **filters):
+        reports.append({
+            "id": job["job_id"],
+            "title": job["title"],
+            "date": datetime.fromtimestamp(job["created_at"]).strftime('%Y-%m-%d %H:%M:%S'),
+            "type": "job",
+            "event_name": job["event_name"],
+            "start_date": job["start_date"],
+            "end_date": job["end_date"],
+            "size": job["result_size"],
+            "source_count": job["source_count"],
+            "_timestamp": job["created_at"]
+        })
     
+    reports.sort(key=lambda report: report["_timestamp"], reverse=True)
+    reports = reports[offset:offset + limit]
+    for report in reports:
+        del report["_timestamp"]
     return reports
 
+def resolve_report_path(report_id: str) -> Optional[str]:
+    """Map a report ID (completed job ID or report file name) to the file holding its markdown"""
+    # Check if it's a job ID (job results are stored out of line as files)
+    job_report = job_store.get_report_info(report_id)
+    if job_report:
+        return job_report["result_path"]
+    
+    # Check if it's a report file (plain file names only)
+    if report_id.startswith("disaster_report_") and os.path.basename(report_id) == report_id:
+        path = os.path.join(report_catalog.reports_dir, report_id)
+        if os.path.isfile(path):
+            return path
+    return None
+
 @app.get("/api/report/{report_id}")
-async def get_report(report_id: str):
-    """Get a specific report"""
-    # Check if it's a job ID
-    if report_id in active_jobs and active_jobs[report_id]["status"] == "completed":
+def get_report(report_id: str, request: Request, raw: bool = False):
+    """
+    Get a specific report.
+    
+    Responses carry ETag/Last-Modified validators (conditional requests get 304),
+    are compressed with brotli or gzip when the client accepts it, and with
+    raw=true the markdown is streamed directly instead of wrapped in JSON.
+    """
+    path = resolve_report_path(report_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    variant = ("raw" if raw else "json") + (f"-{encoding}" if encoding else "")
+    try:
+        headers = report_validators(path, variant)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Report not found")
+    headers["Cache-Control"] = "no-cache"
+    headers["Vary"] = "Accept-Encoding"
+    
+    if is_not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since"), headers):
+        return Response(status_code=304, headers=headers)
+    
+    if raw:
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return StreamingResponse(
+            iter_report_file(path, encoding),
+            media_type="text/markdown; charset=utf-8",
+            headers=headers
+        )
+    
+    body, applied_encoding = report_response_cache.get_envelope(path, headers["ETag"], encoding)
+    if applied_encoding:
+        headers["Content-Encoding"] = applied_encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def load_discovery_metadata(file_path: str) -> Dict[str, Any]:
+    """Read event name and date range from a discovery file (empty dict if unreadable)"""
+    try:
+        with open(file_path, 'r') as f:
+            content = f.read()
+        if '```json' in content:
+            content = content.split('```json')[1].split('```')[0].strip()
+        data = json.loads(content)
         return {
-            "content": active_jobs[report_id]["result"],
-            "format": "markdown"
+            "event_name": data.get("event_name"),
+            "start_date": data.get("start_date"),
+            "end_date": data.get("end_date")
         }
+    except Exception:
+        return {}
+
+def schedule_discovery_refresh(query: str, cache_key: str):
+    """Refresh a stale cached discovery in the background (at most one refresh per entry)"""
+    if not discovery_cache.begin_revalidation(cache_key):
+        return
     
-    # Check if it's a file
-    if os.path.exists(report_id) and report_id.startswith("disaster_report_"):
-        try:
-            with open(report_id, 'r') as f:
-                content = f.read()
-                return {
-                    "content": content,
-                    "format": "markdown"
-                }
-        except:
-            pass
-    
-    raise HTTPException(status_code=404, detail="Report not found")
+    refresh_job_id = new_job_id("refresh_discovery")
+    job_store.create(refresh_job_id, kind="discovery", status="discovering", query=query)
+    try:
+        job_queue.submit("discovery", refresh_job_id, run_discovery, refresh_job_id, query, True)
+    except QueueFullError as e:
+        job_store.update(refresh_job_id, status="error", error=str(e))
+        discovery_cache.end_revalidation(cache_key)
 
-# Background task functions
-async def run_discovery(job_id: str, query: str):
+# Background task functions (blocking; executed on the job queue's worker threads)
+def run_discovery(job_id: str, query: str, bypass_cache: bool = False):
     """Run disaster data discovery in background"""
     try:
+        # Serve from the discovery cache; stale entries are refreshed in the background
+        if not bypass_cache:
+            cached = discovery_cache.lookup(query)
+            if cached:
+                if cached["stale"]:
+                    schedule_discovery_refresh(query, cached["cache_key"])
+                job_store.set_result(
+                    job_id,
+                    cached["filename"],
+                    status="completed",
+                    progress=100,
+                    cached=True,
+                    cache_age_seconds=cached["age_seconds"]
+                )
+                return
+        
         # Update progress
-        active_jobs[job_id]["progress"] = 10
+        job_store.update(job_id, progress=10)
         
         # Use bravo's genai_client to create a discovery prompt
         client = bravo.genai_client(api_key=os.environ.get("GEMINI_API_KEY"))
-        active_jobs[job_id]["progress"] = 30
+        job_store.update(job_id, progress=30)
         
         prompt = f"""
         Find news articles about the following disaster: {query}
@@ -213,7 +835,7 @@ async def run_discovery(job_id: str, query: str):
             model="gemini-2.0-flash"
         )
         result = response.text
-        active_jobs[job_id]["progress"] = 70
+        job_store.update(job_id, progress=70)
         
         # Clean up the JSON if needed
         if "```json" in result:
@@ -223,24 +845,29 @@ async def run_discovery(job_id: str, query: str):
         
         # Save to file
         os.makedirs("disaster_data", exist_ok=True)
-        filename = f"discovery_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        filename = f"{new_job_id('discovery')}.json"
         file_path = f"disaster_data/{filename}"
         with open(file_path, "w") as f:
             f.write(result)
+        discovery_cache.store(query, filename, result)
         
         # Update job status
-        active_jobs[job_id]["status"] = "completed"
-        active_jobs[job_id]["result"] = filename
-        active_jobs[job_id]["progress"] = 100
+        job_store.set_result(job_id, filename, status="completed", progress=100, cached=False)
     except Exception as e:
-        active_jobs[job_id]["status"] = "error"
-        active_jobs[job_id]["error"] = str(e)
+        logger.error(f"Error running discovery for job {job_id}: {str(e)}")
+        discovery_cache.end_revalidation(discovery_cache_key(query))
+        job_store.update(job_id, status="error", error=str(e))
 
-async def run_report_generation(job_id: str, discovery_file: Optional[str], query: Optional[str]):
+def run_report_generation(
+    job_id: str,
+    discovery_file: Optional[str],
+    query: Optional[str],
+    bypass_cache: bool = False
+):
     """Generate report in background"""
     try:
         # Update progress
-        active_jobs[job_id]["progress"] = 10
+        job_store.update(job_id, progress=10)
         
         # If discovery file is provided, use it
         if discovery_file:
@@ -249,41 +876,47 @@ async def run_report_generation(job_id: str, discovery_file: Optional[str], quer
                 raise Exception(f"Discovery file not found: {file_path}")
         else:
             # First run discovery with the query
-            active_jobs[job_id]["status"] = "discovering"
-            discovery_job_id = f"discovery_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            temp_discovery_id = f"temp_{discovery_job_id}"
+            job_store.update(job_id, status="discovering")
+            temp_discovery_id = new_job_id("temp_discovery")
             
-            # Initialize the temp discovery job in active_jobs
-            active_jobs[temp_discovery_id] = {
-                "status": "discovering",
-                "query": query,
-                "progress": 0,
-                "result": None,
-                "error": None
-            }
+            # Initialize the temp discovery job in the job store
+            job_store.create(temp_discovery_id, kind="discovery", status="discovering", query=query)
             
             # Run the discovery
-            await run_discovery(temp_discovery_id, query)
+            run_discovery(temp_discovery_id, query, bypass_cache)
             
-            if temp_discovery_id not in active_jobs:
+            discovery_job = job_store.get(temp_discovery_id)
+            if discovery_job is None:
                 raise Exception(f"Internal error: discovery job {temp_discovery_id} not found")
                 
-            if active_jobs[temp_discovery_id]["status"] != "completed":
-                raise Exception(f"Discovery failed: {active_jobs[temp_discovery_id].get('error', 'Unknown error')}")
+            if discovery_job["status"] != "completed":
+                raise Exception(f"Discovery failed: {discovery_job.get('error') or 'Unknown error'}")
             
-            file_path = f"disaster_data/{active_jobs[temp_discovery_id]['result']}"
+            file_path = f"disaster_data/{discovery_job['result']}"
             if not os.path.exists(file_path):
                 raise Exception(f"Discovery file not found: {file_path}")
                 
-            active_jobs[job_id]["progress"] = 40
+            job_store.update(job_id, progress=40)
         
         # Generate report using bravo's manual_pipeline
-        active_jobs[job_id]["status"] = "processing"
-        print(f"Generating report from file: {file_path}")
-        report = bravo.manual_pipeline(file_path)
+        job_store.update(job_id, status="processing")
+        logger.info(f"Generating report from file: {file_path}")
+        
+        def on_source_progress(completed: int, total: int, message: str):
+            # Sources account for progress 40-90; the final Gemini call for the rest
+            progress = 40 + int(50 * completed / total) if total else 90
+            job_store.update(
+                job_id,
+                progress=progress,
+                sources_completed=completed,
+                sources_total=total,
+                detail=message
+            )
+        
+        report = bravo.manual_pipeline(file_path, progress_callback=on_source_progress)
         
-        print(f"Report generation complete. Content length: {len(report) if report else 0}")
-        print(f"Report starts with: {report[:100] if report else 'No content'}")
+        logger.info(f"Report generation complete. Content length: {len(report) if report else 0}")
+        logger.debug(f"Report starts with: {report[:100] if report else 'No content'}")
         
         # Ensure the report is a string with actual content
         if not report or not isinstance(report, str) or len(report) < 10:
@@ -297,34 +930,106 @@ Please try again with a different query or check the system logs.
 Query: {query}
 Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
             """
-            print("Generated fallback report due to empty or invalid report content")
+            logger.warning("Generated fallback report due to empty or invalid report content")
+        
+        # Index the report file written by manual_pipeline
+        event_info = load_discovery_metadata(file_path)
+        if event_info.get("event_name"):
+            report_catalog.record(bravo.report_filename(event_info["event_name"]), report, **event_info)
         
         # Update job status with the report content
-        active_jobs[job_id]["status"] = "completed"
-        active_jobs[job_id]["result"] = report
-        active_jobs[job_id]["progress"] = 100
-        print(f"Job {job_id} completed successfully with report content")
+        job_store.set_result(
+            job_id,
+            report,
+            status="completed",
+            progress=100,
+            source_count=parse_report_metadata(report)["source_count"],
+            **event_info
+        )
+        logger.info(f"Job {job_id} completed successfully with report content")
     except Exception as e:
-        print(f"Error generating report: {str(e)}")
-        active_jobs[job_id]["status"] = "error"
-        active_jobs[job_id]["error"] = str(e)
+        logger.error(f"Error generating report: {str(e)}")
+        job_store.update(job_id, status="error", error=str(e))
 
 # New background task for pre-disaster data collection
-async def run_location_data_collection(job_id: str, location: str, structures: List[str]):
-    """Run pre-disaster data collection in background"""
+def run_location_data_collection(
+    job_id: str,
+    location: str,
+    structures: List[str],
+    force_refresh: bool = False,
+    incremental: bool = False,
+    extract_path: Optional[str] = None,
+    tiled: Optional[bool] = None
+):
+    """
+    Run pre-disaster data collection in background: from a local extract if one is
+    given, otherwise from Overpass (incrementally from the latest snapshot if requested,
+    in tiles for large areas or if tiled is set)
+    """
     try:
         # Update progress
-        active_jobs[job_id]["progress"] = 10
+        job_store.update(job_id, progress=10)
         
         # Collect POI data
-        active_jobs[job_id]["status"] = "collecting_poi"
-        poi_data = osm_service.collect_poi_data(location, structures)
-        active_jobs[job_id]["progress"] = 60
+        job_store.update(job_id, status="collecting_poi")
+        
+        def on_structure_progress(completed: int, total: int, structure: str):
+            job_store.update(
+                job_id,
+                progress=10 + int(50 * completed / total),
+                structures_completed=completed,
+                structures_total=total,
+                detail=f"Collected {structure}"
+            )
+        
+        refresh_info = None
+        coverage = None
+        base_path = latest_snapshot(location) if incremental and not extract_path else None
+        if base_path:
+            base = snapshot_to_json(base_path)
+            try:
+                poi_data, changes = osm_service.refresh_poi_data(
+                    location,
+                    base["poi_data"],
+                    datetime.fromisoformat(base["timestamp"]),
+                    structures,
+                    progress_callback=on_structure_progress
+                )
+                refresh_info = {
+                    "base_snapshot": os.path.splitext(os.path.basename(base_path))[0],
+                    "since": base["timestamp"],
+                    "changes": changes
+                }
+            except Exception as e:
+                logger.warning(f"Incremental refresh of {location} failed, collecting in full: {str(e)}")
+        
+        if extract_path:
+            poi_data = osm_service.collect_poi_data_from_extract(
+                location, extract_path, structures, progress_callback=on_structure_progress
+            )
+        elif refresh_info is None:
+            if tiled is None:
+                tiled = osm_service.should_tile(location)
+            if tiled:
+                poi_data, coverage = osm_service.collect_poi_data_tiled(
+                    location, structures, progress_callback=on_structure_progress, force_refresh=force_refresh
+                )
+                if not coverage["complete"]:
+                    job_store.update(
+                        job_id,
+                        detail=f"{coverage['tiles_failed']} of {coverage['tiles']} tiles failed; "
+                               f"{coverage['covered_fraction']:.1%} of the area covered"
+                    )
+            else:
+                poi_data = osm_service.collect_poi_data(
+                    location, structures, progress_callback=on_structure_progress, force_refresh=force_refresh
+                )
+        job_store.update(job_id, progress=60)
         
         # Collect boundary data
-        active_jobs[job_id]["status"] = "collecting_boundary"
+        job_store.update(job_id, status="collecting_boundary")
         boundary_info = osm_service.collect_boundary_data(location)
-        active_jobs[job_id]["progress"] = 90
+        job_store.update(job_id, progress=90)
         
         # Compile results
         results = {
@@ -333,24 +1038,38 @@ async def run_location_data_collection(job_id: str, location: str, structures: L
             "poi_data": poi_data,
             "boundary_info": boundary_info
         }
+        if refresh_info:
+            results["incremental"] = refresh_info
+        if coverage:
+            results["coverage"] = coverage
         
-        # Save results to file
-        os.makedirs("data/pre_disaster", exist_ok=True)
-        filename = f"predisaster_{location.replace(' ', '_').lower()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        file_path = f"data/pre_disaster/{filename}"
-        
-        with open(file_path, "w") as f:
-            json.dump(results, f, indent=2)
+        # Save results as a columnar snapshot (plus legacy JSON if configured)
+        basename = snapshot_basename(location)
+        file_path = write_snapshot(results, os.path.join(SNAPSHOT_DIR, f"{basename}.parquet"))
+        if os.environ.get("PREDISASTER_WRITE_JSON", "0") == "1":
+            with open(os.path.join(SNAPSHOT_DIR, f"{basename}.json"), "w") as f:
+                json.dump(results, f)
         
         # Update job status
-        active_jobs[job_id]["status"] = "completed"
-        active_jobs[job_id]["result"] = results
-        active_jobs[job_id]["file_path"] = file_path
-        active_jobs[job_id]["progress"] = 100
+        job_store.set_result(job_id, results, status="completed", file_path=file_path, progress=100)
+        
+    except Exception as e:
+        logger.error(f"Error collecting data for {location}: {str(e)}")
+        job_store.update(job_id, status="error", error=str(e))
+
+def run_road_network_download(job_id: str, location: str, network_type: str):
+    """Download and store the road network of a location in background"""
+    try:
+        job_store.update(job_id, status="collecting_boundary", progress=10)
+        boundary = load_boundary_geometry(location) if osm_service.collect_boundary_data(location) else None
+        if boundary is None:
+            raise ValueError(f"No boundary found for {location}")
         
+        job_store.update(job_id, status="downloading", progress=30)
+        summary = routing_service.download(location, network_type, boundary)
+        job_store.set_result(job_id, summary, status="completed", file_path=summary["file_path"], progress=100)
     except Exception as e:
-        active_jobs[job_id]["status"] = "error"
-        active_jobs[job_id]["error"] = str(e)
+        job_store.update(job_id, status="error", error=str(e))
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+from app.services.job_events import JobEventBroker
+from app.services.job_queue import JobQueue
+from app.services.job_store import JobStore
+
+
+async def _collect(broker: JobEventBroker, job_id: str, snapshot: dict) -> list:
+    return [json.loads(data) async for data in broker.subscribe(job_id, snapshot) if data is not None]
+
+
+def test_subscribe_after_completion_ends(tmp_path):
+    store = JobStore(db_path=str(tmp_path / "jobs.db"), results_dir=str(tmp_path / "jobs"))
+    queue = JobQueue(store)
+    broker = JobEventBroker(keepalive_seconds=0.1)
+    store.add_listener(broker.publish)
+
+    def task(job_id):
+        store.update(job_id, progress=50)
+        store.update(job_id, status="completed", progress=100)
+
+    async def run():
+        broker.bind_loop(asyncio.get_running_loop())
+        store.create("job_1", "report", "processing")
+        queue.submit("report", "job_1", task, "job_1")
+        # The queue's final state="finished" update follows the terminal status
+        await asyncio.get_running_loop().run_in_executor(None, queue.shutdown, True)
+        await asyncio.sleep(0.05)
+
+        assert broker._channels == {}
+        snapshot = store.get("job_1", include_result=False)
+        return await asyncio.wait_for(_collect(broker, "job_1", snapshot), timeout=2)
+
+    events = asyncio.run(run())
+    assert events[-1]["status"] == "completed"
+
+
+def test_stream_ends_on_terminal_status():
+    broker = JobEventBroker(keepalive_seconds=0.1)
+
+    async def run():
+        broker.bind_loop(asyncio.get_running_loop())
+        broker.publish("job_1", {"status": "processing"})
+        await asyncio.sleep(0)
+        stream = asyncio.ensure_future(_collect(broker, "job_1", {"status": "processing"}))
+        await asyncio.sleep(0.05)
+        broker.publish("job_1", {"progress": 80})
+        broker.publish("job_1", {"status": "completed", "progress": 100})
+        broker.publish("job_1", {"state": "finished"})
+        events = await asyncio.wait_for(stream, timeout=2)
+        await asyncio.sleep(0)
+        return events
+
+    events = asyncio.run(run())
+    assert [event.get("progress") for event in events] == [None, 80, 100]
+    assert events[-1]["status"] == "completed"
+    assert broker._channels == {}
+
+
+def test_stale_snapshot_after_completion_ends():
+    # The API reads the snapshot, then the job finishes before the stream subscribes
+    broker = JobEventBroker(keepalive_seconds=0.1)
+
+    async def run():
+        broker.bind_loop(asyncio.get_running_loop())
+        broker.publish("job_1", {"status": "processing", "progress": 10})
+        broker.publish("job_1", {"status": "completed", "progress": 100})
+        broker.publish("job_1", {"state": "finished"})
+        await asyncio.sleep(0)
+        return await asyncio.wait_for(_collect(broker, "job_1", {"status": "processing", "progress": 10}), timeout=2)
+
+    events = asyncio.run(run())
+    assert events[-1]["status"] == "completed"
+    assert events[-1]["progress"] == 100
+    assert broker._channels == {}
+
+
+def test_finished_state_expires():
+    broker = JobEventBroker(keepalive_seconds=0.1, finished_ttl=0)
+
+    async def run():
+        broker.bind_loop(asyncio.get_running_loop())
+        broker.publish("job_1", {"status": "completed"})
+        await asyncio.sleep(0.01)
+        broker.publish("job_2", {"status": "completed"})
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert list(broker._finished) == ["job_2"]
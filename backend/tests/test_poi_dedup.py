@@ -0,0 +1,86 @@
+from app.services.poi_dedup import deduplicate_table, names_similar
+from app.services.poi_table import POITable
+
+# Degrees per metre of latitude
+M = 1 / 111320.0
+
+
+def _table(*pois) -> POITable:
+    table = POITable("2025-01-01T00:00:00")
+    for element_type, osm_id, lat, lon, tags, structure, extent in pois:
+        table.add(element_type, osm_id, lat, lon, tags, structure, extent)
+    return table
+
+
+def _snapshot(table: POITable):
+    return sorted((poi["id"], poi["name"]) for pois in table.to_poi_data().values() for poi in pois)
+
+
+def test_names_similar():
+    assert names_similar("general hospital", "alappuzha general hospital")
+    assert names_similar("st marys school", "st marys schol")
+    assert not names_similar("lp school 1", "lp school 13")
+    assert not names_similar("green valley public school", "sunrise girls academy")
+    assert not names_similar("", "school")
+
+
+def test_node_and_building_of_one_facility_are_merged():
+    table = _table(
+        ("node", 1, 9.5, 76.3, {"amenity": "hospital", "name": "General Hospital"}, "hospital", (0, 0)),
+        ("way", 2, 9.5 + 30 * M, 76.3, {"amenity": "hospital", "name": "Alappuzha General Hospital",
+                                        "beds": "300", "emergency": "yes"}, "hospital", (40 * M, 40 * M)),
+    )
+    assert deduplicate_table(table) == 1
+    # The member with the most details is kept
+    assert _snapshot(table) == [("way_2", "Alappuzha General Hospital")]
+
+
+def test_distinct_and_distant_facilities_are_kept():
+    table = _table(
+        ("node", 1, 9.5, 76.3, {"amenity": "school", "name": "LP School 1"}, "school", (0, 0)),
+        ("node", 2, 9.5 + 20 * M, 76.3, {"amenity": "school", "name": "LP School 13"}, "school", (0, 0)),
+        ("node", 3, 9.5 + 500 * M, 76.3, {"amenity": "school", "name": "LP School 1"}, "school", (0, 0)),
+        # Same name and place but another structure type
+        ("node", 4, 9.5, 76.3, {"amenity": "shelter", "name": "LP School 1"}, "shelter", (0, 0)),
+    )
+    assert deduplicate_table(table) == 0
+    assert len(table) == 4
+
+
+def test_unnamed_container_takes_the_name_of_its_single_named_member():
+    table = _table(
+        ("way", 1, 9.5, 76.3, {"amenity": "school", "building": "yes", "operator": "Government"},
+         "school", (300 * M, 300 * M)),
+        ("node", 2, 9.5 + 100 * M, 76.3, {"amenity": "school", "name": "Green Valley Public School"},
+         "school", (0, 0)),
+    )
+    assert deduplicate_table(table) == 1
+    assert _snapshot(table) == [("way_1", "Green Valley Public School")]
+
+
+def test_unnamed_container_does_not_merge_distinct_named_facilities():
+    table = _table(
+        ("way", 1, 9.5, 76.3, {"amenity": "school"}, "school", (300 * M, 300 * M)),
+        ("node", 2, 9.5 + 100 * M, 76.3, {"amenity": "school", "name": "Green Valley Public School"},
+         "school", (0, 0)),
+        ("node", 3, 9.5 - 100 * M, 76.3, {"amenity": "school", "name": "Sunrise Girls Academy"},
+         "school", (0, 0)),
+        # An unnamed node inside the campus, linked to both schools through the container
+        ("node", 4, 9.5, 76.3 + 50 * M, {"amenity": "school"}, "school", (0, 0)),
+    )
+    deduplicate_table(table)
+    names = [name for _, name in _snapshot(table)]
+    assert "Green Valley Public School" in names
+    assert "Sunrise Girls Academy" in names
+
+
+def test_unnamed_container_of_similar_names_merges_them():
+    table = _table(
+        ("way", 1, 9.5, 76.3, {"amenity": "school"}, "school", (300 * M, 300 * M)),
+        ("node", 2, 9.5 + 100 * M, 76.3, {"amenity": "school", "name": "Green Valley School"}, "school", (0, 0)),
+        ("node", 3, 9.5 + 120 * M, 76.3, {"amenity": "school", "name": "Green Valley Public School"},
+         "school", (0, 0)),
+    )
+    assert deduplicate_table(table) == 2
+    # Named members win ties over the unnamed container
+    assert _snapshot(table) == [("node_2", "Green Valley School")]